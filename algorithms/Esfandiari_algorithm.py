@@ -5,8 +5,10 @@ from dataclasses import dataclass, field
 from math import inf
 
 import numpy as np
+from typing import Optional, Union
 
 import algorithms.kmedplusplus
+import instrumentation
 from solver_interface import Instance, ExplainableOutput, ClusterNode, make_kids
 
 
@@ -14,6 +16,8 @@ from solver_interface import Instance, ExplainableOutput, ClusterNode, make_kids
 class Esfandiari:
     """"Solver for the k-median problem that uses the method proposed by Makarychev et al, that solves the
     k-median problem with an explainable solution."""
+    # seed of the numpy.random.Generator drawing the cuts, None draws from the global numpy random state
+    seed: Optional[Union[int, np.random.SeedSequence]] = None
 
     def __call__(self, instance, pre_clusters):
         """
@@ -21,15 +25,16 @@ class Esfandiari:
         @param instance: instance of the k-median problem
         @return: an explainable solution to the k-median problem
         """
-        leaves, split_nodes = build_tree(instance, pre_clusters)
+        rng = np.random if self.seed is None else np.random.default_rng(self.seed)
+        with instrumentation.span("build_tree", solver="Esfandiari", n=instance.size()):
+            leaves, split_nodes = build_tree(instance, pre_clusters, rng)
 
         return ExplainableOutput(instance, leaves, split_nodes, pre_clusters)
 
 
-def build_tree(instance: Instance, pre_clusters: dict):
+def build_tree(instance: Instance, pre_clusters, rng=np.random):
     dim = instance.dimension()
-    X = instance.points
-    u0 = ClusterNode(pre_clusters, np.array([[-inf, inf]] * dim), list(pre_clusters.keys()))  # root
+    u0 = ClusterNode.root(instance, pre_clusters, set_mode="centers", reassign=True)  # root
     leaves = []
     split_nodes = []
 
@@ -38,17 +43,18 @@ def build_tree(instance: Instance, pre_clusters: dict):
             leaves.append(u)
         else:
             split_nodes.append(u)
-            centers = u.set
-            a = [min([center.coordinates[i] for center in centers]) for i in range(dim)]
-            b = [max([center.coordinates[i] for center in centers]) for i in range(dim)]
-            R = [a[i] - b[i] for i in range(dim)]
-            probabilities = [R[i] / sum(R) for i in range(dim)]
-            r = np.random.choice(np.arange(0, dim),
-                                 p=probabilities)  # np.random method needed for p argument!
-            z = np.random.uniform(a[r], b[r])
-
-            node_L, node_R = make_kids(u, r, z, True)
-            u.children = [node_L, node_R]
+            with instrumentation.span("node", "node", points=u.stop - u.start, centers=len(u.center_ids)) as region:
+                centers = u.centers()
+                a = [min([center.coordinates[i] for center in centers]) for i in range(dim)]
+                b = [max([center.coordinates[i] for center in centers]) for i in range(dim)]
+                R = [a[i] - b[i] for i in range(dim)]
+                probabilities = [R[i] / sum(R) for i in range(dim)]
+                r = rng.choice(np.arange(0, dim),
+                               p=probabilities)  # np.random method needed for p argument!
+                z = rng.uniform(a[r], b[r])
+
+                node_L, node_R = make_kids(u, r, z)
+                region.set(dimension=r, threshold=z)
             median_split(node_L)
             median_split(node_R)
 
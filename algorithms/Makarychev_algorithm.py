@@ -3,17 +3,20 @@ from __future__ import \
 
 from dataclasses import dataclass, field
 from math import inf
-from util import dist
 import numpy as np
 from numpy import ndarray
+from typing import Optional, Union
 
 import algorithms.kmedplusplus
+import instrumentation
 from solver_interface import Instance, ExplainableOutput, ClusterNode, make_kids
 
 @dataclass
 class Makarychev:
     """"Solver for the k-median problem that uses the method proposed by Makarychev et al, that solves the
     k-median problem with an explainable solution."""
+    # seed of the numpy.random.Generator drawing the cuts, None draws from the global numpy random state
+    seed: Optional[Union[int, np.random.SeedSequence]] = None
 
     def __call__(self, instance, pre_clusters):
         """
@@ -21,50 +24,29 @@ class Makarychev:
         @param instance: instance of the k-median problem
         @return: an explainable solution to the k-median problem
         """
-        leaves, split_nodes = build_tree(instance, pre_clusters)
+        rng = np.random if self.seed is None else np.random.default_rng(self.seed)
+        with instrumentation.span("build_tree", solver="Makarychev", n=instance.size()):
+            leaves, split_nodes = build_tree(instance, pre_clusters, rng)
 
         return ExplainableOutput(instance, leaves, split_nodes, pre_clusters)
 
 
-def build_tree(instance: Instance, pre_clusters: dict):
+def build_tree(instance: Instance, pre_clusters, rng=np.random):
     dim = instance.dimension()
-    X = instance.points
     leaves = []
     split_nodes = []
-    centers = list(pre_clusters.keys())
-    k = len(centers)
-    Xr = X + centers
-    T0 = ClusterNode(pre_clusters, np.array([[-inf, inf]] * dim), Xr) #root
+    T0 = ClusterNode.root(instance, pre_clusters, set_mode="points+centers", reassign=True) #root
+    k = len(T0.center_ids)
 
     def rec_build_tree(T: ClusterNode):
         if T.is_homogeneous():
             leaves.append(T)
         else:
-            centers = list(T.centers())
-            S = [[[[min(center1.coordinates[0], center2.coordinates[0]),
-                    max(center1.coordinates[0], center2.coordinates[0])],
-                   [min(center1.coordinates[1], center2.coordinates[1]),
-                    max(center1.coordinates[1], center2.coordinates[1])]] \
-                  for center1 in centers] for center2 in centers]
-            num_centers = len(centers)
-            E = [(i, j) for i in range(num_centers) for j in range(num_centers) if (i != j) and (i < j)] #enough since tree is built top-down
-            D = max([dist(centers[i], centers[j]) for (i, j) in E])
-            R = [S[i][j] for (i, j) in E if mu(S[i][j]) > D/(k**3)]
-            R_range = sum([mu(S) for S in R])
-            R_cum = [sum([mu(R[j]) for j in range(i)]) for i in range(len(R)+1)]
-            z = np.random.uniform(0.0, R_range)
-            index_chosen = [i for i in range(len(R_cum)-1) if R_cum[i] <= z < R_cum[i+1]] #should be only 1!!
-            S_chosen = R[index_chosen[0]]
-            z_red = z - R_cum[index_chosen[0]]
-            S_xrange = S_chosen[0][1] - S_chosen[0][0]
-            if z_red <= S_xrange:
-                i = 0
-                theta = S_chosen[0][0] + z_red
-            else:
-                i = 1
-                theta = S_chosen[1][0] + (z_red - S_xrange)
-            split_nodes.append(T)
-            node_L, node_R = make_kids(T, i, theta)
+            with instrumentation.span("node", "node", points=T.stop - T.start, centers=len(T.center_ids)) as region:
+                i, theta = sample_cut(T.tree.center_coords[T.center_ids], k, rng)
+                split_nodes.append(T)
+                node_L, node_R = make_kids(T, i, theta)
+                region.set(dimension=i, threshold=theta)
             rec_build_tree(node_L)
             rec_build_tree(node_R)
 
@@ -72,8 +54,37 @@ def build_tree(instance: Instance, pre_clusters: dict):
     return leaves, split_nodes
 
 
+def sample_cut(centers: ndarray, k: int, rng=np.random) -> tuple[int, float]:
+    """
+    Samples a cut uniformly from the union of the boxes S spanned by the pairs of centers with mu(S) > D / k^3, where D
+    is the largest distance between two centers, as proposed by Makarychev et al. The boxes, their 1-norm lengths and
+    the cumulative lengths are computed as arrays for all pairs at once, in any dimension.
+    @param centers: (m, d) coordinates of the centers of the node
+    @param k: number of centers of the whole pre-clustering
+    @param rng: numpy.random.Generator (or the numpy.random module) to draw from
+    @return: dimension and threshold of the cut
+    """
+    first, second = np.triu_indices(len(centers), 1)  # pairs (i, j) with i < j, enough since tree is built top-down
+    lower = np.minimum(centers[first], centers[second])
+    sides = np.maximum(centers[first], centers[second]) - lower
+    lengths = sides.sum(axis=1)  # mu of each box, i.e. the 1-norm distance of the pair of centers
+    D = lengths.max()
+    in_R = lengths > D / (k ** 3)
+    lower, sides = lower[in_R], sides[in_R]
+    R_cum = np.cumsum(lengths[in_R])
+    z = rng.uniform(0.0, R_cum[-1])
+    chosen = min(int(np.searchsorted(R_cum, z, side="right")), len(R_cum) - 1)  # R_cum[chosen - 1] <= z < R_cum[chosen]
+    z_red = z - (R_cum[chosen - 1] if chosen > 0 else 0.0)
+    side_cum = np.cumsum(sides[chosen])
+    i = min(int(np.searchsorted(side_cum, z_red, side="left")), len(side_cum) - 1)
+    theta = lower[chosen, i] + (z_red - (side_cum[i - 1] if i > 0 else 0.0))
+    return i, theta
+
+
 def mu(S: ndarray):
-    return (S[0][1]-S[0][0]) + (S[1][1] - S[1][0])
+    """@return: the 1-norm length of the box S, given as array of (lower_bound, upper_bound) for each dimension"""
+    S = np.asarray(S)
+    return (S[..., 1] - S[..., 0]).sum(axis=-1)
 
 
 def nested_sum(L: list):
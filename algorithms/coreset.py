@@ -0,0 +1,78 @@
+"""
+builds explainable trees on a small weighted sample (coreset) of a large instance and evaluates them on all points
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from numpy import ndarray
+
+from solver_interface import ArrayInstance, CenterOutput, ExplainableOutput, Instance, pre_cluster_labels
+from util import assigned_distances, stack_coordinates
+
+
+@dataclass
+class Coreset:
+    """represents a weighted sample of an instance together with the pre-clustering restricted to it"""
+    instance: ArrayInstance  # the sampled points, their weights are instance.weights
+    rows: ndarray  # row of each sampled point in the full instance
+    pre_clusters: CenterOutput  # the pre-clustering of the full instance, restricted to the sample
+
+
+def sensitivity_sample(instance: Instance, pre_clusters, size: int, seed=None) -> Coreset:
+    """
+    Samples a coreset by sensitivity sampling on the pre-clustering. The sensitivity of a point p in the cluster C
+    with center c is bounded by d(p, c) / cost + 1 / |C|, so points far from their center and points of small
+    clusters are sampled more often, and every cluster gets about the same share of the sample for its second term.
+    size points are drawn with these probabilities q(p) and weighted by w(p) / (size * q(p)), which makes the weighted
+    cost of any set of centers an unbiased estimate of its cost on the instance. Points drawn several times are
+    merged and their weights added.
+    @param instance: instance of the k-median problem, its weights (if any) are respected
+    @param pre_clusters: a CenterOutput, or a dict mapping each center to the points of its cluster
+    @param size: number of draws, the coreset has at most this many points
+    @param seed: seed of the random draws (or a numpy.random.Generator)
+    @return: the coreset
+    """
+    rng = np.random.default_rng(seed)
+    centers, labels = pre_cluster_labels(instance, pre_clusters)
+    clustered = labels >= 0
+    weights = np.ones(instance.size()) if instance.weights is None else instance.weights
+    distances = assigned_distances(instance.as_array(), stack_coordinates(centers), np.where(clustered, labels, 0),
+                                   instance.chunk_rows())
+    weights = np.where(clustered, weights, 0.0)  # unclustered points are not explained, so not sampled
+    cluster_weights = np.bincount(labels[clustered], weights=weights[clustered], minlength=len(centers))
+    total_cost = np.dot(weights, distances)
+    sensitivities = weights / cluster_weights[np.where(clustered, labels, 0)].clip(min=np.finfo(float).tiny)
+    if total_cost > 0:
+        sensitivities += weights * distances / total_cost
+    probabilities = sensitivities / sensitivities.sum()
+
+    draws = rng.choice(instance.size(), size=size, p=probabilities)
+    rows, counts = np.unique(draws, return_counts=True)
+    sample_weights = counts * weights[rows] / (size * probabilities[rows])
+    sample = ArrayInstance(instance.as_array()[rows], instance.k, weights=sample_weights)
+    return Coreset(sample, rows, CenterOutput.from_labels(sample, centers, labels[rows]))
+
+
+@dataclass
+class CoresetSolver:
+    """Runs an explainable solver (IMM, Makarychev, Esfandiari) on a sensitivity-sampled coreset of the instance
+    instead of all points. IMM counts the mistakes of the sampled points with their weights. The returned output
+    belongs to the full instance: its medians come from the leaves of the sample tree, while its clusters and its
+    cost (see ExplainableOutput.cost) are evaluated on all points in one vectorized pass."""
+    solver: object
+    size: int = 10_000  # number of draws of the coreset
+    seed: Optional[int] = 0
+
+    def __call__(self, instance: Instance, pre_clusters) -> ExplainableOutput:
+        """
+        Solve a k-median problem with the solver on a coreset
+        @param instance: instance of the k-median problem
+        @param pre_clusters: clustering of the instance to explain
+        @return: an explainable solution of the instance
+        """
+        if instance.size() <= self.size:  # no sample is smaller than the instance itself
+            return self.solver(instance, pre_clusters)
+        coreset = sensitivity_sample(instance, pre_clusters, self.size, self.seed)
+        output = self.solver(coreset.instance, coreset.pre_clusters)
+        return ExplainableOutput(instance, output.leaves, output.split_nodes, pre_clusters)
@@ -1,20 +1,30 @@
 from __future__ import \
     annotations  # allows us to use ClusterNode in type hints, which will be default in Python 3.10
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dataclasses import dataclass, field
 from math import inf
 
 import numpy as np
-from typing import Tuple
+from numpy import ndarray
+from typing import Optional, Tuple
 
 import algorithms.kmedplusplus
-from solver_interface import Instance, ExplainableOutput, ClusterNode, make_kids_IMM
-from util import Point
+import instrumentation
+from solver_interface import Instance, ExplainableOutput, ClusterNode, MemmapInstance, TreeData, make_kids_IMM, \
+    pre_cluster_labels, split_node
+from util import Point, row_chunks, stack_coordinates
 
 @dataclass
 class IMM:
     """"Solver for the k-median problem that uses the iterative mistake minimization method, that solves the
     k-median problem with an explainable solution."""
+    # "presorted" (sweep over coordinates sorted once at the root), "sweep" (sorts at every node), "bruteforce" or
+    # "streaming" (a few chunked passes over the data per tree level, the default for a MemmapInstance), all find the
+    # same tree
+    split_search: str = "presorted"
+    workers: int = 1  # number of threads building independent subtrees in parallel
+    parallel_min_size: int = 100_000  # nodes with at least this many points are split as separate tasks
 
     def __call__(self, instance, pre_clusters):
         """
@@ -22,42 +32,506 @@ class IMM:
         @param instance: instance of the k-median problem
         @return: an explainable solution to the k-median problem
         """
-        leaves, split_nodes = build_tree(instance, pre_clusters)
+        leaves, split_nodes = build_tree(instance, pre_clusters, self.split_search, self.workers,
+                                         self.parallel_min_size)
 
         return ExplainableOutput(instance, leaves, split_nodes, pre_clusters)
 
 
-def build_tree(instance: Instance, pre_clusters: dict):
-    dim = instance.dimension()
-    leaves = []
-    split_nodes = []
-    root = ClusterNode(pre_clusters, np.array([[-inf, inf]] * dim), instance.points)  # initial bounds are -inf, inf
+def build_tree(instance: Instance, pre_clusters, split_search: str = "presorted", workers: int = 1,
+               parallel_min_size: int = 100_000):
+    """
+    Builds the explainable tree with the iterative mistake minimization algorithm.
+    With split_search "presorted", the coordinates of each dimension are sorted only once, at the root. Like CART
+    implementations, every node owns the slice [start, stop) of the d presorted index arrays, and a split stably
+    partitions that slice into the slices of its children, so the arrays stay sorted without sorting them again.
+    The nodes are grown from an explicit work queue. With several workers, nodes with at least parallel_min_size points
+    are split as separate tasks on a thread pool and smaller nodes grow their whole subtree in one task. Sibling
+    subtrees only touch their own slices of the shared arrays, and NumPy releases the GIL in the heavy kernels.
+    @param instance: instance of the k-median problem
+    @param pre_clusters: clustering of the instance to explain, a CenterOutput or a dict mapping each center to the
+    points of its cluster
+    @param split_search: "presorted", "sweep" (sorts at every node), "bruteforce" or "streaming" (see
+    build_tree_streaming), all find the same tree. "presorted" falls back to "streaming" for a MemmapInstance, whose
+    presorted index arrays would take as much memory as the data itself
+    @param workers: number of threads, 1 builds the tree in the calling thread
+    @param parallel_min_size: minimal number of points of a node to split it as a task of its own
+    @return: the leaves and the split nodes of the tree, in preorder independent of the number of workers
+    """
+    if split_search == "streaming" or split_search == "presorted" and isinstance(instance, MemmapInstance):
+        with instrumentation.span("build_tree", solver="IMM", split_search="streaming", n=instance.size()):
+            return build_tree_streaming(instance, pre_clusters)
+    with instrumentation.span("build_tree", solver="IMM", split_search=split_search, n=instance.size()):
+        return build_tree_in_memory(instance, pre_clusters, split_search, workers, parallel_min_size)
+
 
-    def rec_build_tree(node: ClusterNode):
+def build_tree_in_memory(instance: Instance, pre_clusters, split_search: str, workers: int, parallel_min_size: int):
+    """
+    Builds the tree with the presorted, sweep or bruteforce split search, see build_tree
+    """
+    split_functions = {"presorted": find_split_presorted, "sweep": find_split_sweep, "bruteforce": find_split}
+    if split_search not in split_functions:
+        raise ValueError(f"unknown split search {split_search!r}, expected 'presorted', 'sweep', 'bruteforce' or "
+                         f"'streaming'")
+    find = split_functions[split_search]
+    root = ClusterNode.root(instance, pre_clusters, presort=split_search == "presorted")
+
+    def grow_subtree(node: ClusterNode) -> list[ClusterNode]:
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            if not node.is_homogeneous():
+                node_L, node_R = traced_split(find, node)
+                pending += [node_R, node_L]
+        return []
+
+    def grow_task(node: ClusterNode) -> list[ClusterNode]:
+        # split a large node once and hand its children back to the queue, grow a small node completely
+        if node.stop - node.start < parallel_min_size:
+            return grow_subtree(node)
         if node.is_homogeneous():
-            leaves.append(node)
-        else:
-            i, theta, node_L, node_R = find_split(node)
-            node.split = i, theta
-            split_nodes.append(node)
-            node.children = [node_L, node_R]
-            rec_build_tree(node_L)
-            rec_build_tree(node_R)
+            return []
+        return list(traced_split(find, node))
+
+    if workers <= 1:
+        grow_subtree(root)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            running = {pool.submit(grow_task, root)}
+            while running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for task in done:
+                    running |= {pool.submit(grow_task, child) for child in task.result()}
+    return collect_nodes(root)
+
+
+def traced_split(find, node: ClusterNode) -> Tuple[ClusterNode, ClusterNode]:
+    """
+    Splits node with the split search find, as one span of the active tracer (if any)
+    @return: the children of node
+    """
+    with instrumentation.span("node", "node", points=node.stop - node.start, centers=len(node.center_ids)) as region:
+        i, theta, node_L, node_R = find(node)
+        region.set(dimension=i, threshold=theta)
+    return node_L, node_R
+
+
+def build_tree_streaming(instance: Instance, pre_clusters) -> Tuple[list[ClusterNode], list[ClusterNode]]:
+    """
+    Builds the same tree as build_tree, level by level with a few passes over the data per level, reading the data
+    matrix in chunks of instance.chunk_rows() rows. This suits a MemmapInstance that does not fit into memory.
+    In memory are the node and the label of every point and, for every node of the current level and every dimension,
+    a ThresholdSearch whose statistics fit into the memory_budget of the instance, which they share. The first pass of
+    a level applies the splits chosen after the previous level to the rows of the chunk and collects the statistics of
+    the new level. Dimensions with more distinct coordinates than fit into their share only keep a histogram, and the
+    buckets of the histogram that may still hold the best threshold are searched again in further passes. At the end,
+    the points are ordered by leaf, so that every node owns a slice of a single index array as in the other builders.
+    @param instance: instance of the k-median problem
+    @param pre_clusters: clustering of the instance to explain, a CenterOutput or a dict mapping each center to the
+    points of its cluster
+    @return: the leaves and the split nodes of the tree, in preorder
+    """
+    data = instance.as_array()
+    centers, labels = pre_cluster_labels(instance, pre_clusters)
+    center_coords = stack_coordinates(centers)
+    tree = TreeData(instance, centers, center_coords, np.arange(0)[np.newaxis, :], labels.copy())
+    root = ClusterNode(tree, np.array([[-inf, inf]] * instance.dimension()), 0, 0, np.arange(len(centers)))
+    nodes = [root]  # the node of every point is an index into this list
+    node_of = np.zeros(instance.size(), dtype=np.intp)
+    merge_size = instance.chunk_rows() or instance.size()  # distinct values collected per interval before merging
+    memory_budget = instance.memory_budget if isinstance(instance, MemmapInstance) else STREAMING_MEMORY_BUDGET
+
+    frontier = [] if root.is_homogeneous() else [0]
+    splits = {}  # node -> (i, theta, left child, right child), chosen but not yet applied to the points
+    depth = 0
+    while frontier or splits:
+        max_intervals = max(1, len(frontier) * instance.dimension())  # searched at the same time, sharing the budget
+        searches = {node: [ThresholdSearch(center_coords[:, i], nodes[node].center_ids, memory_budget // max_intervals)
+                           for i in range(instance.dimension())] for node in frontier}
+        active = {node: list(range(instance.dimension())) for node in frontier}  # dimensions with open intervals
+        passes = 0
+        with instrumentation.span("level", depth=depth, nodes=len(frontier)) as region:
+            while splits or active:
+                for rows in row_chunks(instance.size(), instance.chunk_rows()):
+                    chunk = np.asarray(data[rows])
+                    chunk_nodes, chunk_labels = node_of[rows], tree.labels[rows]  # views, updated in place
+                    for node, (i, theta, left, right) in splits.items():
+                        in_node = np.flatnonzero(chunk_nodes == node)
+                        goes_left = chunk[in_node, i] <= theta
+                        chunk_nodes[in_node] = np.where(goes_left, left, right)
+                        in_node_labels = chunk_labels[in_node]
+                        # points separated from their center leave its cluster, as in make_kids_IMM
+                        mistakes = (in_node_labels >= 0) & (goes_left != (center_coords[in_node_labels, i] <= theta))
+                        chunk_labels[in_node[mistakes]] = -1
+                    for node, dimensions in active.items():
+                        members = np.flatnonzero((chunk_nodes == node) & (chunk_labels >= 0))
+                        member_labels = chunk_labels[members]
+                        member_weights = None if instance.weights is None else instance.weights[rows][members]
+                        for i in dimensions:
+                            searches[node][i].add(chunk[members, i], member_labels, center_coords[member_labels, i],
+                                                  merge_size, member_weights)
+                splits = {}
+                passes += 1
+                active = {}
+                free = max_intervals  # intervals of the next pass, so that all statistics stay within the budget
+                for node, node_searches in searches.items():
+                    for search in node_searches:
+                        search.finish_pass()
+                    best = min(search.best()[0] for search in node_searches)
+                    for i, search in enumerate(node_searches):
+                        if search.prune(best) and free > 0:
+                            free -= search.start_pass(free)
+                            active.setdefault(node, []).append(i)
+            region.set(passes=passes)
+
+        next_frontier = []
+        for node in frontier:
+            cluster_node = nodes[node]
+            with instrumentation.span("split_search", "node", centers=len(cluster_node.center_ids)) as region:
+                # the first dimension with the fewest mistakes wins, like in find_split
+                split_candidates = [searches[node][i].best() + (i,) for i in range(instance.dimension())]
+                _, theta, i = min(split_candidates, key=lambda entry: entry[0])
+                region.set(dimension=i, threshold=theta)
+            if theta is None:
+                raise ValueError("the centers of the node coincide, no threshold separates them")
+            splits[node] = (i, theta, len(nodes), len(nodes) + 1)
+            for child in split_node(cluster_node, i, theta, 0):
+                if not child.is_homogeneous():
+                    next_frontier.append(len(nodes))
+                nodes.append(child)
+        frontier = next_frontier
+        depth += 1
+
+    leaves, split_nodes = collect_nodes(root)
+    position = {id(node): j for j, node in enumerate(nodes)}
+    leaf_rank = np.full(len(nodes), -1, dtype=np.intp)
+    leaf_rank[[position[id(leaf)] for leaf in leaves]] = np.arange(len(leaves))
+    tree.order = np.argsort(leaf_rank[node_of], kind="stable")[np.newaxis, :]
+    leaf_bounds = np.concatenate(([0], np.cumsum(np.bincount(leaf_rank[node_of], minlength=len(leaves)))))
+    for rank, leaf in enumerate(leaves):
+        leaf.start, leaf.stop = int(leaf_bounds[rank]), int(leaf_bounds[rank + 1])
+    for node in reversed(split_nodes):  # children come after their parent in preorder
+        node.start, node.stop = node.children[0].start, node.children[1].stop
+    return leaves, split_nodes
+
+
+STREAMING_MEMORY_BUDGET = 2 ** 28  # bytes for the statistics of a level when streaming an instance that is in memory
+VALUE_BYTES = 64  # memory of one distinct coordinate in SplitStatistics, including the temporaries of a merge
+BUCKET_BYTES = 48  # memory of one bucket of a Histogram
+MIN_BUCKETS, MAX_BUCKETS = 16, 4096
+
+
+class SplitStatistics:
+    """collects the distinct coordinates of points in one dimension, with the sum of the signs sign(c - p) (times the
+    weight) of the points at each coordinate"""
+
+    def __init__(self):
+        self.values = [np.arange(0.0)]  # sorted distinct values and their sign sums, one pair per chunk until merged
+        self.sign_sums = [np.arange(0.0)]
+        self.pending = 0  # number of values collected since the last merge
+        self.merged = 0  # number of values after the last merge
+
+    def __len__(self):
+        """@return: an upper bound on the number of distinct values, exact after merge"""
+        return self.merged + self.pending
+
+    def add(self, values: ndarray, signs: ndarray, merge_size: int):
+        distinct, inverse = np.unique(values, return_inverse=True)
+        self.values.append(distinct)
+        self.sign_sums.append(np.bincount(inverse, weights=signs, minlength=len(distinct)))
+        self.pending += len(distinct)
+        # merging only once the pending values outnumber the merged ones keeps the total merge work O(m log m)
+        if self.pending > max(merge_size, self.merged):
+            self.merge()
+
+    def merge(self) -> Tuple[ndarray, ndarray]:
+        """@return: tuple containing the sorted distinct values and their sign sums"""
+        values = np.concatenate(self.values)
+        order = np.argsort(values, kind="stable")  # merges the sorted runs
+        values = values[order]
+        first = np.flatnonzero(np.concatenate(([True], values[1:] != values[:-1])))
+        self.values = [values[first]]
+        self.sign_sums = [np.add.reduceat(np.concatenate(self.sign_sums)[order], first) if len(first)
+                          else np.arange(0.0)]
+        self.pending = 0
+        self.merged = len(first)
+        return self.values[0], self.sign_sums[0]
+
+
+class Histogram:
+    """summarizes the points with coordinates in [lo, hi) in one dimension by equally wide buckets: per bucket the
+    number of points, the sum and the sum of the negative signs (times the weight), and the smallest and the largest
+    coordinate"""
+
+    def __init__(self, lo: float, hi: float, buckets: int):
+        self.edges = np.maximum.accumulate(np.append(lo + (hi - lo) * (np.arange(buckets) / buckets), hi))
+        self.counts = np.zeros(buckets)
+        self.sums = np.zeros(buckets)
+        self.negative_sums = np.zeros(buckets)
+        self.minima = np.full(buckets, inf)
+        self.maxima = np.full(buckets, -inf)
+
+    def add(self, values: ndarray, signs: ndarray):
+        size = len(self.counts)
+        lo, hi = self.edges[0], self.edges[-1]
+        buckets = np.clip(((values - lo) * (size / (hi - lo))).astype(np.intp), 0, size - 1)
+        wrong = (values < self.edges[buckets]) | (values >= self.edges[buckets + 1])  # rounding, the edges decide
+        if wrong.any():
+            buckets[wrong] = np.searchsorted(self.edges, values[wrong], side="right") - 1
+        self.counts += np.bincount(buckets, minlength=size)
+        self.sums += np.bincount(buckets, weights=signs, minlength=size)
+        self.negative_sums += np.bincount(buckets, weights=np.minimum(signs, 0), minlength=size)
+        np.minimum.at(self.minima, buckets, values)
+        np.maximum.at(self.maxima, buckets, values)
+
+
+class Interval:
+    """the coordinates [lo, hi) of a dimension of a node that may still hold the best threshold. They are collected
+    exactly in a SplitStatistics until there are more than capacity distinct ones, then only in a Histogram."""
+
+    def __init__(self, lo: float, hi: float, signs_below: float, next_value: float, lower_bound: float = -inf):
+        """
+        @param lo, hi: range of the coordinates
+        @param signs_below: sum of the signs of the points with coordinates below lo
+        @param next_value: smallest candidate coordinate at or above hi, inf if there is none
+        @param lower_bound: lower bound on the number of mistakes of the thresholds whose left coordinate lies in the
+        interval
+        """
+        self.lo, self.hi = lo, hi
+        self.signs_below, self.next_value = signs_below, next_value
+        self.lower_bound = lower_bound
+        self.statistics: Optional[SplitStatistics] = None
+        self.histogram: Optional[Histogram] = None
+
+    def start(self, capacity: int, buckets: int, extra_values: ndarray):
+        """
+        Prepares a pass that collects the coordinates of the interval.
+        @param capacity: maximal number of distinct coordinates collected exactly
+        @param buckets: number of buckets of the histogram, if there are more
+        @param extra_values: candidate coordinates that are no point coordinates, i.e. the extreme centers
+        """
+        self.capacity, self.buckets = capacity, buckets
+        self.statistics = SplitStatistics()
+        extra_values = extra_values[(extra_values >= self.lo) & (extra_values < self.hi)]
+        self.statistics.add(extra_values, np.zeros(len(extra_values)), 1)
+
+    def add(self, values: ndarray, signs: ndarray, merge_size: int):
+        inside = (values >= self.lo) & (values < self.hi)
+        values, signs = values[inside], signs[inside]
+        if self.histogram is not None:
+            self.histogram.add(values, signs)
+            return
+        self.statistics.add(values, signs, min(merge_size, self.capacity))
+        if len(self.statistics) > self.capacity and len(self.statistics.merge()[0]) > self.capacity:
+            # the net sign sums of the distinct coordinates bound the prefix sums like the signs of the points do
+            self.histogram = Histogram(self.lo, self.hi, self.buckets)
+            self.histogram.add(*self.statistics.merge())
+            self.statistics = None
+
+    def finish(self, center_mistakes: CenterMistakes, best_mistakes: float, tolerance: float) \
+            -> Tuple[Tuple[float, Optional[float]], list[Interval]]:
+        """
+        @param center_mistakes: the center term of the mistakes
+        @param best_mistakes: fewest mistakes found so far, buckets that cannot attain them are dropped
+        @param tolerance: margin for the rounding of weighted sign sums
+        @return: tuple containing the best (mistakes, threshold) pair among the thresholds evaluated exactly, and the
+        intervals of the buckets that need another pass if the coordinates only went into a histogram
+        """
+        if self.histogram is None:
+            values, sign_sums = self.statistics.merge()
+            self.statistics = None
+            return candidate_thresholds(values, sign_sums, self.signs_below, self.next_value, center_mistakes), []
+        histogram, self.histogram = self.histogram, None
+        filled = np.flatnonzero(histogram.counts > 0)
+        signs_below = self.signs_below + np.concatenate(([0.0], np.cumsum(histogram.sums)))[filled]
+        next_values = np.append(histogram.minima[filled][1:], self.next_value)
+        # the largest coordinate of every bucket with the first coordinate after it is a candidate threshold
+        candidates = candidate_thresholds(histogram.maxima[filled], histogram.sums[filled], self.signs_below,
+                                          self.next_value, center_mistakes, next_values)
+        # the other candidates of a bucket have a left coordinate in [minimum, maximum) and a threshold up to the
+        # midpoint of the maximum and the next coordinate
+        spread = histogram.minima[filled] < histogram.maxima[filled]
+        thetas_up_to = (histogram.maxima[filled] + np.where(np.isinf(next_values), histogram.maxima[filled],
+                                                             next_values)) / 2
+        lower_bounds = signs_below + histogram.negative_sums[filled] \
+            - center_mistakes.max_between(histogram.minima[filled], thetas_up_to)
+        best_mistakes = min(best_mistakes, candidates[0])
+        open_buckets = np.flatnonzero(spread & (lower_bounds <= best_mistakes + tolerance))
+        intervals = [Interval(histogram.edges[filled[j]], histogram.edges[filled[j] + 1], signs_below[j],
+                              next_values[j], lower_bounds[j]) for j in open_buckets]
+        return candidates, intervals
+
+
+def candidate_thresholds(values: ndarray, sign_sums: ndarray, signs_below: float, next_value: float, center_mistakes,
+                         next_values: Optional[ndarray] = None) -> Tuple[float, Optional[float]]:
+    """
+    Evaluates the thresholds between consecutive distinct coordinates, as best_threshold_sorted does.
+    @param values: sorted distinct coordinates
+    @param sign_sums: sum of the signs of the points at each coordinate
+    @param signs_below: sum of the signs of the points below values[0]
+    @param next_value: first coordinate after values, inf if there is none
+    @param center_mistakes: see Interval.finish
+    @param next_values: (optional) coordinate following each value, default the next entry of values
+    @return: tuple containing the fewest mistakes and the smallest threshold attaining them (None if there is none)
+    """
+    if next_values is None:
+        next_values = np.append(values[1:], next_value)
+    valid = np.isfinite(next_values) & (next_values > values)
+    thetas = (values[valid] + next_values[valid]) / 2.0  # 2.0 to avoid integer division
+    instrumentation.count("thresholds", len(thetas))
+    if len(thetas) == 0:
+        return inf, None
+    mistakes = signs_below + np.cumsum(sign_sums)[valid] - center_mistakes(thetas)
+    best = int(np.argmin(mistakes))  # the thresholds are increasing, so this is the smallest one
+    return mistakes[best], thetas[best]
+
 
-    rec_build_tree(root)
+class CenterMistakes:
+    """the sums of the signs of the centers at or below thresholds, i.e. the second term of the mistakes in
+    best_threshold_sweep"""
+
+    def __init__(self, center_values: ndarray, center_signs: ndarray):
+        order = np.argsort(center_values, kind="stable")
+        self.center_values = center_values[order]
+        self.prefix = np.concatenate(([0], np.cumsum(center_signs[order])))
+        # row j holds the maxima of the prefix sums over windows of 2 ** j entries (sparse table)
+        self.window_maxima = [self.prefix]
+        while 2 ** len(self.window_maxima) <= len(self.prefix):
+            previous, half = self.window_maxima[-1], 2 ** (len(self.window_maxima) - 1)
+            self.window_maxima.append(np.maximum(previous[:-half], previous[half:]))
+
+    def __call__(self, thetas: ndarray) -> ndarray:
+        return self.prefix[np.searchsorted(self.center_values, thetas, side="right")]
+
+    def max_between(self, lows: ndarray, highs: ndarray) -> ndarray:
+        """@return: for each pair, the maximum of the sums over the thresholds in (low, high]"""
+        starts = np.searchsorted(self.center_values, lows, side="right")
+        stops = np.searchsorted(self.center_values, highs, side="right")  # inclusive, stops >= starts
+        levels = np.log2(stops - starts + 1).astype(np.intp)
+        maxima = np.empty(len(starts))
+        for level in np.unique(levels):
+            rows = levels == level
+            window = self.window_maxima[level]
+            maxima[rows] = np.maximum(window[starts[rows]], window[stops[rows] - 2 ** level + 1])
+        return maxima
+
+
+class ThresholdSearch:
+    """Finds the threshold with the fewest mistakes in one dimension of a node from passes over its points, like
+    best_threshold_sweep, within a memory budget. The first pass collects all coordinates between the extreme centers
+    as one Interval. An interval with too many distinct coordinates for the budget ends up as a histogram, and only
+    its buckets whose lower bound on the mistakes does not exceed the best threshold found so far (of any dimension of
+    the node) are collected again in the next pass, bucket by bucket. The result is the same threshold as
+    best_threshold_sweep."""
+
+    def __init__(self, center_values: ndarray, center_ids: ndarray, memory_budget: int):
+        """
+        @param center_values: coordinates of all centers of the tree
+        @param center_ids: indices of the centers of the node
+        @param memory_budget: bytes for the statistics of one interval
+        """
+        self.center_ids = center_ids
+        self.center_signs = np.zeros(len(center_values))  # for each center, the sum of the signs of its points
+        self.capacity = max(1, memory_budget // VALUE_BYTES)
+        self.buckets = int(np.clip(memory_budget // BUCKET_BYTES, MIN_BUCKETS, MAX_BUCKETS))
+        self.center_mistakes: Optional[CenterMistakes] = None
+        self.best_pair: Tuple[float, Optional[float]] = (inf, None)  # of the thresholds evaluated exactly
+        self.center_values = center_values[center_ids]
+        lo, hi = self.center_values.min(), self.center_values.max()
+        self.extra_values = np.array([lo, hi])  # candidate coordinates besides those of the points
+        self.intervals = [] if lo == hi else [Interval(lo, np.nextafter(hi, inf), 0.0, inf)]  # collected this pass
+        self.pending: list[Interval] = []  # to be collected in a later pass
+        for interval in self.intervals:
+            interval.start(self.capacity, self.buckets, self.extra_values)
+
+    def add(self, values: ndarray, labels: ndarray, center_values: ndarray, merge_size: int,
+            weights: Optional[ndarray] = None):
+        """
+        Adds points of the node.
+        @param values: their coordinates
+        @param labels: their centers, as indices into all centers of the tree
+        @param center_values: the coordinates of their centers
+        @param merge_size: see SplitStatistics.add
+        @param weights: (optional) their weights
+        """
+        signs = np.sign(center_values - values)
+        if weights is not None:
+            signs *= weights
+        if self.center_mistakes is None:  # first pass: all points of the node
+            self.center_signs += np.bincount(labels, weights=signs, minlength=len(self.center_signs))
+            for interval in self.intervals:
+                interval.signs_below += signs[values < interval.lo].sum()
+        for interval in self.intervals:
+            interval.add(values, signs, merge_size)
+
+    def finish_pass(self):
+        if self.center_mistakes is None:
+            self.center_mistakes = CenterMistakes(self.center_values, self.center_signs[self.center_ids])
+        for interval in self.intervals:
+            (mistakes, theta), intervals = interval.finish(self.center_mistakes, self.best()[0], self.tolerance())
+            if theta is not None and (mistakes, theta) < self.best_pair:
+                self.best_pair = (mistakes, theta)
+            self.pending += intervals
+        self.intervals = []
+
+    def tolerance(self) -> float:
+        return 1e-9 * (1 + np.abs(self.center_signs).sum())  # the sums of weighted signs are rounded
+
+    def best(self) -> Tuple[float, Optional[float]]:
+        """@return: tuple containing the fewest mistakes found so far and the smallest threshold attaining them"""
+        return self.best_pair
+
+    def prune(self, best_mistakes: float) -> bool:
+        """
+        Drops the pending intervals that cannot beat best_mistakes.
+        @return: True if intervals remain to be collected
+        """
+        self.pending = [interval for interval in self.pending
+                        if interval.lower_bound <= best_mistakes + self.tolerance()]
+        return bool(self.pending)
+
+    def start_pass(self, max_intervals: int) -> int:
+        """
+        Starts collecting up to max_intervals pending intervals in the next pass.
+        @return: the number of intervals started
+        """
+        self.intervals, self.pending = self.pending[:max(0, max_intervals)], self.pending[max(0, max_intervals):]
+        for interval in self.intervals:
+            interval.start(self.capacity, self.buckets, self.extra_values)
+        return len(self.intervals)
+
+
+def collect_nodes(root: ClusterNode) -> Tuple[list[ClusterNode], list[ClusterNode]]:
+    """
+    @return: the leaves and the split nodes below root, in preorder
+    """
+    leaves = []
+    split_nodes = []
+    pending = [root]
+    while pending:
+        node = pending.pop()
+        if node.children:
+            split_nodes.append(node)
+            pending += reversed(node.children)
+        else:
+            leaves.append(node)
     return leaves, split_nodes
 
 
 def find_split(node: ClusterNode) -> Tuple[int, float, ClusterNode, ClusterNode]:
+    clusters = node.clusters  # materialized once, the node only holds index arrays
+
+    weights = node.tree.instance.weights
+
     def count_mistakes(i, theta):
         centers = node.centers()
-        clusters = node.clusters
         center_point_pairs = [(center, point) for center in centers for point in clusters[center]]
+        if weights is not None:  # a point of weight w counts as w mistakes
+            return sum(weights[point.index] * mistake(point, center, i, theta) for center, point in center_point_pairs)
         return sum(mistake(point, center, i, theta) for center, point in center_point_pairs)
 
     def find_best_split_dim(i):
         centers = node.centers()
-        clusters = node.clusters
         center_coords = [center.coordinates[i] for center in centers]
         l_i, r_i = min(center_coords), max(center_coords)
 
@@ -68,18 +542,131 @@ def find_split(node: ClusterNode) -> Tuple[int, float, ClusterNode, ClusterNode]
         # take the midpoint of consecutive coordinates to avoid equality issues
         theta_candidates = [(a + b) / 2.0 for a, b in
                             zip(point_coords, point_coords[1:]) if a!=b]  # 2.0 to avoid integer division
-        # TODO: (implement the efficient way of counting mistakes while iterating over thetas)
+        if not theta_candidates:  # all centers share coordinate i, no threshold separates them
+            return inf, i, None
+        # see find_split_sweep for the efficient way of counting mistakes while iterating over thetas
+        instrumentation.count("thresholds", len(theta_candidates))
         brute_force_compute = [(count_mistakes(i,theta), theta) for theta in theta_candidates]
         min_mistakes, best_theta = min(brute_force_compute, key=lambda entry: entry[0])
         return min_mistakes, i, best_theta
 
     # compute best splits in each dimension
     dimension = len(node.bounds)
-    split_candidates = [find_best_split_dim(i) for i in range(dimension)]
+    with instrumentation.span("split_search"):
+        split_candidates = [find_best_split_dim(i) for i in range(dimension)]
     _, i, theta = min(split_candidates, key=lambda entry: entry[0])
     node_L, node_R = make_kids_IMM(node, i, theta)
     return i, theta, node_L, node_R
 
 
+def find_split_sweep(node: ClusterNode) -> Tuple[int, float, ClusterNode, ClusterNode]:
+    """
+    Finds the same split as find_split, but counts the mistakes of all candidate thresholds of a dimension in a single
+    sweep over the sorted coordinates instead of rescanning all (center, point) pairs for every threshold.
+    @param node: node to split
+    @return: dimension and threshold of the split and the two resulting children
+    """
+    tree = node.tree
+    members = node.members()
+    point_coords = tree.instance.as_array()[members]
+    local_labels = np.zeros(len(tree.centers), dtype=np.intp)
+    local_labels[node.center_ids] = np.arange(len(node.center_ids))
+    labels = local_labels[tree.labels[members]]  # index into the centers of the node
+    center_coords = tree.center_coords[node.center_ids]
+    weights = None if tree.instance.weights is None else tree.instance.weights[members]
+
+    with instrumentation.span("split_search"):
+        split_candidates = [best_threshold_sweep(point_coords[:, i], center_coords[:, i], labels, weights) + (i,)
+                            for i in range(node.dimension())]
+    return split_at_best(node, split_candidates)
+
+
+def find_split_presorted(node: ClusterNode) -> Tuple[int, float, ClusterNode, ClusterNode]:
+    """
+    Finds the same split as find_split_sweep, reading the coordinates of dimension i in sorted order from row i of the
+    presorted index arrays of the tree, so no sorting is needed.
+    @param node: node to split, of a tree with presorted index arrays
+    @return: dimension and threshold of the split and the two resulting children
+    """
+    tree = node.tree
+    data = tree.instance.as_array()
+    split_candidates = []
+    with instrumentation.span("split_search"):
+        for i in range(node.dimension()):
+            members = node.members(i)
+            values = data[members, i]
+            labels = tree.labels[members]
+            signs = np.sign(tree.center_coords[labels, i] - values)
+            if tree.instance.weights is not None:
+                signs *= tree.instance.weights[members]
+            center_signs = np.bincount(labels, weights=signs, minlength=len(tree.centers))[node.center_ids]
+            split_candidates.append(best_threshold_sorted(values, signs, tree.center_coords[node.center_ids, i],
+                                                          center_signs) + (i,))
+    return split_at_best(node, split_candidates)
+
+
+def split_at_best(node: ClusterNode, split_candidates: list[Tuple[float, Optional[float], int]]) \
+        -> Tuple[int, float, ClusterNode, ClusterNode]:
+    # the first dimension with the fewest mistakes wins, like in find_split
+    min_mistakes, theta, i = min(split_candidates, key=lambda entry: entry[0])
+    if theta is None:
+        raise ValueError("the centers of the node coincide, no threshold separates them")
+    node_L, node_R = make_kids_IMM(node, i, theta)
+    return i, theta, node_L, node_R
+
+
+def best_threshold_sweep(values: ndarray, center_values: ndarray, labels: ndarray,
+                         weights: Optional[ndarray] = None) -> Tuple[float, Optional[float]]:
+    """
+    Computes the threshold with the fewest mistakes in one dimension. A point p of center c is a mistake for theta iff
+    exactly one of p, c lies at or below theta, so with s_p = sign(c - p) the number of mistakes equals
+    sum(s_p for p <= theta) - sum(s_p for c(p) <= theta). Both sums are prefix sums over the sorted point and center
+    coordinates, which makes evaluating all candidate thresholds O(n log n) instead of O(n^2).
+    @param values: coordinates of the points
+    @param center_values: coordinates of the centers
+    @param labels: index into center_values of the center of each point
+    @param weights: (optional) weight of each point, a point of weight w counts as w mistakes
+    @return: tuple containing the minimal number of mistakes and the threshold attaining it (None if there is none)
+    """
+    order = np.argsort(values, kind="stable")
+    signs = np.sign(center_values[labels] - values)
+    if weights is not None:
+        signs *= weights
+    center_signs = np.bincount(labels, weights=signs, minlength=len(center_values))
+    return best_threshold_sorted(values[order], signs[order], center_values, center_signs)
+
+
+def best_threshold_sorted(sorted_values: ndarray, signs: ndarray, center_values: ndarray,
+                          center_signs: ndarray) -> Tuple[float, Optional[float]]:
+    """
+    Computes the threshold with the fewest mistakes in one dimension from coordinates that are already sorted,
+    see best_threshold_sweep. This is O(n + k log k).
+    @param sorted_values: sorted coordinates of the points
+    @param signs: sign(c - p) for each point p in sorted_values and its center c, times the weight of p if weighted
+    @param center_values: coordinates of the centers
+    @param center_signs: for each center, the sum of the signs of the points of its cluster
+    @return: tuple containing the minimal number of mistakes and the threshold attaining it (None if there is none)
+    """
+    l_i, r_i = center_values.min(), center_values.max()
+
+    # candidate thresholds are the midpoints of consecutive distinct coordinates in [l_i, r_i], as in find_split
+    window = sorted_values[np.searchsorted(sorted_values, l_i, side="left"):
+                           np.searchsorted(sorted_values, r_i, side="right")]
+    coords = np.concatenate(([l_i], window, [r_i]))
+    distinct = coords[:-1] != coords[1:]
+    thetas = (coords[:-1][distinct] + coords[1:][distinct]) / 2.0  # 2.0 to avoid integer division
+    if len(thetas) == 0:  # all centers share this coordinate, no threshold separates them
+        return inf, None
+    instrumentation.count("thresholds", len(thetas))
+
+    point_prefix = np.concatenate(([0], np.cumsum(signs)))
+    center_order = np.argsort(center_values, kind="stable")
+    center_prefix = np.concatenate(([0], np.cumsum(center_signs[center_order])))
+    mistakes = point_prefix[np.searchsorted(sorted_values, thetas, side="right")] \
+        - center_prefix[np.searchsorted(center_values[center_order], thetas, side="right")]
+    best = int(np.argmin(mistakes))  # first minimum, i.e. the smallest threshold, like find_split
+    return mistakes[best], thetas[best]
+
+
 def mistake(point: Point, center: Point, i, theta) -> bool:
     return (point.coordinates[i] <= theta) != (center.coordinates[i] <= theta)
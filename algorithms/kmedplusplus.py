@@ -3,13 +3,17 @@ implements the k-means++ algorithm for the k-median objective
 """
 import random
 from dataclasses import dataclass
-from typing import Optional
+from functools import partial
+from typing import Callable, Optional
 
 import numpy as np
-import visualization.clusterings
+from numpy import ndarray
 
-from solver_interface import CenterOutput, Instance
-from util import medoid_bruteforce
+import cost_engine
+import instrumentation
+from solver_interface import CenterOutput, Instance, weighted_sum
+from util import Point, medoid_bruteforce, medoid_exact, medoid_pruned, medoid_sampled, l1_distances, \
+    closest_centers, row_chunks, stack_coordinates
 
 
 def random_seed(instance: Instance) -> CenterOutput:
@@ -25,37 +29,185 @@ def random_seed(instance: Instance) -> CenterOutput:
 def prob_seed(instance: Instance, seed: Optional[int]) -> CenterOutput:
     """
     Choose the first assignment of centers using probabilistic seeding.
+    The distance of every point to its nearest chosen center is kept in one array, which each new center updates with
+    a single vectorized pass, so seeding costs O(n * k) instead of O(n * k^2) distance computations. The pass also
+    keeps the closest center of every point and the distance to it, so the seeded solution needs no further pass.
     @param instance: instance of the k-median problem
-    @param seed: optional seed for random choices
+    @param seed: optional seed for random choices (or a numpy.random.Generator to draw from)
     @return: seeded solution (Output instance)
     """
-    if seed is not None:
-        np.random.seed(seed)
-    centers = [np.random.choice(instance.points)]  # choose first center randomly
-    for i in range(1, instance.k):
-        distances = np.array([point.closest_center(centers[0:i + 1])[1] for point in instance.points])
-        dists_sum = sum(distances)
-        if dists_sum > 0:
-            dists_norm = distances / sum(distances)
+    rng = np.random.default_rng(seed)
+    data = instance.as_array()
+    n = len(data)
+    chunk_rows = instance.chunk_rows()
+    weights = instance.weights  # a point of weight w is as likely to be chosen as w copies of it
+
+    def draw(masses: Optional[ndarray]) -> int:
+        if masses is None:
+            return int(rng.integers(n))
+        cumulative = np.cumsum(masses)
+        return min(int(np.searchsorted(cumulative, rng.random() * cumulative[-1], side="right")), n - 1)
+
+    center_indices = [draw(weights)]  # choose first center randomly
+    distances = l1_distances(data, data[center_indices[0]], chunk_rows)
+    labels = np.zeros(n, dtype=np.intp)  # closest center so far, ties towards the first chosen like closest_centers
+    for _ in range(1, instance.k):
+        masses = distances if weights is None else distances * weights
+        if masses.sum() > 0:
+            new_index = draw(masses)
         # make the code work in case one cluster consists of multiple points in the same spot, hence all having distance 0
         else:
-            dists_norm = 1/len(distances) #all have the same probability
-        new_index = np.random.choice(np.arange(0, len(instance.points)),
-                                     p=dists_norm)  # np.random method needed for p argument!
-        centers.append(instance.points[int(new_index)])
-    return CenterOutput(instance, centers=centers)
+            new_index = draw(weights)  # all have the same probability
+        new_distances = l1_distances(data, data[new_index], chunk_rows)
+        closer = new_distances < distances
+        labels[closer] = len(center_indices)
+        distances[closer] = new_distances[closer]
+        center_indices.append(new_index)
+    return CenterOutput.from_labels(instance, [instance.point(index) for index in center_indices], labels, distances)
 
 
-def lloyd_iteration(assignment: CenterOutput) -> CenterOutput:
+def lloyd_iteration(assignment: CenterOutput, find_medoid: Callable[[ndarray], int] = medoid_exact) -> CenterOutput:
     """
     Execute one iteration of Lloyd's algorithm.
     @param assignment: current assignment of centers
+    @param find_medoid: function computing the row of the medoid of a cluster given its (m, d) coordinates
+    @return: feasible solution of the k-median problem (NOT necessarily optimal)
+    """
+    return lloyd(assignment, 1, find_medoid)
+
+
+def lloyd(solution: CenterOutput, numiter: int, find_medoid: Callable[[ndarray], int] = medoid_exact,
+          update: str = "medoid", tol: Optional[float] = None,
+          callback: Optional[Callable[[list[Point]], None]] = None,
+          rng: Optional[np.random.Generator] = None) -> CenterOutput:
+    """
+    Execute up to numiter iterations of Lloyd's algorithm. The assignment step is one vectorized nearest-center
+    computation over the data matrix, and the clusters are grouped with a single argsort of the labels. The solution
+    starts from the assignment of the initial solution and returns the one of the last iteration, without extra passes.
+    @param solution: initial assignment of centers
+    @param numiter: (maximal) number of iterations
+    @param find_medoid: function computing the row of the medoid of a cluster given its (m, d) coordinates, for a
+    weighted instance also given the weights of the points as keyword argument weights
+    @param update: "medoid" to move each center to the medoid of its cluster, or "median" to move it to the
+    coordinate-wise median, which minimizes the 1-norm cost of the cluster (true k-medians)
+    @param tol: if given, stop as soon as the assignment no longer changes or the cost improves by at most a fraction
+    tol of the previous cost; if None, all numiter iterations are executed
+    @param callback: optional function called with the centers after each iteration
+    @param rng: (optional) random generator drawing the samples of the clusters that exceed the memory budget of a
+    memory-mapped instance, see chunked_medoid
     @return: feasible solution of the k-median problem (NOT necessarily optimal)
     """
-    clusterassignment = assignment.clusters()
-    new_centers = [medoid_bruteforce(clusterpoints) for center, clusterpoints
-                   in clusterassignment.items() if clusterpoints]
-    return CenterOutput(assignment.instance, centers=new_centers)
+    if update not in ("medoid", "median"):
+        raise ValueError(f"unknown center update {update!r}, expected 'medoid' or 'median'")
+    rng = np.random.default_rng(0) if rng is None else rng
+    instance = solution.instance
+    centers, labels, dists, cost = solution.centers, solution.labels, solution.distances, solution.cost
+    for iteration in range(numiter):
+        with instrumentation.span("lloyd_iteration", iteration=iteration) as region:
+            new_centers, new_labels, new_dists = lloyd_step(instance, centers, labels, find_medoid, update, rng)
+            new_cost = weighted_sum(new_dists, instance.weights)
+            region.set(cost=new_cost)
+        unchanged = len(new_centers) == len(centers) and np.array_equal(new_labels, labels)
+        converged = tol is not None and (unchanged or cost - new_cost <= tol * cost)
+        centers, labels, dists, cost = new_centers, new_labels, new_dists, new_cost
+        if callback is not None:
+            callback(centers)
+        if converged:
+            break
+    return CenterOutput.from_labels(instance, centers, labels, dists)
+
+
+def lloyd_step(instance: Instance, centers: list[Point], labels: ndarray, find_medoid: Callable[[ndarray], int],
+               update: str, rng: np.random.Generator) -> tuple[list[Point], ndarray, ndarray]:
+    """
+    Moves every center to the medoid or median of its cluster and assigns the points to the new centers. The medians
+    are computed column by column in chunked passes (cost_engine.group_medians). A medoid is computed from the
+    gathered coordinates of its cluster, unless the cluster has more than chunk_rows points, then see chunked_medoid.
+    @return: tuple containing the new centers, the new labels and the distances of the points to their new centers,
+    see lloyd for the parameters
+    """
+    data = instance.as_array()
+    weights = instance.weights  # the medoids and medians count a point of weight w as w copies of it
+    chunk_rows = instance.chunk_rows()
+    sizes = np.bincount(labels, minlength=len(centers))
+    if update == "median":
+        medians = cost_engine.group_medians(data, labels, len(centers), chunk_rows, weights)
+        new_centers = [Point(median) for median, size in zip(medians, sizes) if size > 0]
+    else:
+        order = np.argsort(labels, kind="stable")  # stable, so each cluster keeps the order of the instance
+        cluster_bounds = np.concatenate(([0], np.cumsum(sizes)))
+        new_centers = []
+        for c in np.flatnonzero(sizes):
+            members = order[cluster_bounds[c]:cluster_bounds[c + 1]]
+            if chunk_rows is not None and len(members) > chunk_rows:  # the cluster exceeds the memory budget
+                row = chunked_medoid(data, members, find_medoid, rng, chunk_rows, weights)
+            elif weights is None:
+                row = members[find_medoid(data[members])]
+            else:
+                row = members[find_medoid(data[members], weights=weights[members])]
+            new_centers.append(instance.point(row))
+    new_labels, dists = closest_centers(data, stack_coordinates(new_centers), chunk_rows)
+    return new_centers, new_labels, dists
+
+
+def chunked_medoid(data: ndarray, members: ndarray, find_medoid: Callable[[ndarray], int], rng: np.random.Generator,
+                   chunk_rows: int, weights: Optional[ndarray] = None, num_samples: int = 5,
+                   sample_size: int = 1000) -> int:
+    """
+    Computes an approximate medoid of a cluster too large to be gathered into memory, in the style of CLARA (see
+    util.medoid_sampled): the medoid of each of num_samples random samples is a candidate, and the candidate with the
+    lowest cost on the whole cluster is returned. The costs are summed over chunks of chunk_rows members, so only one
+    chunk of the cluster is in memory at a time.
+    @param data: (n, d) matrix of all points, may be memory-mapped
+    @param members: rows of the points of the cluster
+    @param find_medoid: function computing the row of the medoid of a sample given its coordinates, see lloyd
+    @param rng: random generator to draw the samples from
+    @param chunk_rows: number of members read at once
+    @param weights: (optional) weight of each point of data, heavier points are more likely to be sampled
+    @param num_samples: number of samples drawn
+    @param sample_size: number of points per sample
+    @return: row of the approximate medoid in data
+    """
+    member_weights = None if weights is None else weights[members]
+    probabilities = None if weights is None else member_weights / member_weights.sum()
+    sample_size = min(sample_size, chunk_rows, len(members) if weights is None else np.count_nonzero(member_weights))
+    candidates = []
+    for _ in range(num_samples):
+        sample = np.sort(rng.choice(len(members), size=sample_size, replace=False, p=probabilities))
+        if weights is None:
+            candidates.append(members[sample[find_medoid(data[members[sample]])]])
+        else:
+            candidates.append(members[sample[find_medoid(data[members[sample]], weights=member_weights[sample])]])
+    candidates = np.unique(candidates)
+    candidate_coords = np.asarray(data[candidates], dtype=np.float64)
+    costs = np.zeros(len(candidates))
+    for rows in row_chunks(len(members), chunk_rows):
+        chunk = np.asarray(data[members[rows]], dtype=np.float64)
+        for j, coords in enumerate(candidate_coords):
+            costs[j] += weighted_sum(l1_distances(chunk, coords), None if weights is None else member_weights[rows])
+    return int(candidates[np.argmin(costs)])
+
+
+def medoid_finder(method: str, rng: np.random.Generator, max_block_bytes: int) -> Callable[[ndarray], int]:
+    """
+    Returns the medoid function for the given method.
+    @param method: "exact" (blocked pairwise distances), "pruned" (exact, pruned candidates), "sampled"
+    (CLARA-style approximation) or "bruteforce" (the original O(m^2) Python loop)
+    @param rng: random generator used by the sampled method
+    @param max_block_bytes: memory ceiling for the temporary distance blocks
+    @return: function computing the row of the medoid of a cluster given its (m, d) coordinates (and optionally the
+    weights of the points)
+    """
+    if method == "exact":
+        return partial(medoid_exact, max_block_bytes=max_block_bytes)
+    if method == "pruned":
+        return partial(medoid_pruned, max_block_bytes=max_block_bytes)
+    if method == "sampled":
+        return partial(medoid_sampled, rng=rng, max_block_bytes=max_block_bytes)
+    if method == "bruteforce":
+        return lambda coords, weights=None: medoid_bruteforce([Point(row, index) for index, row in enumerate(coords)],
+                                                              weights).index
+    raise ValueError(f"unknown medoid method {method!r}, expected 'exact', 'pruned', 'sampled' or 'bruteforce'")
 
 
 @dataclass
@@ -64,6 +216,10 @@ class KMedPlusPlus:
     numiter: int = 1
     seed: Optional[int] = 0
     visualize: bool = False
+    medoid: str = "exact"  # how the medoids are computed in the Lloyd iterations, see medoid_finder
+    medoid_memory: int = 2 ** 26  # memory ceiling in bytes for the temporary distance blocks of the medoid computation
+    update: str = "medoid"  # "medoid" or "median" (coordinate-wise median, i.e. true k-medians)
+    tol: Optional[float] = None  # relative cost tolerance for stopping before numiter iterations, see lloyd
 
     def __call__(self, instance: Instance) -> CenterOutput:
         """
@@ -71,9 +227,18 @@ class KMedPlusPlus:
         @param instance: instance of the k-median problem
         @return: a solution to the k-median problem
         """
-        solution = prob_seed(instance, self.seed)
-        for _ in range(self.numiter):
-            solution = lloyd_iteration(solution)
-            if self.visualize:
-                visualization.clusterings.show_clusters(solution)
+        rng = np.random.default_rng(self.seed)
+        find_medoid = medoid_finder(self.medoid, rng, self.medoid_memory)
+        with instrumentation.span("seeding", n=instance.size(), k=instance.k):
+            solution = prob_seed(instance, rng)
+
+        def show(centers):
+            import visualization.clusterings  # imports matplotlib, so only when visualizing
+
+            visualization.clusterings.show_clusters(CenterOutput(instance, centers=centers))
+
+        with instrumentation.span("lloyd", numiter=self.numiter, update=self.update) as region:
+            solution = lloyd(solution, self.numiter, find_medoid, self.update, self.tol,
+                             show if self.visualize else None, rng)
+            region.set(cost=solution.cost)
         return solution
@@ -0,0 +1,91 @@
+"""
+runs independent trials of the randomized explainable solvers (Makarychev, Esfandiari) in parallel and keeps the best
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Optional
+
+import numpy as np
+from numpy import ndarray
+
+from solver_interface import ExplainableOutput, Instance
+
+
+@dataclass
+class TrialResults:
+    """represents the outcome of a multi-trial run"""
+    best: ExplainableOutput  # the tree with the lowest cost
+    best_trial: int  # index of the best trial
+    costs: ndarray  # cost of the tree of each trial
+    seeds: list[np.random.SeedSequence]  # seed of the random stream of each trial
+
+    def summary(self) -> dict[str, float]:
+        """
+        @return: statistics of the cost distribution over the trials
+        """
+        return {"trials": len(self.costs), "min": float(self.costs.min()), "max": float(self.costs.max()),
+                "mean": float(self.costs.mean()), "std": float(self.costs.std()),
+                "median": float(np.median(self.costs)), "q25": float(np.quantile(self.costs, 0.25)),
+                "q75": float(np.quantile(self.costs, 0.75))}
+
+
+@dataclass
+class BestOfN:
+    """Runs a randomized explainable solver N times with independent random streams, spread over a process pool,
+    and returns the tree with the lowest cost. The solver has to be a dataclass with a seed field, like Makarychev and
+    Esfandiari."""
+    solver: object
+    trials: int = 10
+    seed: Optional[int] = 0  # master seed, the streams of the trials are spawned from it
+    processes: Optional[int] = None  # size of the process pool, None uses all cores and 1 runs the trials serially
+
+    def __call__(self, instance: Instance, pre_clusters) -> ExplainableOutput:
+        """
+        Solve a k-median problem with the best of N trials of the solver
+        @param instance: instance of the k-median problem
+        @param pre_clusters: clustering of the instance to explain
+        @return: the explainable solution with the lowest cost
+        """
+        return self.run(instance, pre_clusters).best
+
+    def run(self, instance: Instance, pre_clusters) -> TrialResults:
+        """
+        Runs all trials. The workers only report the cost of their tree, the best tree is rebuilt afterwards from its
+        seed, which is cheaper than sending all trees back to the main process.
+        @param instance: instance of the k-median problem
+        @param pre_clusters: clustering of the instance to explain
+        @return: the best tree and the cost distribution of all trials
+        """
+        seeds = np.random.SeedSequence(self.seed).spawn(self.trials)
+        if self.processes == 1:
+            costs = [trial_cost(self.solver, instance, pre_clusters, seed) for seed in seeds]
+        else:
+            with ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker,
+                                     initargs=(self.solver, instance, pre_clusters)) as pool:
+                costs = list(pool.map(_run_trial, seeds))
+        costs = np.array(costs)
+        best_trial = int(np.argmin(costs))
+        best = replace(self.solver, seed=seeds[best_trial])(instance, pre_clusters)
+        return TrialResults(best, best_trial, costs, seeds)
+
+
+def trial_cost(solver, instance: Instance, pre_clusters, seed: np.random.SeedSequence) -> float:
+    """
+    Runs a single trial of the solver with the given seed.
+    @return: the cost of the resulting tree
+    """
+    output = replace(solver, seed=seed)(instance, pre_clusters)
+    return output.cost()
+
+
+_worker_state = None  # (solver, instance, pre_clusters), sent once per worker process instead of once per trial
+
+
+def _init_worker(solver, instance: Instance, pre_clusters):
+    global _worker_state
+    _worker_state = (solver, instance, pre_clusters)
+
+
+def _run_trial(seed: np.random.SeedSequence) -> float:
+    solver, instance, pre_clusters = _worker_state
+    return trial_cost(solver, instance, pre_clusters, seed)
@@ -0,0 +1,118 @@
+"""
+persistent on-disk cache for the results of the pre-clustering solvers, so that the explainable algorithms of an
+experiment do not wait for the same KMedPlusPlus run again and again
+"""
+import hashlib
+import json
+import os
+from dataclasses import dataclass, fields
+from typing import Optional
+
+import numpy as np
+
+from solver_interface import CenterOutput, Instance
+from util import TEMPORARY_PREFIX, Point, write_atomically
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache",
+                                 "pre_clusters")
+CACHE_FORMAT = 1  # part of every key, increase it when the entries or the results of the solvers change
+
+
+@dataclass
+class CachedSolver:
+    """Wraps a pre-clustering solver (like KMedPlusPlus) and stores its results in a content-addressed cache. The
+    key is the fingerprint of the data, k, the class of the solver, all its parameters (seed, numiter, ...) and
+    CACHE_FORMAT. An entry is a small .npz file holding the row of each center in the data and the label array; only
+    centers that are no data points (e.g. coordinate-wise medians) are stored with their coordinates. When the cache
+    grows beyond max_bytes, the least recently used entries are evicted. Solvers with a seed that is not an int
+    (None, a generator) are not deterministic and always run."""
+    solver: object
+    cache_dir: str = DEFAULT_CACHE_DIR
+    max_bytes: int = 2 ** 30
+
+    def __call__(self, instance: Instance) -> CenterOutput:
+        """
+        Returns the cached solution of the solver for the instance, and solves and caches it on a miss
+        @param instance: instance of the k-median problem
+        @return: a solution to the k-median problem
+        """
+        key = self.key(instance)
+        if key is None:
+            return self.solver(instance)
+        path = os.path.join(self.cache_dir, key + ".npz")
+        if os.path.exists(path):
+            try:
+                output = load_output(path, instance)
+                os.utime(path)  # the modification time marks the last use
+                return output
+            except (OSError, ValueError, KeyError):  # damaged or concurrently evicted entry, solve again
+                pass
+        output = self.solver(instance)
+        write_atomically(path, lambda file: save_output(file, output))
+        evict(self.cache_dir, self.max_bytes)
+        return output
+
+    def key(self, instance: Instance) -> Optional[str]:
+        """
+        @return: the cache key of the instance, None if the result of the solver is not reproducible
+        """
+        parameters = {field.name: getattr(self.solver, field.name) for field in fields(self.solver)
+                      if field.name != "visualize"}
+        seed = parameters.get("seed", 0)
+        if seed is None or not isinstance(seed, (int, np.integer)):
+            return None
+        description = json.dumps({"format": CACHE_FORMAT, "data": instance.fingerprint(), "k": instance.k,
+                                  "solver": type(self.solver).__qualname__, "parameters": parameters},
+                                 sort_keys=True, default=str)
+        return hashlib.sha256(description.encode()).hexdigest()[:32]
+
+
+def save_output(file, output: CenterOutput):
+    """
+    Stores a solution as center rows and labels, in the smallest integer types that fit.
+    @param file: path or binary file object of the .npz file
+    """
+    center_indices = np.array([-1 if center.index is None else center.index for center in output.centers],
+                              dtype=np.int64)
+    center_coords = np.array([center.coordinates for center in output.centers if center.index is None],
+                             dtype=np.float64).reshape(-1, output.instance.dimension())
+    np.savez(file, center_indices=center_indices, center_coords=center_coords,
+             labels=output.labels.astype(np.min_scalar_type(max(len(output.centers) - 1, 0))))
+
+
+def load_output(path: str, instance: Instance) -> CenterOutput:
+    """
+    Restores a solution stored by save_output for the same instance.
+    """
+    with np.load(path) as arrays:
+        center_indices, center_coords, labels = arrays["center_indices"], arrays["center_coords"], arrays["labels"]
+    if len(labels) != instance.size():
+        raise ValueError(f"{path} belongs to an instance of {len(labels)} points, not {instance.size()}")
+    coords = iter(center_coords)
+    centers = [Point(next(coords)) if index < 0 else instance.point(index) for index in center_indices]
+    return CenterOutput.from_labels(instance, centers, labels)
+
+
+def evict(cache_dir: str, max_bytes: int):
+    """
+    Deletes the least recently used entries of the cache until it takes at most max_bytes. Files that are being
+    written (or were left behind by a crashed writer) are no entries and never deleted.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".npz") or name.startswith(TEMPORARY_PREFIX) or ".tmp." in name:
+            continue
+        try:
+            stat = os.stat(os.path.join(cache_dir, name))
+        except FileNotFoundError:  # evicted by another process
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            pass
+        total -= size
@@ -1,16 +1,18 @@
 from dataclasses import dataclass
-from math import inf
-from sklearn.cluster import KMeans
-from util import Point
-import matplotlib.pyplot as plt
-import numpy as np
-from sklearn.tree import DecisionTreeClassifier, plot_tree
 
-from solver_interface import ExplainableOutput, ClusterNode, make_kids
+from solver_interface import ExplainableOutput, ClusterNode, make_kids, pre_cluster_labels
 
 
 @dataclass
 class SKLearn:
+    """Solver that explains the pre-clustering with a scikit-learn decision tree of k leaves. scikit-learn is
+    imported when the solver is created, so that its import time is not part of the timed runs, and matplotlib only
+    if plot is set."""
+    plot: bool = False  # draw the decision tree with sklearn.tree.plot_tree into the current matplotlib figure
+
+    def __post_init__(self):
+        from sklearn.tree import DecisionTreeClassifier  # optional dependency, not needed by the other solvers
+        self._classifier = DecisionTreeClassifier
 
     def __call__(self, instance, pre_clusters):
         # run KMeans
@@ -23,27 +25,22 @@ class SKLearn:
         #                 pre_centers}
 
         # run DecisionTreeClassifier
-        instance_in = np.array([point.coordinates for point in instance.points])
-        X = np.array(instance_in)
-
-        def find_label(pre_clusters, point):
-            labels = list(pre_clusters.keys())
-            for center in pre_clusters.keys():
-                if point in pre_clusters[center]:
-                    return labels.index(center)
+        X = instance.as_array()
 
-        Y = np.array([find_label(pre_clusters, point) for point in instance.points])
+        _, Y = pre_cluster_labels(instance, pre_clusters)
         #Y = kmeans_out.labels_
-        dec_tree = DecisionTreeClassifier(max_leaf_nodes=instance.k)
-        dec_tree = dec_tree.fit(X, Y)
+        dec_tree = self._classifier(max_leaf_nodes=instance.k)
+        dec_tree = dec_tree.fit(X, Y, sample_weight=instance.weights)
 
         underlyingtree = dec_tree.tree_
-        plot_tree(dec_tree)
-        # plt.show()
+        if self.plot:
+            from sklearn.tree import plot_tree
+
+            plot_tree(dec_tree)
+            # plt.show()
         leaves = []
         split_nodes = []
-        dim = instance.dimension()
-        root = ClusterNode(pre_clusters, np.array([[-inf, inf]] * dim), instance.points)
+        root = ClusterNode.root(instance, pre_clusters, reassign=True)
 
         def rec_tree(node: ClusterNode, j: int):
             if underlyingtree.children_left[j] == underlyingtree.children_right[j]:
@@ -54,7 +51,7 @@ class SKLearn:
                 i = underlyingtree.feature[j]
                 theta = underlyingtree.threshold[j]
 
-                node_L, node_R = make_kids(node, i, theta, False)
+                node_L, node_R = make_kids(node, i, theta)
 
                 rec_tree(node_L, underlyingtree.children_left[j])
                 rec_tree(node_R, underlyingtree.children_right[j])
@@ -0,0 +1,125 @@
+"""
+streaming variant of the k-median++ pre-clustering: consumes the data in chunks and keeps a bounded weighted summary
+of it, so new batches of data do not require a run over the whole history
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from numpy import ndarray
+
+from algorithms.kmedplusplus import lloyd, medoid_finder, prob_seed
+from solver_interface import ArrayInstance, CenterOutput, Instance, check_weights
+from util import Point, row_chunks
+
+
+def reduce_summary(data: ndarray, weights: ndarray, size: int, rng: np.random.Generator) -> tuple[ndarray, ndarray]:
+    """
+    Shrinks a weighted point set to at most size representatives: k-median++ seeding picks size of the points, and
+    every point hands its weight to the closest representative (merge and reduce, as in StreamKM++).
+    @param data: (n, d) matrix of the points
+    @param weights: weight of each point
+    @param size: maximal number of representatives
+    @param rng: random generator of the seeding
+    @return: tuple containing the (m, d) matrix of the representatives and their weights
+    """
+    seeding = prob_seed(ArrayInstance(data, size, weights=weights), rng)
+    rows = np.array([center.index for center in seeding.centers])
+    summary_weights = np.bincount(seeding.labels, weights=weights, minlength=len(rows))
+    keep = summary_weights > 0  # duplicate representatives (all distances 0) receive no weight
+    return data[rows[keep]], summary_weights[keep]
+
+
+@dataclass
+class StreamingKMedPlusPlus:
+    """Solver for the k-median problem that sees the points chunk by chunk. partial_fit adds a chunk to a weighted
+    summary of at most summary_size points, which is reduced by merge and reduce whenever it holds twice as many, so
+    memory and time per point stay bounded however many chunks arrive. finalize(k) runs the weighted k-median++
+    algorithm (seeding and Lloyd) a few times on the small summary and keeps the cheapest solution, and
+    assign(instance) returns the CenterOutput of any instance for these centers, which the explainable solvers take
+    as pre-clustering. Called like KMedPlusPlus, it streams the whole instance."""
+    summary_size: int = 500
+    numiter: int = 5
+    seed: Optional[int] = 0
+    medoid: str = "pruned"  # how the medoids are computed in the Lloyd iterations, see kmedplusplus.medoid_finder
+    medoid_memory: int = 2 ** 26  # memory ceiling in bytes for the temporary distance blocks of the medoids
+    update: str = "medoid"  # "medoid" or "median" (coordinate-wise median, i.e. true k-medians)
+    tol: Optional[float] = None  # relative cost tolerance for stopping before numiter iterations, see lloyd
+    restarts: int = 10  # independent k-median++ runs on the summary in finalize, the cheapest one is kept
+    chunk_rows: int = 100_000  # rows per chunk when streaming an instance that is in memory
+
+    def __post_init__(self):
+        self.reset()
+
+    def reset(self):
+        """forgets all chunks seen so far"""
+        self._rng = np.random.default_rng(self.seed)
+        self._parts: list[tuple[ndarray, ndarray]] = []  # summary and pending chunks with their weights
+        self._num_rows = 0  # rows in self._parts
+        self.total_weight = 0.0  # total weight of all points seen
+        self.centers: Optional[list[Point]] = None
+
+    def partial_fit(self, chunk: ndarray, weights: Optional[ndarray] = None):
+        """
+        Adds a chunk of points to the summary.
+        @param chunk: (m, d) matrix of points, e.g. from a get_chunks loader
+        @param weights: (optional) weight of each point, default 1
+        @return: self
+        """
+        chunk = np.array(chunk, dtype=np.float64, ndmin=2)  # a copy, the chunk may be a view on a loader buffer
+        weights = check_weights(weights, len(chunk))
+        weights = np.ones(len(chunk)) if weights is None else weights
+        self._parts.append((chunk, weights))
+        self._num_rows += len(chunk)
+        self.total_weight += float(weights.sum())
+        if self._num_rows > 2 * self.summary_size:
+            self._parts = [reduce_summary(*self.summary(), self.summary_size, self._rng)]
+            self._num_rows = len(self._parts[0][0])
+        return self
+
+    def summary(self) -> tuple[ndarray, ndarray]:
+        """
+        @return: tuple containing the points of the current summary and their weights, which add up to the total
+        weight of the points seen
+        """
+        if not self._parts:
+            raise ValueError("no points seen, call partial_fit first")
+        data, weights = zip(*self._parts)
+        return np.concatenate(data), np.concatenate(weights)
+
+    def finalize(self, k: int) -> list[Point]:
+        """
+        Solves the k-median problem on the summary. More chunks may be added afterwards and finalize called again.
+        @param k: number of centers to be opened
+        @return: the centers, which are not tied to the rows of any instance (their index is None)
+        """
+        data, weights = self.summary()
+        summary = ArrayInstance(data, min(k, len(data)), weights=weights)
+        find_medoid = medoid_finder(self.medoid, self._rng, self.medoid_memory)
+        solutions = [lloyd(prob_seed(summary, self._rng), self.numiter, find_medoid, self.update, self.tol)
+                     for _ in range(self.restarts)]
+        best = min(solutions, key=lambda solution: solution.cost)
+        self.centers = [Point(center.coordinates.copy()) for center in best.centers]
+        return self.centers
+
+    def assign(self, instance: Instance) -> CenterOutput:
+        """
+        @param instance: instance of the k-median problem, e.g. the latest batch or all points seen
+        @return: the solution that assigns each point of the instance to its closest center of the last finalize
+        """
+        if self.centers is None:
+            raise ValueError("no centers, call finalize first")
+        return CenterOutput(instance, centers=self.centers)
+
+    def __call__(self, instance: Instance) -> CenterOutput:
+        """
+        Solve a k-median problem by streaming the instance through a fresh summary
+        @param instance: instance of the k-median problem
+        @return: a solution to the k-median problem
+        """
+        self.reset()
+        data = instance.as_array()
+        for rows in row_chunks(len(data), instance.chunk_rows() or self.chunk_rows):
+            self.partial_fit(data[rows], None if instance.weights is None else instance.weights[rows])
+        self.finalize(instance.k)
+        return self.assign(instance)
@@ -0,0 +1,161 @@
+"""
+command line interface of the benchmark suite, run from the repository root:
+
+    python -m benchmark run --grid benchmark/grids/quick.json --json results.json --csv results.csv
+    python -m benchmark run --baseline baseline.json     (exits with status 1 on a regression)
+    python -m benchmark compare results.json baseline.json
+    python -m benchmark run --grid benchmark/grids/quick.json --trace quick   (writes quick.jsonl, quick.trace.json)
+    python -m benchmark memory --grid benchmark/grids/quick.json --json memory.json --plot memory.png
+    python -m benchmark startup     (exits with status 1 if a core module imports matplotlib or scikit-learn)
+"""
+import argparse
+import contextlib
+import os
+import sys
+
+import instrumentation
+
+from algorithms.precluster_cache import DEFAULT_CACHE_DIR
+from benchmark.grid import Grid
+from benchmark.results import compare, load_json, metadata, write_csv, write_json
+
+DEFAULT_GRID = os.path.join(os.path.dirname(__file__), "grids", "default.json")
+
+
+def parse_arguments(arguments=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run a benchmark grid")
+    run.add_argument("--grid", default=DEFAULT_GRID, help="JSON file describing the grid (default: %(default)s)")
+    run.add_argument("--algorithms", nargs="+", help="only run these algorithms of the grid")
+    run.add_argument("--warmup", type=int, help="untimed runs per phase, overrides the grid")
+    run.add_argument("--repeat", type=int, help="timed runs per phase, overrides the grid")
+    run.add_argument("--pre-cache", nargs="?", const=DEFAULT_CACHE_DIR,
+                     help="load the pre-clusterings from this cache directory (default: %(const)s), overrides the "
+                          "grid")
+    run.add_argument("--json", help="write the results, including all samples, to this JSON file")
+    run.add_argument("--csv", help="write the median and IQR of each phase to this CSV file")
+    run.add_argument("--baseline", help="check the results against this JSON file of an earlier run")
+    run.add_argument("--trace", metavar="PREFIX",
+                     help="trace the solvers and write PREFIX.jsonl and PREFIX.trace.json (Chrome trace format); the "
+                          "tracing overhead is included in the timings")
+    add_check_arguments(run)
+
+    memory = commands.add_parser("memory", help="measure the memory of each case of a grid in a fresh process")
+    memory.add_argument("--grid", default=DEFAULT_GRID, help="JSON file describing the grid (default: %(default)s)")
+    memory.add_argument("--algorithms", nargs="+", help="only run these algorithms of the grid")
+    memory.add_argument("--pre-cache", nargs="?", const=DEFAULT_CACHE_DIR,
+                        help="load the pre-clusterings from this cache directory (default: %(const)s), overrides the "
+                             "grid")
+    memory.add_argument("--json", help="write the results to this JSON file")
+    memory.add_argument("--csv", help="write the resident set sizes and the statistics of each phase to this CSV file")
+    memory.add_argument("--plot", help="plot the memory of the build phase against the instance size to this file")
+
+    startup = commands.add_parser("startup", help="measure the import time of the solver modules")
+    startup.add_argument("--modules", nargs="+", help="modules to import (default: the headless core)")
+    startup.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module (default: %(default)s)")
+    startup.add_argument("--json", help="write the results to this JSON file")
+
+    check = commands.add_parser("compare", help="check stored results against a baseline")
+    check.add_argument("results", help="JSON file of the run to check")
+    check.add_argument("baseline", help="JSON file of the baseline run")
+    add_check_arguments(check)
+    return parser.parse_args(arguments)
+
+
+def add_check_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative slowdown of the median time of a phase (default: %(default)s)")
+    parser.add_argument("--min-seconds", type=float, default=1e-3,
+                        help="ignore slowdowns below this many seconds (default: %(default)s)")
+
+
+def check(records: list[dict], baseline_path: str, arguments: argparse.Namespace) -> int:
+    regressions = compare(records, load_json(baseline_path), arguments.tolerance, arguments.min_seconds)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print(f"{len(regressions)} regression(s) compared to {baseline_path}")
+    return 1 if regressions else 0
+
+
+def main(arguments=None) -> int:
+    arguments = parse_arguments(arguments)
+    if arguments.command == "compare":
+        return check(load_json(arguments.results), arguments.baseline, arguments)
+    if arguments.command == "memory":
+        return run_memory(arguments)
+    if arguments.command == "startup":
+        return run_startup(arguments)
+
+    from benchmark.runner import run_grid  # imports all algorithms, not needed to compare stored results
+
+    grid = Grid.load(arguments.grid)
+    if arguments.warmup is not None:
+        grid.warmup = arguments.warmup
+    if arguments.repeat is not None:
+        grid.repeat = arguments.repeat
+    if arguments.pre_cache is not None:
+        grid.pre_cache = arguments.pre_cache
+
+    def progress(case, record):
+        phases = "  ".join(f"{phase} {timing['median']:.4f}s ±{timing['iqr']:.4f}"
+                           for phase, timing in record["phases"].items())
+        print(f"{case.algorithm:<11} {case.dataset:<11} n={record['size']:<7} k={case.k:<3} seed={case.seed:<3} "
+              f"{phases}  cost {record['cost']:.6g}", flush=True)
+
+    with instrumentation.tracing() if arguments.trace else contextlib.nullcontext() as tracer:
+        records = run_grid(grid, arguments.algorithms, progress)
+    if arguments.trace:
+        tracer.write_jsonl(arguments.trace + ".jsonl")
+        tracer.write_chrome_trace(arguments.trace + ".trace.json")
+    if arguments.json:
+        write_json(arguments.json, records, metadata(grid))
+    if arguments.csv:
+        write_csv(arguments.csv, records)
+    if arguments.baseline:
+        return check(records, arguments.baseline, arguments)
+    return 0
+
+
+def run_memory(arguments: argparse.Namespace) -> int:
+    from benchmark.memory import plot_memory, run_memory_grid, write_memory_csv
+
+    grid = Grid.load(arguments.grid)
+    if arguments.pre_cache is not None:
+        grid.pre_cache = arguments.pre_cache
+
+    def progress(case, record):
+        phases = "  ".join(f"{phase} peak {statistics['peak_bytes'] / 2 ** 20:.1f}MiB "
+                           f"({statistics['retained_blocks']} net blocks retained)"
+                           for phase, statistics in record["phases"].items() if phase != "load")
+        print(f"{case.algorithm:<11} {case.dataset:<11} n={record['size']:<7} k={case.k:<3} seed={case.seed:<3} "
+              f"RSS {record['rss_peak_bytes'] / 2 ** 20:.1f}MiB  {phases}", flush=True)
+
+    records = run_memory_grid(grid, arguments.algorithms, progress)
+    if arguments.json:
+        write_json(arguments.json, records, metadata(grid))
+    if arguments.csv:
+        write_memory_csv(arguments.csv, records)
+    if arguments.plot:
+        plot_memory(records, arguments.plot)
+    return 0
+
+
+def run_startup(arguments: argparse.Namespace) -> int:
+    from benchmark.startup import CORE_MODULES, measure_startup
+
+    records = measure_startup(tuple(arguments.modules or CORE_MODULES), arguments.repeat)
+    for record in records:
+        optional = f"  imports {', '.join(record['optional'])}" if record["optional"] else ""
+        print(f"{record['module']:<45} {record['median'] * 1000:8.1f}ms  {record['modules']:5} modules{optional}")
+    if arguments.json:
+        write_json(arguments.json, records, metadata(None))
+    heavy = [record["module"] for record in records if record["optional"]]
+    if heavy:
+        print(f"{len(heavy)} module(s) import optional dependencies: {', '.join(heavy)}")
+    return 1 if heavy else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+declarative description of a benchmark: the cartesian product of algorithms, data sets, sizes, k and seeds
+"""
+from __future__ import annotations
+
+import itertools
+import json
+from dataclasses import asdict, dataclass, field
+from typing import Iterator, Optional
+
+
+@dataclass(frozen=True)
+class Case:
+    """a single benchmark run: one explainable algorithm on one pre-clustered instance"""
+    algorithm: str
+    dataset: str
+    n: int  # requested number of points, the instance may be smaller if the data set is
+    k: int
+    seed: int  # seed of the pre-clustering and of the randomized algorithms
+
+    def key(self) -> tuple:
+        return self.algorithm, self.dataset, self.n, self.k, self.seed
+
+
+@dataclass
+class Grid:
+    """represents a benchmark grid, every combination of the lists is one Case"""
+    algorithms: list[str]
+    datasets: list[str]
+    sizes: list[int]
+    ks: list[int] = field(default_factory=lambda: [5])
+    seeds: list[int] = field(default_factory=lambda: [0])
+    max_sizes: dict[str, int] = field(default_factory=dict)  # per algorithm, skip larger sizes (slow algorithms)
+    pre_numiter: int = 7  # Lloyd iterations of the KMedPlusPlus pre-clustering
+    pre_medoid: str = "pruned"  # medoid computation of the KMedPlusPlus pre-clustering, see kmedplusplus.medoid_finder
+    pre_cache: Optional[str] = None  # directory of a pre-clustering cache, None always runs the pre-clustering
+    warmup: int = 1  # untimed runs of each phase before the timed ones
+    repeat: int = 5  # timed runs of each phase
+
+    @classmethod
+    def load(cls, path: str) -> Grid:
+        with open(path) as file:
+            return cls(**json.load(file))
+
+    def save(self, path: str):
+        with open(path, "w") as file:
+            json.dump(asdict(self), file, indent=2)
+
+    def cases(self, algorithms: Optional[list[str]] = None) -> Iterator[Case]:
+        """
+        @param algorithms: (optional) only the cases of these algorithms
+        @return: iterator over the cases, all algorithms of one instance come one after the other
+        """
+        for dataset, size, k, seed in itertools.product(self.datasets, self.sizes, self.ks, self.seeds):
+            for name in self.algorithms:
+                if algorithms is not None and name not in algorithms:
+                    continue
+                if size > self.max_sizes.get(name, size):
+                    continue
+                yield Case(name, dataset, size, k, seed)
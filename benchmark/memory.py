@@ -0,0 +1,193 @@
+"""
+memory mode of the benchmark suite: every case runs in a fresh process, which warms up on a small instance and then
+reports its peak resident set size and, for each phase, the tracemalloc peak, the bytes and memory blocks the phase
+leaves behind with the source lines that allocated most of them, and (on Linux) the peak resident set size during the
+phase
+"""
+import csv
+import gc
+import multiprocessing
+import resource
+import sys
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional, Tuple
+
+from algorithms.kmedplusplus import KMedPlusPlus
+from algorithms.precluster_cache import CachedSolver
+from benchmark import registry
+from benchmark.grid import Case, Grid
+from benchmark.results import KEY_FIELDS
+
+MEMORY_PHASES = ("load", "pre_cluster", "build", "cost")
+MEMORY_STATISTICS = ("peak_bytes", "retained_bytes", "retained_blocks", "rss_peak_bytes")
+RETAINED_SITES = 5  # number of source lines listed per phase, see measure_phase
+WARMUP_SIZE = 200  # points of the instance a case warms up on, see warm_up
+
+
+def rss_peak_bytes() -> int:
+    """@return: the peak resident set size of this process since it started or since the last reset_rss_peak"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports kilobytes, macOS bytes
+
+
+def reset_rss_peak() -> bool:
+    """
+    Resets the peak resident set size of this process to its current resident set size, which only Linux supports
+    (by writing 5 to /proc/self/clear_refs).
+    @return: True if the peak was reset
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def measure_phase(function: Callable[[], object]) -> Tuple[object, dict]:
+    """
+    Runs function once while tracemalloc is tracing.
+    @return: tuple containing the result and the memory statistics of the phase: "peak_bytes" is the peak of the
+    traced memory above its level at the start, "retained_bytes" and "retained_blocks" are the net bytes and the net
+    number of memory blocks the phase leaves behind, i.e. the blocks still alive at its end minus the blocks it freed
+    (e.g. one per Point object or dict). They are no allocation counts: tracemalloc only sees live blocks, so blocks
+    allocated and freed within the phase do not count. "retained_sites" lists the RETAINED_SITES source lines that
+    retain the most bytes, with their net bytes and blocks, and "rss_peak_bytes" is the peak resident set size of the
+    process during the phase, None if the peak cannot be reset on this platform
+    """
+    gc.collect()
+    before = traced_snapshot()
+    start, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    rss_reset = reset_rss_peak()
+    result = function()
+    current, peak = tracemalloc.get_traced_memory()
+    rss_peak = rss_peak_bytes() if rss_reset else None
+    gc.collect()
+    statistics = traced_snapshot().compare_to(before, "lineno")  # sorted by the absolute size difference
+    sites = [{"site": f"{statistic.traceback[0].filename}:{statistic.traceback[0].lineno}",
+              "bytes": statistic.size_diff, "blocks": statistic.count_diff}
+             for statistic in statistics if statistic.size_diff > 0][:RETAINED_SITES]
+    return result, {"peak_bytes": peak - start, "retained_bytes": current - start,
+                    "retained_blocks": sum(statistic.count_diff for statistic in statistics),
+                    "retained_sites": sites, "rss_peak_bytes": rss_peak}
+
+
+def traced_snapshot() -> tracemalloc.Snapshot:
+    """@return: a snapshot of the traced memory without the blocks of tracemalloc itself, e.g. earlier snapshots"""
+    return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+def warm_up(case: Case, grid: Grid):
+    """
+    Runs the pipeline of a case once on a small synthetic instance, so that the measured phases do not include the
+    imports of the solver modules, the first-call setup of numpy and other one-off allocations. Neither the data set
+    of the case nor the pre-clustering cache are touched, the load phase still measures the first load.
+    """
+    instance = registry.dataset("synthetic", max(WARMUP_SIZE, 2 * case.k), case.k, case.seed)
+    pre_clusters = KMedPlusPlus(numiter=grid.pre_numiter, seed=case.seed, medoid=grid.pre_medoid)(instance)
+    registry.algorithm(case.algorithm, case.seed)(instance, pre_clusters).cost()
+
+
+def measure_case(case: Case, grid: Grid) -> dict:
+    """
+    Measures the memory of one case in the calling process, which should be a fresh one, see run_memory_grid. The
+    process warms up first, see warm_up.
+    @return: the record of the case: its parameters, the actual instance size, the peak resident set size of the
+    process before loading the instance and over the whole case, and the statistics of each phase, see measure_phase
+    """
+    warm_up(case, grid)
+    gc.collect()
+    reset_rss_peak()  # the peak of the warm-up does not count where the peak can be reset
+    rss_peaks = [rss_peak_bytes()]  # peaks of the process before every reset of measure_phase and at the end
+
+    def phase(function: Callable[[], object]) -> Tuple[object, dict]:
+        rss_peaks.append(rss_peak_bytes())  # the previous phase and the work since, lost by the next reset
+        return measure_phase(function)
+
+    tracemalloc.start()
+    try:
+        phases = {}
+        instance, phases["load"] = phase(lambda: registry.dataset(case.dataset, case.n, case.k, case.seed))
+        pre_solver = KMedPlusPlus(numiter=grid.pre_numiter, seed=case.seed, medoid=grid.pre_medoid)
+        if grid.pre_cache is not None:
+            pre_solver = CachedSolver(pre_solver, grid.pre_cache)
+        pre_clusters, phases["pre_cluster"] = phase(lambda: pre_solver(instance))
+        solver = registry.algorithm(case.algorithm, case.seed)
+        output, phases["build"] = phase(lambda: solver(instance, pre_clusters))
+        cost, phases["cost"] = phase(output.cost)
+    finally:
+        tracemalloc.stop()
+    rss_peaks.append(rss_peak_bytes())
+    return {"algorithm": case.algorithm, "dataset": case.dataset, "n": case.n, "k": case.k, "seed": case.seed,
+            "size": instance.size(), "cost": float(cost), "rss_start_bytes": rss_peaks[0],
+            "rss_peak_bytes": max(rss_peaks), "phases": phases}
+
+
+def run_memory_grid(grid: Grid, algorithms: Optional[list[str]] = None,
+                    progress: Optional[Callable[[Case, dict], None]] = None) -> list[dict]:
+    """
+    Measures the memory of all cases of the grid, each in a new spawned process, so that no case inherits the heap,
+    the caches or the resident set of another. The processes start from scratch, which takes about a second each.
+    @param grid: the benchmark grid, its warmup and repeat settings are ignored
+    @param algorithms: (optional) only run the cases of these algorithms
+    @param progress: (optional) function called with each case and its record once it is done
+    @return: one record per case, see measure_case
+    """
+    records = []
+    context = multiprocessing.get_context("spawn")
+    for case in grid.cases(algorithms):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            record = pool.submit(measure_case, case, grid).result()
+        records.append(record)
+        if progress is not None:
+            progress(case, record)
+    return records
+
+
+def write_memory_csv(path: str, records: list[dict]):
+    """writes one row per case with the resident set sizes and the statistics of each phase, without the sites"""
+    columns = list(KEY_FIELDS) + ["size", "rss_start_bytes", "rss_peak_bytes"] + \
+        [f"{phase}_{statistic}" for phase in MEMORY_PHASES for statistic in MEMORY_STATISTICS]
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+        for record in records:
+            row = {name: record[name] for name in columns[:len(KEY_FIELDS) + 3]}
+            for phase in MEMORY_PHASES:
+                for statistic in MEMORY_STATISTICS:
+                    row[f"{phase}_{statistic}"] = record["phases"][phase][statistic]
+            writer.writerow(row)
+
+
+def plot_memory(records: list[dict], path: str, phase: str = "build"):
+    """
+    Plots the tracemalloc peak of a phase and the peak resident set size of the process against the instance size,
+    one curve per algorithm (and data set, if there are several), on log-log axes.
+    @param records: records of run_memory_grid
+    @param path: file to save the figure to
+    @param phase: phase whose peak is plotted
+    """
+    import matplotlib.pyplot as plt  # only needed for plots
+
+    figure, (ax_phase, ax_rss) = plt.subplots(1, 2, figsize=(11, 4))
+    series = sorted({(record["algorithm"], record["dataset"]) for record in records})
+    several_datasets = len({dataset for _, dataset in series}) > 1
+    for algorithm, dataset in series:
+        points = sorted((record["size"], record["phases"][phase]["peak_bytes"], record["rss_peak_bytes"])
+                        for record in records if (record["algorithm"], record["dataset"]) == (algorithm, dataset))
+        label = f"{algorithm} ({dataset})" if several_datasets else algorithm
+        sizes = [size for size, _, _ in points]
+        ax_phase.plot(sizes, [peak / 2 ** 20 for _, peak, _ in points], marker="o", label=label)
+        ax_rss.plot(sizes, [rss / 2 ** 20 for _, _, rss in points], marker="o", label=label)
+    for ax, title in ((ax_phase, f"{phase}: tracemalloc peak"), (ax_rss, "peak RSS of the process")):
+        ax.set_xscale("log")
+        ax.set_yscale("log")
+        ax.set_xlabel("Instance size")
+        ax.set_ylabel("Memory (MiB)")
+        ax.set_title(title)
+        ax.legend()
+    figure.tight_layout()
+    figure.savefig(path)
+    plt.close(figure)
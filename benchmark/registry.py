@@ -0,0 +1,86 @@
+"""
+names of the algorithms and data sets a benchmark grid can refer to
+"""
+import importlib
+from functools import lru_cache
+from typing import Callable
+
+from solver_interface import ArrayInstance, Instance
+import data.creditcard.conversion_creditcard
+import data.mall.conversion
+import data.synthetic
+from data.dataset import Dataset
+
+CREDITCARD_PARAMETERS = {name: name in ('BALANCE', 'PURCHASES')
+                         for name in data.creditcard.conversion_creditcard.param_names}
+MALL_PARAMETERS = {'age': False, 'income': True, 'spending_score': True}
+
+
+def plugin(module: str, name: str, seeded: bool = False) -> Callable[[int], object]:
+    """
+    @param module: module of the solver, only imported when the first solver is created
+    @param name: name of the solver class in module
+    @param seeded: if True, the solver takes the seed, otherwise it is deterministic and ignores it
+    @return: function creating the solver for a given seed
+    """
+    def create(seed: int):
+        solver = getattr(importlib.import_module(module), name)
+        return solver(seed=seed) if seeded else solver()
+
+    return create
+
+
+# explainable solver for a given seed; the modules are imported on first use, so the optional dependencies of one
+# solver (scikit-learn) are not needed to run the others
+ALGORITHMS: dict[str, Callable[[int], object]] = {
+    "IMM": plugin("algorithms.iterative_mistake_minimization", "IMM"),
+    "Makarychev": plugin("algorithms.Makarychev_algorithm", "Makarychev", seeded=True),
+    "Esfandiari": plugin("algorithms.Esfandiari_algorithm", "Esfandiari", seeded=True),
+    "SKLearn": plugin("algorithms.sklearn_builtins", "SKLearn"),
+}
+
+
+@lru_cache(maxsize=None)
+def load_dataset(name: str) -> Dataset:
+    """loads each csv data set once per process, the instances of a sweep are prefix views on it"""
+    if name == "creditcard":
+        return Dataset(data.creditcard.conversion_creditcard.get_data(CREDITCARD_PARAMETERS, None))
+    if name == "mall":
+        return Dataset(data.mall.conversion.get_data(MALL_PARAMETERS))
+    raise ValueError(f"{name!r} is no csv data set")
+
+
+def creditcard(n: int, k: int, seed: int) -> Instance:
+    """the first n customers of the credit card data set, with balance and purchases"""
+    return load_dataset("creditcard").prefix(n, k)
+
+
+def mall(n: int, k: int, seed: int) -> Instance:
+    """the first n customers of the mall data set, with income and spending score"""
+    return load_dataset("mall").prefix(n, k)
+
+
+def synthetic(n: int, k: int, seed: int) -> Instance:
+    """k clusters around the k-th roots of unity with about n points in total"""
+    cluster_size = max(1, n // k - 1)  # every cluster also contains its center
+    return ArrayInstance.from_instance(data.synthetic.k_clusters(k, cluster_size=cluster_size, instance_seed=seed))
+
+
+# instance for given n, k and seed
+DATASETS: dict[str, Callable[[int, int, int], Instance]] = {
+    "creditcard": creditcard,
+    "mall": mall,
+    "synthetic": synthetic,
+}
+
+
+def algorithm(name: str, seed: int):
+    if name not in ALGORITHMS:
+        raise ValueError(f"unknown algorithm {name!r}, expected one of {sorted(ALGORITHMS)}")
+    return ALGORITHMS[name](seed)
+
+
+def dataset(name: str, n: int, k: int, seed: int) -> Instance:
+    if name not in DATASETS:
+        raise ValueError(f"unknown data set {name!r}, expected one of {sorted(DATASETS)}")
+    return DATASETS[name](n, k, seed)
@@ -0,0 +1,95 @@
+"""
+storage of benchmark results as JSON or CSV and the regression check against a stored baseline
+"""
+import csv
+import json
+import platform
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import numpy as np
+
+from benchmark.grid import Grid
+
+PHASES = ("pre_cluster", "build", "cost")
+KEY_FIELDS = ("algorithm", "dataset", "n", "k", "seed")
+
+
+def metadata(grid: Optional[Grid]) -> dict:
+    """@return: the environment and settings of a benchmark run, grid is None for runs without a grid"""
+    return {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "numpy": np.__version__, "machine": platform.machine(), "platform": platform.platform(),
+            "grid": None if grid is None else asdict(grid)}
+
+
+def write_json(path: str, records: list[dict], meta: dict):
+    with open(path, "w") as file:
+        json.dump({"meta": meta, "results": records}, file, indent=2)
+
+
+def load_json(path: str) -> list[dict]:
+    with open(path) as file:
+        return json.load(file)["results"]
+
+
+def write_csv(path: str, records: list[dict]):
+    """writes one row per case with the median and IQR of each phase, without the single samples"""
+    columns = list(KEY_FIELDS) + ["size", "pre_cost", "cost"] + \
+        [f"{phase}_{statistic}" for phase in PHASES for statistic in ("median", "iqr")]
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+        for record in records:
+            row = {name: record[name] for name in columns[:len(KEY_FIELDS) + 3]}
+            for phase in PHASES:
+                row[f"{phase}_median"] = record["phases"][phase]["median"]
+                row[f"{phase}_iqr"] = record["phases"][phase]["iqr"]
+            writer.writerow(row)
+
+
+@dataclass
+class Regression:
+    """a case whose phase got slower or whose cost changed compared to the baseline"""
+    key: tuple
+    what: str  # name of the phase, or "cost"
+    baseline: float
+    current: float
+
+    def __str__(self):
+        name = "/".join(str(part) for part in self.key)
+        if self.what == "cost":
+            return f"{name}: cost changed from {self.baseline:.6g} to {self.current:.6g}"
+        return f"{name}: {self.what} slowed down from {self.baseline:.4g}s to {self.current:.4g}s " \
+               f"({self.current / self.baseline:.2f}x)"
+
+
+def compare(records: list[dict], baseline: list[dict], tolerance: float = 0.2, min_seconds: float = 1e-3,
+            cost_tolerance: float = 1e-9) -> list[Regression]:
+    """
+    Compares the results with a baseline, case by case. A phase regressed if its median grew by more than the
+    tolerance and by more than the interquartile ranges of both runs, so that noise alone does not fail the check.
+    Cases missing in either run are ignored.
+    @param records: results of the current run
+    @param baseline: results of the baseline run
+    @param tolerance: allowed relative slowdown of the median
+    @param min_seconds: slowdowns below this many seconds are ignored
+    @param cost_tolerance: allowed relative change of the cost of the tree
+    @return: the regressions found
+    """
+    baseline_by_key = {tuple(record[name] for name in KEY_FIELDS): record for record in baseline}
+    regressions = []
+    for record in records:
+        key = tuple(record[name] for name in KEY_FIELDS)
+        if key not in baseline_by_key:
+            continue
+        old = baseline_by_key[key]
+        for phase in PHASES:
+            old_timing, new_timing = old["phases"][phase], record["phases"][phase]
+            slowdown = new_timing["median"] - old_timing["median"]
+            if slowdown > max(tolerance * old_timing["median"], min_seconds,
+                              old_timing["iqr"] + new_timing["iqr"]):
+                regressions.append(Regression(key, phase, old_timing["median"], new_timing["median"]))
+        if abs(record["cost"] - old["cost"]) > cost_tolerance * max(abs(old["cost"]), 1.0):
+            regressions.append(Regression(key, "cost", old["cost"], record["cost"]))
+    return regressions
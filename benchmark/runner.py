@@ -0,0 +1,62 @@
+"""
+runs the cases of a benchmark grid, timing the pre-clustering, the tree build and the cost evaluation separately
+"""
+from typing import Callable, Optional
+
+from algorithms.kmedplusplus import KMedPlusPlus
+from algorithms.precluster_cache import CachedSolver
+from benchmark import registry
+from benchmark.grid import Case, Grid
+from benchmark.timing import time_phase
+
+
+def run_grid(grid: Grid, algorithms: Optional[list[str]] = None,
+             progress: Optional[Callable[[Case, dict], None]] = None) -> list[dict]:
+    """
+    Runs all cases of the grid. Every instance is loaded and pre-clustered once, and all algorithms explain the same
+    pre-clustering.
+    @param grid: the benchmark grid
+    @param algorithms: (optional) only run the cases of these algorithms
+    @param progress: (optional) function called with each case and its record once it is done
+    @return: one record per case, see run_case
+    """
+    records = []
+    prepared_key, prepared = None, None
+    for case in grid.cases(algorithms):
+        instance_key = case.dataset, case.n, case.k, case.seed
+        if instance_key != prepared_key:
+            prepared_key, prepared = instance_key, prepare(case, grid)
+        record = run_case(case, grid, *prepared)
+        records.append(record)
+        if progress is not None:
+            progress(case, record)
+    return records
+
+
+def prepare(case: Case, grid: Grid):
+    """
+    Loads the instance of the case and times its pre-clustering. With a pre-clustering cache, this times loading the
+    pre-clustering from the cache (after computing it once if needed).
+    @return: tuple containing the instance, the pre-clustering and the timing of the pre-clustering
+    """
+    instance = registry.dataset(case.dataset, case.n, case.k, case.seed)
+    pre_solver = KMedPlusPlus(numiter=grid.pre_numiter, seed=case.seed, medoid=grid.pre_medoid)
+    if grid.pre_cache is not None:
+        pre_solver = CachedSolver(pre_solver, grid.pre_cache)
+    pre_clusters, pre_timing = time_phase(lambda: pre_solver(instance), grid.warmup, grid.repeat)
+    return instance, pre_clusters, pre_timing
+
+
+def run_case(case: Case, grid: Grid, instance, pre_clusters, pre_timing) -> dict:
+    """
+    Times the tree build and the cost evaluation of one case.
+    @return: the record of the case: its parameters, the actual instance size, the costs of the pre-clustering and of
+    the tree, and for each phase the median, IQR, minimum and samples of its run times
+    """
+    solver = registry.algorithm(case.algorithm, case.seed)
+    output, build_timing = time_phase(lambda: solver(instance, pre_clusters), grid.warmup, grid.repeat)
+    cost, cost_timing = time_phase(output.cost, grid.warmup, grid.repeat)
+    return {"algorithm": case.algorithm, "dataset": case.dataset, "n": case.n, "k": case.k, "seed": case.seed,
+            "size": instance.size(), "pre_cost": float(pre_clusters.cost), "cost": float(cost),
+            "phases": {"pre_cluster": pre_timing.as_dict(), "build": build_timing.as_dict(),
+                       "cost": cost_timing.as_dict()}}
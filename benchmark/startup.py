@@ -0,0 +1,54 @@
+"""
+startup benchmark: the import time of the solver modules, each measured in fresh interpreters, and a check that the
+headless core does not import the optional plotting and scikit-learn dependencies
+"""
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules a batch worker needs, none of them may import an OPTIONAL_DEPENDENCIES module
+CORE_MODULES = ("util", "cost_engine", "solver_interface", "instrumentation", "tree_maintenance",
+                "algorithms.kmedplusplus", "algorithms.streaming_kmedplusplus", "algorithms.precluster_cache",
+                "algorithms.iterative_mistake_minimization", "algorithms.Makarychev_algorithm",
+                "algorithms.Esfandiari_algorithm", "algorithms.coreset", "algorithms.multi_trial",
+                "algorithms.sklearn_builtins", "benchmark.registry", "benchmark.runner")
+OPTIONAL_DEPENDENCIES = ("matplotlib", "sklearn")
+
+# runs in the fresh interpreter: numpy is imported first, as every module needs it and its import time is the same for
+# all of them, then the module itself is timed
+PROBE = """
+import json, sys, time
+import numpy
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "modules": len(sys.modules),
+                  "optional": sorted(name for name in {optional!r} if name in sys.modules)}}))
+"""
+
+
+def measure_import(module: str, repeat: int = 5) -> dict:
+    """
+    Imports module in repeat fresh interpreters, started from the repository root.
+    @return: the record of the module: the median and all samples of its import time in seconds (numpy excluded),
+    the number of modules loaded afterwards and the optional dependencies it pulled in
+    """
+    samples = []
+    for _ in range(max(1, repeat)):
+        probe = PROBE.format(module=module, optional=OPTIONAL_DEPENDENCIES)
+        completed = subprocess.run([sys.executable, "-c", probe], cwd=REPOSITORY, capture_output=True, text=True,
+                                   check=True)
+        samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    seconds = [sample["seconds"] for sample in samples]
+    return {"module": module, "median": float(np.median(seconds)), "samples": seconds,
+            "modules": samples[-1]["modules"], "optional": samples[-1]["optional"]}
+
+
+def measure_startup(modules: tuple = CORE_MODULES, repeat: int = 5) -> list[dict]:
+    """@return: one record per module, see measure_import"""
+    return [measure_import(module, repeat) for module in modules]
@@ -0,0 +1,58 @@
+"""
+repeated timing of a single benchmark phase
+"""
+import gc
+import time
+from dataclasses import dataclass
+from typing import Callable, Tuple
+
+import numpy as np
+
+
+@dataclass
+class Timing:
+    """wall-clock times in seconds of the timed runs of a phase"""
+    samples: list[float]
+
+    @property
+    def median(self) -> float:
+        return float(np.median(self.samples))
+
+    @property
+    def iqr(self) -> float:
+        """interquartile range, a measure of the noise that is robust to single outliers"""
+        q25, q75 = np.quantile(self.samples, [0.25, 0.75])
+        return float(q75 - q25)
+
+    def as_dict(self) -> dict:
+        return {"median": self.median, "iqr": self.iqr, "min": min(self.samples), "samples": self.samples}
+
+
+def time_phase(function: Callable[[], object], warmup: int = 1, repeat: int = 5) -> Tuple[object, Timing]:
+    """
+    Runs function warmup times untimed and then repeat times timed. Like timeit, the garbage collector is paused
+    during the timed runs, so that no run pays for the garbage of another.
+    @param function: phase to time, called without arguments
+    @param warmup: number of untimed runs (caches, lazy imports, page faults of memory-mapped data)
+    @param repeat: number of timed runs, at least 1
+    @return: tuple containing the result of the last run and the timing
+    """
+    result = None
+    for _ in range(warmup):
+        result = function()
+    samples = []
+    gc.collect()
+    gc_enabled = gc.isenabled()
+    try:
+        for _ in range(max(1, repeat)):
+            result = None  # the previous result is freed outside of the timed region
+            gc.disable()
+            start = time.perf_counter()
+            result = function()
+            samples.append(time.perf_counter() - start)
+            if gc_enabled:
+                gc.enable()
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return result, Timing(samples)
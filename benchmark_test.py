@@ -0,0 +1,88 @@
+"""
+behaviour checks of the benchmark suite: the grid, a small run, the result files and the regression check.
+Run with python benchmark_test.py (or pytest)
+"""
+import csv
+import os
+import tempfile
+import tracemalloc
+
+from benchmark.grid import Grid
+from benchmark.memory import MEMORY_PHASES, measure_phase, run_memory_grid, write_memory_csv
+from benchmark.results import PHASES, compare, load_json, metadata, write_csv, write_json
+from benchmark.runner import run_grid
+
+
+def record(seed: int, medians: dict, cost: float = 10.0, iqr: float = 0.0) -> dict:
+    phases = {phase: {"median": medians.get(phase, 1.0), "iqr": iqr} for phase in PHASES}
+    return {"algorithm": "IMM", "dataset": "synthetic", "n": 100, "k": 5, "seed": seed, "cost": cost,
+            "phases": phases}
+
+
+def test_grid_cases_skip_the_sizes_above_the_maximum():
+    grid = Grid(["IMM", "Makarychev"], ["synthetic"], [100, 1000], seeds=[0, 1], max_sizes={"Makarychev": 100})
+    cases = list(grid.cases())
+    assert len(cases) == 6 and all(case.n == 100 for case in cases if case.algorithm == "Makarychev")
+    assert [case.algorithm for case in grid.cases(["IMM"])] == ["IMM"] * 4
+
+
+def test_compare_flags_slowdowns_beyond_the_noise_and_cost_changes():
+    baseline = [record(0, {}), record(1, {}), record(2, {})]
+    current = [record(0, {"build": 1.1}),  # within the tolerance
+               record(1, {"build": 2.0}, cost=11.0),  # slower and more expensive
+               record(2, {"cost": 2.0}, iqr=1.0),  # within the noise
+               record(3, {"build": 9.0})]  # not in the baseline
+    regressions = compare(current, baseline, tolerance=0.2)
+    assert [(regression.key[-1], regression.what) for regression in regressions] == [(1, "build"), (1, "cost")]
+    assert "2.00x" in str(regressions[0])
+
+
+def test_small_run_writes_its_results():
+    grid = Grid(["IMM", "Makarychev"], ["synthetic"], [60], pre_numiter=1, warmup=0, repeat=1)
+    records = run_grid(grid)
+    assert [(entry["algorithm"], entry["size"]) for entry in records] == [("IMM", 60), ("Makarychev", 60)]
+    assert all(entry["cost"] > 0 and set(entry["phases"]) == set(PHASES) for entry in records)
+    with tempfile.TemporaryDirectory() as directory:
+        json_path, csv_path = os.path.join(directory, "results.json"), os.path.join(directory, "results.csv")
+        write_json(json_path, records, metadata(grid))
+        assert load_json(json_path) == records and not compare(load_json(json_path), records)
+        write_csv(csv_path, records)
+        with open(csv_path, newline="") as file:
+            rows = list(csv.DictReader(file))
+        assert [float(row["cost"]) for row in rows] == [entry["cost"] for entry in records]
+
+
+def test_measure_phase_reports_the_net_retained_blocks_and_their_sites():
+    kept = []
+    tracemalloc.start()
+    try:
+        _, statistics = measure_phase(lambda: kept.extend([row] for row in range(1000)))
+        _, freed = measure_phase(lambda: len([[row] for row in range(1000)]))  # allocated and freed within the phase
+    finally:
+        tracemalloc.stop()
+    assert statistics["retained_blocks"] >= 1000 and statistics["retained_bytes"] > 0
+    assert statistics["retained_sites"][0]["site"].startswith(__file__.rstrip("c"))
+    assert abs(freed["retained_blocks"]) < 50 and freed["peak_bytes"] > statistics["retained_bytes"] / 2
+
+
+def test_memory_run_warms_up_and_writes_its_results():
+    records = run_memory_grid(Grid(["IMM"], ["synthetic"], [300], pre_numiter=1))
+    assert len(records) == 1 and set(records[0]["phases"]) == set(MEMORY_PHASES)
+    build = records[0]["phases"]["build"]
+    assert 0 < build["retained_blocks"] < 1000  # no imports or first-call setup, which leave thousands of blocks
+    assert len(build["retained_sites"]) <= 5 and records[0]["rss_peak_bytes"] >= records[0]["rss_start_bytes"]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "memory.csv")
+        write_memory_csv(path, records)
+        with open(path, newline="") as file:
+            row = next(csv.DictReader(file))
+        assert int(row["build_retained_blocks"]) == build["retained_blocks"]
+
+
+if __name__ == "__main__":
+    test_grid_cases_skip_the_sizes_above_the_maximum()
+    test_compare_flags_slowdowns_beyond_the_noise_and_cost_changes()
+    test_small_run_writes_its_results()
+    test_measure_phase_reports_the_net_retained_blocks_and_their_sites()
+    test_memory_run_warms_up_and_writes_its_results()
+    print("the benchmark suite behaves as expected")
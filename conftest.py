@@ -0,0 +1 @@
+collect_ignore = ["SKLearn_test.py"]  # a plotting demo, not a test
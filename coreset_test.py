@@ -0,0 +1,54 @@
+"""
+behaviour checks of the coreset mode. Run with python coreset_test.py (or pytest)
+"""
+import numpy as np
+
+from algorithms.coreset import CoresetSolver, sensitivity_sample
+from algorithms.iterative_mistake_minimization import IMM
+from solver_interface import ArrayInstance, CenterOutput, ClusterNode
+
+
+def clustered_instance(seed: int = 0, n: int = 3000, k: int = 4):
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(n, 2)) + rng.integers(0, k, (n, 1)) * 6
+    instance = ArrayInstance(data, k)
+    centers = [instance.point(int(np.flatnonzero(np.rint(data[:, 0] / 6) == c)[0])) for c in range(k)]
+    return instance, CenterOutput(instance, centers)
+
+
+def test_sample_weights_estimate_the_cost():
+    instance, pre_clusters = clustered_instance()
+    coreset = sensitivity_sample(instance, pre_clusters, 1000, seed=0)
+    sample = coreset.instance
+    assert sample.size() <= 1000 and np.array_equal(sample.as_array(), instance.as_array()[coreset.rows])
+    assert np.isclose(sample.weights.sum(), instance.size(), rtol=0.1)
+    assert np.isclose(coreset.pre_clusters.cost, pre_clusters.cost, rtol=0.1)
+    assert np.array_equal(coreset.pre_clusters.labels, pre_clusters.labels[coreset.rows])
+
+
+def test_coreset_tree_explains_the_full_instance():
+    instance, pre_clusters = clustered_instance(1)
+    output = CoresetSolver(IMM(), size=500)(instance, pre_clusters)
+    assert output.instance is instance and len(output.leaves) == instance.k
+    assert np.array_equal(output.leaf_labels(), output.predict(instance.as_array()))
+    assert np.isclose(output.cost(), IMM()(instance, pre_clusters).cost(), rtol=0.05)
+    small = CoresetSolver(IMM(), size=10_000)(instance, pre_clusters)  # no sample is smaller than the instance
+    assert small.leaves[0].tree.instance is instance
+
+
+def test_leaf_medians_count_the_weights():
+    rng = np.random.default_rng(2)
+    data = rng.integers(0, 10, (40, 3)).astype(np.float64)
+    weights = rng.integers(1, 5, len(data))
+    weighted = ArrayInstance(data, 1, weights=weights)
+    expanded = ArrayInstance(np.repeat(data, weights, axis=0), 1)
+    median = ClusterNode.root(weighted, CenterOutput(weighted, [weighted.point(0)])).set_median()
+    expected = ClusterNode.root(expanded, CenterOutput(expanded, [expanded.point(0)])).set_median()
+    assert np.array_equal(median.coordinates, expected.coordinates)
+
+
+if __name__ == "__main__":
+    test_sample_weights_estimate_the_cost()
+    test_coreset_tree_explains_the_full_instance()
+    test_leaf_medians_count_the_weights()
+    print("the coreset mode behaves as expected")
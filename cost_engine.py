@@ -0,0 +1,138 @@
+"""
+vectorized evaluation of the cost of a clustering given as a label array, used for all explainable outputs
+"""
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from numpy import ndarray
+
+from util import row_chunks, weighted_median
+
+OBJECTIVES = ("l1", "l2")
+
+
+@dataclass
+class CostReport:
+    """represents the cost of a clustering, broken down by group (leaf or cluster)"""
+    total: float
+    group_costs: ndarray  # cost of each group
+    group_sizes: ndarray  # number (total weight) of points of each group
+    centers: ndarray  # (groups, d) center of each group, nan for empty groups
+    labels: ndarray  # group of each point
+    objective: str = "l1"
+
+    def breakdown(self) -> list[dict]:
+        """@return: one dict per group with its size, cost and share of the total cost"""
+        return [{"group": g, "size": float(size), "cost": float(cost),
+                 "share": float(cost / self.total) if self.total > 0 else 0.0}
+                for g, (size, cost) in enumerate(zip(self.group_sizes, self.group_costs))]
+
+
+def group_medians(X: ndarray, labels: ndarray, num_groups: int, chunk_rows: Optional[int] = None,
+                  weights: Optional[ndarray] = None) -> ndarray:
+    """
+    Computes the coordinate-wise median of each group with np.partition, one column at a time. Each column is read in
+    sequential chunks of rows and then grouped, so besides the result only two columns (n floats each) and the
+    grouping (n indices) are held in memory, never the (n, d) matrix.
+    @param X: (n, d) matrix of points, may be memory-mapped
+    @param labels: group of each point in range(num_groups), points with a negative label are ignored
+    @param num_groups: number of groups
+    @param chunk_rows: (optional) number of rows per chunk, None reads each column at once
+    @param weights: (optional) weight of each point, see util.weighted_median
+    @return: (num_groups, d) matrix of the medians, the same values as np.median, nan for empty groups
+    """
+    order = np.argsort(labels, kind="stable")
+    sizes = np.bincount(labels[labels >= 0], minlength=num_groups)
+    bounds = np.concatenate(([0], np.cumsum(sizes))) + np.count_nonzero(labels < 0)  # negative labels sort first
+    sorted_weights = None if weights is None else weights[order]
+    medians = np.full((num_groups, X.shape[1]), np.nan)
+    column = np.empty(len(X))
+    for i in range(X.shape[1]):
+        for rows in row_chunks(len(X), chunk_rows):
+            column[rows] = X[rows, i]
+        grouped = column[order]
+        for g in np.flatnonzero(sizes):
+            values = grouped[bounds[g]:bounds[g + 1]]
+            if sorted_weights is not None:
+                medians[g, i] = weighted_median(values, sorted_weights[bounds[g]:bounds[g + 1]])
+                continue
+            middle = (len(values) - 1) // 2
+            if len(values) % 2:
+                medians[g, i] = np.partition(values, middle)[middle]
+            else:
+                lower, upper = np.partition(values, (middle, middle + 1))[middle:middle + 2]
+                medians[g, i] = (lower + upper) / 2
+    return medians
+
+
+def group_means(X: ndarray, labels: ndarray, num_groups: int, chunk_rows: Optional[int] = None,
+                weights: Optional[ndarray] = None) -> ndarray:
+    """
+    @return: (num_groups, d) matrix of the (weighted) means of the groups, nan for empty groups, see group_medians
+    """
+    sums = np.zeros((num_groups, X.shape[1]))
+    for rows in row_chunks(len(X), chunk_rows):
+        chunk_labels = labels[rows]
+        valid = chunk_labels >= 0
+        chunk = np.asarray(X[rows], dtype=np.float64)[valid]
+        if weights is not None:
+            chunk = chunk * weights[rows][valid, np.newaxis]
+        np.add.at(sums, chunk_labels[valid], chunk)
+    valid = labels >= 0
+    totals = np.bincount(labels[valid], weights=None if weights is None else weights[valid], minlength=num_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / totals[:, np.newaxis]
+
+
+def group_costs(X: ndarray, labels: ndarray, centers: ndarray, objective: str = "l1",
+                chunk_rows: Optional[int] = None, weights: Optional[ndarray] = None) -> ndarray:
+    """
+    Sums the distances of the points of each group to its center, reading X in chunks.
+    @param X: (n, d) matrix of points, may be memory-mapped
+    @param labels: group of each point, points with a negative label are ignored
+    @param centers: (groups, d) matrix of the centers
+    @param objective: "l1" sums the 1-norm distances, "l2" the squared euclidean distances
+    @param chunk_rows: (optional) number of rows per chunk, None reads X at once
+    @param weights: (optional) weight of each point, its distance counts weight times
+    @return: array with the cost of each group
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"unknown objective {objective!r}, expected one of {OBJECTIVES}")
+    costs = np.zeros(len(centers))
+    for rows in row_chunks(len(X), chunk_rows):
+        chunk_labels = labels[rows]
+        valid = chunk_labels >= 0
+        differences = np.asarray(X[rows], dtype=np.float64)[valid] - centers[chunk_labels[valid]]
+        distances = np.abs(differences).sum(axis=1) if objective == "l1" else (differences ** 2).sum(axis=1)
+        if weights is not None:
+            distances *= weights[rows][valid]
+        costs += np.bincount(chunk_labels[valid], weights=distances, minlength=len(centers))
+    return costs
+
+
+def evaluate(X: ndarray, labels: ndarray, num_groups: int, objective: str = "l1",
+             chunk_rows: Optional[int] = None, weights: Optional[ndarray] = None) -> CostReport:
+    """
+    Computes the cost of the clustering given by the labels, where every group is served by its optimal center: the
+    coordinate-wise median for the 1-norm ("l1", k-median) and the mean for squared euclidean distances ("l2",
+    k-means).
+    @param X: (n, d) matrix of points, may be memory-mapped
+    @param labels: group of each point in range(num_groups), points with a negative label are not counted
+    @param num_groups: number of groups
+    @param objective: "l1" or "l2"
+    @param chunk_rows: (optional) number of rows per chunk of the passes over X, None reads X at once
+    @param weights: (optional) weight of each point, the cost equals the cost of the points repeated weight times
+    @return: the total cost and its breakdown by group, the group sizes are total weights if weighted
+    """
+    labels = np.asarray(labels, dtype=np.intp)
+    if objective == "l1":
+        centers = group_medians(X, labels, num_groups, chunk_rows, weights)
+    elif objective == "l2":
+        centers = group_means(X, labels, num_groups, chunk_rows, weights)
+    else:
+        raise ValueError(f"unknown objective {objective!r}, expected one of {OBJECTIVES}")
+    costs = group_costs(X, labels, np.nan_to_num(centers), objective, chunk_rows, weights)  # empty groups cost 0
+    valid = labels >= 0
+    sizes = np.bincount(labels[valid], weights=None if weights is None else weights[valid], minlength=num_groups)
+    return CostReport(float(costs.sum()), costs, sizes, centers, labels, objective)
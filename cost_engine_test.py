@@ -0,0 +1,49 @@
+"""
+behaviour checks of the vectorized cost engine. Run with python cost_engine_test.py (or pytest)
+"""
+import numpy as np
+
+import cost_engine
+from algorithms.iterative_mistake_minimization import IMM
+from solver_interface import ArrayInstance, CenterOutput, clustering_cost
+
+
+def test_evaluate_serves_every_group_by_its_median_or_mean():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 3))
+    labels = rng.integers(-1, 4, len(X))  # group 4 stays empty, label -1 is ignored
+    for objective in ("l1", "l2"):
+        for chunk_rows in (None, 7):
+            report = cost_engine.evaluate(X, labels, 5, objective, chunk_rows)
+            for g in range(4):
+                group = X[labels == g]
+                center = np.median(group, axis=0) if objective == "l1" else group.mean(axis=0)
+                cost = np.abs(group - center).sum() if objective == "l1" else ((group - center) ** 2).sum()
+                assert np.allclose(report.centers[g], center) and np.isclose(report.group_costs[g], cost)
+                assert report.group_sizes[g] == len(group)
+            assert np.all(np.isnan(report.centers[4])) and report.group_costs[4] == 0 and report.group_sizes[4] == 0
+            assert np.isclose(report.total, report.group_costs.sum())
+            assert np.isclose(sum(group["share"] for group in report.breakdown()), 1.0)
+    try:
+        cost_engine.evaluate(X, labels, 5, "l3")
+    except ValueError as error:
+        assert "l3" in str(error)
+    else:
+        assert False, "an unknown objective must raise"
+
+
+def test_tree_costs_match_the_clustering_cost():
+    rng = np.random.default_rng(1)
+    instance = ArrayInstance(rng.normal(size=(200, 2)), 4)
+    output = IMM()(instance, CenterOutput(instance, [instance.point(row) for row in range(4)]))
+    assert np.isclose(output.cost(), clustering_cost(output.clusters))
+    leaf_report = output.cost_report("leaf")
+    assert np.array_equal(leaf_report.labels, output.leaf_labels())
+    # the leaf medians serve the closest points at most as expensively as the points of their leaf
+    assert output.cost() <= leaf_report.total + 1e-9
+
+
+if __name__ == "__main__":
+    test_evaluate_serves_every_group_by_its_median_or_mean()
+    test_tree_costs_match_the_clustering_cost()
+    print("the cost engine behaves as expected")
@@ -1,42 +1,41 @@
-import csv
-
-from numpy import array
+import os
 
 from solver_interface import Instance
 from util import Point
+from data.tabular import load_chunks, load_columns, make_instance
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), 'creditcard_data.csv')
+param_names = ['CUST_ID', 'BALANCE', 'BALANCE_FREQUENCY', 'PURCHASES', 'ONEOFF_PURCHASES', 'INSTALLMENTS_PURCHASES',
+               'CASH_ADVANCES', 'PURCHASES_FREQUENCY', 'ONEOFF_PURCHASES_FREQUENCY',
+               'PURCHASES_INSTALLMENTS_FREQUENCY', 'CASH_ADVANCE_FREQUENCY', 'CASH_ADVANCE_TRX', 'PURCHASES_TRX',
+               'CREDIT_LIMIT', 'PAYMENTS', 'MINIMUM_PAYMENTS', 'PRC_FULL_PAYMENT', 'TENURE']
+column_names = {'CASH_ADVANCES': 'CASH_ADVANCE'}  # parameter names that differ from the csv header
+
+
+def get_instance(k: int, parameters: dict[str, bool], num_points: int, missing="drop",
+                 collapse: bool = False) -> Instance:
+    """
+    @param collapse: if True, identical customers become one point weighted by their number
+    """
+    return make_instance(get_data(parameters, num_points, missing), k, collapse)
+
+
+def get_data(parameters, num_points: int, missing="drop"):
+    """
+    Loads the selected columns of the first num_points customers as float matrix, see data.tabular.load_columns
+    """
+    columns = [column_names.get(name, name) for name in param_names if parameters[name]]
+    return load_columns(CSV_PATH, columns, num_rows=num_points, missing=missing)
+
+
+def get_chunks(parameters, chunk_rows: int, missing="drop"):
+    """
+    Loads the selected columns of the customers in chunks of chunk_rows rows, see data.tabular.load_chunks
+    """
+    columns = [column_names.get(name, name) for name in param_names if parameters[name]]
+    return load_chunks(CSV_PATH, columns, chunk_rows, missing=missing)
 
 
-def get_instance(k: int, parameters: dict[str, bool], num_points: int) -> Instance:
-    points = get_points(parameters, num_points)
-    return Instance(points, k)
-
-
-def get_points(parameters, num_points: int):
-    with open('./data/creditcard/creditcard_data.csv', mode='r') as csv_file:
-        csv_reader = csv.DictReader(csv_file)
-        data = list(csv_reader)
-    clean_data = [cleanup(customer[1], parameters) for customer in enumerate(data) if customer[0] < num_points if
-                  cleanup(customer[1], parameters)]
-    points = [Point(array(entry)) for entry in clean_data]
-    return points
-
-
-def cleanup(customer, parameters) -> list:
-    cleaned_up = []
-    param_names = ['CUST_ID', 'BALANCE', 'BALANCE_FREQUENCY', 'PURCHASES', 'ONEOFF_PURCHASES', 'INSTALLMENTS_PURCHASES',
-                   'CASH_ADVANCES', 'PURCHASES_FREQUENCY', 'ONEOFF_PURCHASES_FREQUENCY',
-                   'PURCHASES_INSTALLMENTS_FREQUENCY', 'CASH_ADVANCE_FREQUENCY', 'CASH_ADVANCE_TRX', 'PURCHASES_TRX',
-                   'CREDIT_LIMIT', 'PAYMENTS', 'MINIMUM_PAYMENTS', 'PRC_FULL_PAYMENT', 'TENURE']
-    for name in param_names:
-        if parameters[name]:
-            data = float(customer[name])
-            dataraw = customer[name]
-            # print(type(dataraw))
-            # if customer[name] != "0":
-            #     data = float(customer[name])
-            # else:
-            #     print("empty cell detected")
-            #     return False
-            cleaned_up.append(data)
-
-    return cleaned_up
+def get_points(parameters, num_points: int, missing="drop"):
+    data = get_data(parameters, num_points, missing)
+    return [Point(row, index) for index, row in enumerate(data)]
@@ -0,0 +1,32 @@
+import os
+
+from solver_interface import Instance
+from data.tabular import load_chunks, load_columns, make_instance
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), 'sales.csv')
+param_names = ['sales_id', 'order_id', 'product_id', 'price_per_unit', 'quantity', 'total_price']
+
+
+def get_instance(k: int, parameters: dict[str, bool], num_points: int = None, missing="drop",
+                 collapse: bool = False) -> Instance:
+    """
+    @param collapse: if True, identical sales become one point weighted by their number
+    """
+    return make_instance(get_data(parameters, num_points, missing), k, collapse)
+
+
+def get_data(parameters, num_points: int = None, missing="drop"):
+    """
+    Loads the selected columns of the first num_points sales (all if None) as float matrix, see
+    data.tabular.load_columns
+    """
+    columns = [name for name in param_names if parameters[name]]
+    return load_columns(CSV_PATH, columns, num_rows=num_points, missing=missing)
+
+
+def get_chunks(parameters, chunk_rows: int, missing="drop"):
+    """
+    Loads the selected columns of the sales in chunks of chunk_rows rows, see data.tabular.load_chunks
+    """
+    columns = [name for name in param_names if parameters[name]]
+    return load_chunks(CSV_PATH, columns, chunk_rows, missing=missing)
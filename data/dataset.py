@@ -0,0 +1,149 @@
+"""
+a data set that is loaded once and cut into instances of any size, for scaling sweeps
+"""
+from __future__ import annotations
+
+from typing import Optional, Union
+
+import numpy as np
+from numpy import ndarray
+
+from data.tabular import load_columns
+from solver_interface import ArrayInstance
+
+
+class Dataset:
+    """Holds the (N, d) matrix of a data set. Instances are views on the first n rows of the matrix, or of a shuffled
+    copy of it for subsamples, so they share the memory of the data set. The per-dimension sort orders and the
+    cumulative statistics are computed once for the whole matrix and sliced for every view, so a sweep over many sizes
+    costs about one load."""
+    STATISTICS_BLOCK = 1024  # rows per block of the cumulative mean and variance
+
+    def __init__(self, data: ndarray):
+        self.data = np.ascontiguousarray(data, dtype=np.float64)
+        self._sorted_order: Optional[ndarray] = None
+        self._cumulative: Optional[dict[str, ndarray]] = None
+        self._shuffled: dict[int, Dataset] = {}  # seed -> shuffled copy
+
+    @classmethod
+    def from_csv(cls, path: str, columns: list[str], missing: Union[str, float] = "drop") -> Dataset:
+        """
+        Loads the selected columns of a csv file, see data.tabular.load_columns
+        """
+        return cls(load_columns(path, columns, missing=missing))
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f"Dataset(n={len(self.data)}, d={self.data.shape[1]})"
+
+    def sorted_order(self) -> ndarray:
+        """
+        @return: (d, N) matrix, row i holds the rows of the data set sorted (stably) by coordinate i, computed once
+        """
+        if self._sorted_order is None:
+            self._sorted_order = np.argsort(self.data, axis=0, kind="stable").T.copy()
+        return self._sorted_order
+
+    def prefix_order(self, n: int) -> ndarray:
+        """
+        Slices the sort orders of the whole data set down to the first n rows. Filtering a stable order keeps it
+        stable, so this equals sorting the prefix, in O(d * N) instead of O(d * n log n).
+        @return: (d, n) sort orders of the first n rows
+        """
+        order = self.sorted_order()
+        if n >= len(self.data):
+            return order
+        return order[order < n].reshape(len(order), n)
+
+    def prefix(self, n: int, k: int) -> ArrayInstance:
+        """
+        @param n: number of points, at most the size of the data set
+        @param k: number of centers to be opened
+        @return: instance of the first n points, a view on the data set with the sort orders already in place
+        """
+        n = min(n, len(self.data))
+        return ArrayInstance(self.data[:n], k, sorted_order=self.prefix_order(n))
+
+    def subsample(self, n: int, k: int, seed: int = 0) -> ArrayInstance:
+        """
+        Samples n points uniformly without replacement. The samples of one seed are the prefixes of one shuffled copy
+        of the data set, so the subsamples of growing n are nested and share memory and sort orders.
+        @param n: number of points, at most the size of the data set
+        @param k: number of centers to be opened
+        @param seed: seed of the shuffle
+        @return: instance of the sampled points
+        """
+        return self.shuffled(seed).prefix(n, k)
+
+    def shuffled(self, seed: int) -> Dataset:
+        """@return: the data set with its rows shuffled by the given seed, created once per seed"""
+        if seed not in self._shuffled:
+            permutation = np.random.default_rng(seed).permutation(len(self.data))
+            self._shuffled[seed] = Dataset(self.data[permutation])
+        return self._shuffled[seed]
+
+    def statistics(self, n: Optional[int] = None) -> dict[str, ndarray]:
+        """
+        Computes per-dimension statistics of the first n points from cumulative arrays, which are built once for the
+        whole data set, and from the sliced sort orders for the median. The minimum and maximum of every prefix are
+        read in O(d). The mean and variance are merged from the moments of the full blocks of the prefix and a
+        two-pass computation over its last partial block, in O(d * STATISTICS_BLOCK); unlike a sum of squares minus
+        the squared sum, this does not lose precision when the mean is large compared to the spread.
+        @param n: number of points, default all
+        @return: dict of arrays with one entry per dimension: "min", "max", "mean", "std" and "median"
+        """
+        n = len(self.data) if n is None else min(n, len(self.data))
+        if n == 0:
+            raise ValueError("statistics of an empty prefix")
+        if self._cumulative is None:
+            self._cumulative = {"min": np.minimum.accumulate(self.data, axis=0),
+                                "max": np.maximum.accumulate(self.data, axis=0), **self.block_moments()}
+        cumulative = self._cumulative
+        blocks = n // self.STATISTICS_BLOCK
+        rest = self.data[blocks * self.STATISTICS_BLOCK:n] - self.data[0]
+        mean, m2 = cumulative["mean"][blocks], cumulative["m2"][blocks]
+        if len(rest) > 0:
+            mean, m2 = merge_moments(blocks * self.STATISTICS_BLOCK, mean, m2, *moments(rest))
+        mean, variance = mean + self.data[0], m2 / n
+        order = self.prefix_order(n)
+        dimensions = np.arange(self.data.shape[1])
+        lower = self.data[order[:, (n - 1) // 2], dimensions]
+        upper = self.data[order[:, n // 2], dimensions]
+        return {"min": cumulative["min"][n - 1], "max": cumulative["max"][n - 1], "mean": mean,
+                "std": np.sqrt(variance), "median": (lower + upper) / 2}
+
+    def block_moments(self) -> dict[str, ndarray]:
+        """
+        @return: dict with the (b + 1, d) arrays "mean" and "m2" (sum of squared deviations from the mean) of the first
+        j * STATISTICS_BLOCK rows in row j, for the b full blocks of the data set. The means are relative to the first
+        row, so that they are small compared to the coordinates and their rounding errors do not spoil the merges
+        """
+        num_blocks = len(self.data) // self.STATISTICS_BLOCK
+        means = np.zeros((num_blocks + 1, self.data.shape[1]))
+        m2s = np.zeros((num_blocks + 1, self.data.shape[1]))
+        for j in range(num_blocks):
+            block = self.data[j * self.STATISTICS_BLOCK:(j + 1) * self.STATISTICS_BLOCK] - self.data[0]
+            means[j + 1], m2s[j + 1] = merge_moments(j * self.STATISTICS_BLOCK, means[j], m2s[j], *moments(block))
+        return {"mean": means, "m2": m2s}
+
+
+def moments(block: ndarray) -> tuple[int, ndarray, ndarray]:
+    """
+    @return: tuple containing the number of rows of the block, its mean and its sum of squared deviations from the
+    mean, computed in two passes
+    """
+    mean = block.mean(axis=0)
+    return len(block), mean, ((block - mean) ** 2).sum(axis=0)
+
+
+def merge_moments(count: int, mean: ndarray, m2: ndarray, other_count: int, other_mean: ndarray,
+                  other_m2: ndarray) -> tuple[ndarray, ndarray]:
+    """
+    Merges the moments of two disjoint sets of rows (Chan et al.).
+    @return: tuple containing the mean and the sum of squared deviations from the mean of the union
+    """
+    total = count + other_count
+    delta = other_mean - mean
+    return mean + delta * (other_count / total), m2 + other_m2 + delta ** 2 * (count * other_count / total)
@@ -1,31 +1,28 @@
-import csv
-
-from numpy import array
+import os
 
 from solver_interface import Instance
 from util import Point
+from data.tabular import load_columns, make_instance
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), 'Mall_Customers.csv')
+column_names = {'age': 'Age', 'income': 'Annual Income (k$)', 'spending_score': 'Spending Score (1-100)'}
+
+
+def get_instance(k: int, parameters: dict[str, bool], collapse: bool = False) -> Instance:
+    """
+    @param collapse: if True, identical customers become one point weighted by their number
+    """
+    return make_instance(get_data(parameters), k, collapse)
 
 
-def get_instance(k: int, parameters: dict[str, bool]) -> Instance:
-    points = get_points(parameters)
-    return Instance(points, k)
+def get_data(parameters):
+    """
+    Loads the selected columns of all customers as float matrix, see data.tabular.load_columns
+    """
+    columns = [column for name, column in column_names.items() if parameters[name]]
+    return load_columns(CSV_PATH, columns, missing="raise")
 
 
 def get_points(parameters):
-    with open('../data/mall/Mall_Customers.csv', mode='r') as csv_file:
-        csv_reader = csv.DictReader(csv_file)
-        data = list(csv_reader)
-    clean_data = [cleanup(customer, parameters) for customer in data]
-    points = [Point(array(entry)) for entry in clean_data]
-    return points
-
-
-def cleanup(customer, parameters) -> list:
-    cleaned_up = []
-    if parameters['age']:
-        cleaned_up.append(int(customer['Age']))
-    if parameters['income']:
-        cleaned_up.append(int(customer['Annual Income (k$)']))
-    if parameters['spending_score']:
-        cleaned_up.append(int(customer['Spending Score (1-100)']))
-    return cleaned_up
+    data = get_data(parameters)
+    return [Point(row, index) for index, row in enumerate(data)]
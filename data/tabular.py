@@ -0,0 +1,155 @@
+"""
+shared loader for the csv data sets: parses only the selected columns into a float matrix and caches the result as
+.npy file, so that later loads are memory-mapped instead of parsed again
+"""
+import csv
+import hashlib
+import os
+from typing import Iterator, Optional, Tuple, Union
+
+import numpy as np
+from numpy import ndarray
+
+from solver_interface import ArrayInstance
+from util import write_atomically
+
+
+def load_columns(path: str, columns: list[str], num_rows: Optional[int] = None, missing: Union[str, float] = "drop",
+                 cache_dir: Optional[str] = None) -> ndarray:
+    """
+    Loads the selected columns of a csv file as an (n, len(columns)) float matrix.
+    @param path: path of the csv file, its first line holds the column names
+    @param columns: names of the columns to load, in this order
+    @param num_rows: (optional) only use the first num_rows rows of the file
+    @param missing: what to do with rows that have an empty cell in one of the columns: "drop" them, "raise" a
+    ValueError, or replace the empty cells by the given float
+    @param cache_dir: (optional) directory of the cache, default is a .cache directory next to the csv file
+    @return: the float matrix, memory-mapped from the cache if possible
+    """
+    data = cached_columns(path, columns, cache_dir)
+    if num_rows is not None:
+        data = data[:num_rows]
+    return handle_missing(data, columns, missing)
+
+
+def load_chunks(path: str, columns: list[str], chunk_rows: int, missing: Union[str, float] = "drop",
+                cache_dir: Optional[str] = None) -> Iterator[ndarray]:
+    """
+    Loads the selected columns of a csv file in chunks of rows, e.g. for a streaming solver. Only one chunk at a time
+    is read from the memory-mapped cache.
+    @param chunk_rows: number of rows of the file per chunk, chunks may be smaller after dropping rows
+    @return: iterator over the (m, len(columns)) float matrices of the chunks, see load_columns for the parameters
+    """
+    data = cached_columns(path, columns, cache_dir)
+    for start in range(0, len(data), chunk_rows):
+        yield handle_missing(np.array(data[start:start + chunk_rows]), columns, missing)
+
+
+def cached_columns(path: str, columns: list[str], cache_dir: Optional[str] = None) -> ndarray:
+    """
+    @return: the selected columns of a csv file memory-mapped from the cache, which is created by parsing the file
+    on a miss; empty cells are nan
+    """
+    cache_file = cache_path(path, columns, cache_dir)
+    if not os.path.exists(cache_file):
+        data = parse_columns(path, columns)
+        write_atomically(cache_file, lambda file: np.save(file, data))
+    return np.load(cache_file, mmap_mode="r")
+
+
+def parse_columns(path: str, columns: list[str]) -> ndarray:
+    """
+    Parses the selected columns of a csv file directly into floats, empty cells become nan.
+    @param path: path of the csv file, its first line holds the column names
+    @param columns: names of the columns to parse, in this order
+    @return: (n, len(columns)) float matrix
+    """
+    with open(path, mode='r', newline='') as csv_file:
+        header = next(csv.reader([csv_file.readline()]))
+        unknown = [name for name in columns if name not in header]
+        if unknown:
+            raise ValueError(f"{path} has no column(s) {unknown}")
+        positions = [header.index(name) for name in columns]
+        data = np.loadtxt(csv_file, dtype=np.float64, delimiter=",", quotechar='"', usecols=positions, ndmin=2,
+                          converters=lambda cell: float(cell) if cell.strip() else np.nan)
+    return data.reshape(-1, len(columns))
+
+
+def handle_missing(data: ndarray, columns: list[str], missing: Union[str, float]) -> ndarray:
+    empty = np.isnan(data)
+    if not empty.any():
+        return data
+    if missing == "drop":
+        return data[~empty.any(axis=1)]
+    if missing == "raise":
+        row, column = np.argwhere(empty)[0]
+        raise ValueError(f"empty cell in column {columns[column]} of data row {row}")
+    if isinstance(missing, str):
+        raise ValueError(f"unknown missing value policy {missing!r}, expected 'drop', 'raise' or a float")
+    return np.where(empty, missing, data)
+
+
+def cache_path(path: str, columns: list[str], cache_dir: Optional[str] = None) -> str:
+    """
+    @return: path of the cache file of the given columns, keyed on the content of the csv file and the columns
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), ".cache")
+    digest = hashlib.sha256(content_hash(path, cache_dir).encode())
+    digest.update("\0".join(columns).encode())
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f"{name}-{digest.hexdigest()[:24]}.npy")
+
+
+def content_hash(path: str, cache_dir: str) -> str:
+    """
+    Returns the SHA-256 hex digest of the content of a file. The digest is stored in a sidecar file in cache_dir,
+    keyed on the absolute path, size and modification time of the file, so that it is only computed again when the
+    file changes.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = hashlib.sha256(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}".encode()).hexdigest()[:24]
+    name = os.path.splitext(os.path.basename(path))[0]
+    sidecar = os.path.join(cache_dir, f"{name}-{key}.sha256")
+    try:
+        with open(sidecar) as file:
+            return file.read().strip()
+    except FileNotFoundError:
+        pass
+    digest = hashlib.sha256()
+    with open(path, mode='rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    write_atomically(sidecar, lambda file: file.write(digest.hexdigest().encode()))
+    return digest.hexdigest()
+
+
+def collapse_duplicates(data: ndarray, weights: Optional[ndarray] = None) -> Tuple[ndarray, ndarray, ndarray]:
+    """
+    Collapses identical rows into one weighted row, so that the solvers process each distinct point once.
+    @param data: (n, d) float matrix
+    @param weights: (optional) weight of each row, default 1
+    @return: tuple containing the distinct rows in the order of their first occurrence, the weight of each distinct
+    row (the number of its copies, or the sum of their weights), and for each row of data the index of its distinct row
+    """
+    distinct, first, inverse = np.unique(data, axis=0, return_index=True, return_inverse=True)
+    order = np.argsort(first)  # np.unique sorts the rows, restore the order of the data
+    position = np.empty_like(order)
+    position[order] = np.arange(len(order))
+    inverse = position[inverse.reshape(-1)]
+    collapsed_weights = np.bincount(inverse, weights=weights, minlength=len(order)).astype(np.float64)
+    return np.ascontiguousarray(distinct[order]), collapsed_weights, inverse
+
+
+def make_instance(data: ndarray, k: int, collapse: bool = False) -> ArrayInstance:
+    """
+    @param data: (n, d) float matrix of the points
+    @param k: number of centers to be opened
+    @param collapse: if True, identical rows become one point weighted by their number, see collapse_duplicates
+    @return: the instance of the rows of data
+    """
+    if not collapse:
+        return ArrayInstance(data, k)
+    distinct, weights, _ = collapse_duplicates(data)
+    return ArrayInstance(distinct, k, weights=weights)
@@ -0,0 +1,40 @@
+"""
+behaviour checks of the prefix and subsample views of data.dataset.Dataset. Run with python dataset_test.py (or pytest)
+"""
+import numpy as np
+
+from data.dataset import Dataset
+
+
+def test_views_have_the_sort_orders_of_their_points():
+    rng = np.random.default_rng(0)
+    dataset = Dataset(rng.integers(0, 20, (3000, 3)).astype(np.float64))  # many ties
+    for n in (1, 17, 1024, 2999, 3000, 5000):
+        for instance in (dataset.prefix(n, 3), dataset.subsample(n, 3, seed=n % 2)):
+            expected = np.argsort(instance.as_array(), axis=0, kind="stable").T
+            assert instance.size() == min(n, 3000) and np.array_equal(instance.sorted_order(), expected)
+    small, large = dataset.subsample(100, 3, seed=4), dataset.subsample(1000, 3, seed=4)
+    assert np.shares_memory(small.data, large.data) and np.array_equal(small.data, large.data[:100])
+    assert np.array_equal(np.sort(dataset.subsample(3000, 3, seed=4).data, axis=0), np.sort(dataset.data, axis=0))
+
+
+def test_statistics_match_numpy_also_far_from_the_origin():
+    rng = np.random.default_rng(1)
+    for offset in (0.0, 1e8):
+        data = rng.normal(size=(5000, 2)) * 1e-3 + offset
+        dataset = Dataset(data)
+        for n in (1, 2, 1024, 1025, 3333, 5000):
+            statistics = dataset.statistics(n)
+            assert np.array_equal(statistics["min"], data[:n].min(axis=0))
+            assert np.array_equal(statistics["max"], data[:n].max(axis=0))
+            assert np.array_equal(statistics["median"], np.median(data[:n], axis=0))
+            centered = data[:n] - offset  # exact, so the centered moments are the reference
+            assert np.allclose(statistics["mean"], centered.mean(axis=0) + offset, rtol=0,
+                               atol=2 * np.spacing(offset) + 1e-15)
+            assert np.allclose(statistics["std"], centered.std(axis=0), rtol=1e-9, atol=0)
+
+
+if __name__ == "__main__":
+    test_views_have_the_sort_orders_of_their_points()
+    test_statistics_match_numpy_also_far_from_the_origin()
+    print("the data set views behave as expected")
@@ -3,6 +3,7 @@ sys.path.append('..')
 sys.path.append('../..')
 
 import algorithms.iterative_mistake_minimization
+import algorithms.precluster_cache
 import data.mall.conversion
 import visualization.clusterings
 import visualization.imm_with_precluster
@@ -11,8 +12,8 @@ mall_parameters = {'age': False, 'income': True, 'spending_score': True}
 instance = data.mall.conversion.get_instance(k=5, parameters=mall_parameters)
 # import data.synthetic
 # instance = data.synthetic.k_clusters(k=5, spread=1.2, cluster_size=50)
-pre_solver = algorithms.kmedplusplus.KMedPlusPlus(numiter=15)
-pre_clusters = pre_solver(instance).clusters()
+pre_solver = algorithms.precluster_cache.CachedSolver(algorithms.kmedplusplus.KMedPlusPlus(numiter=15, medoid="pruned"))
+pre_clusters = pre_solver(instance)
 solver = algorithms.iterative_mistake_minimization.IMM()
 output = solver(instance, pre_clusters)
 visualization.imm_with_precluster.show_explainable_clusters(output)
@@ -0,0 +1,36 @@
+"""
+behaviour checks of the flat-array trees: predict must route every point of the instance to the leaf it ended up in
+during the build, for every split search and builder, also after a save and load round trip.
+Run with python flat_tree_test.py (or pytest)
+"""
+import os
+import tempfile
+
+import numpy as np
+
+import algorithms.iterative_mistake_minimization as imm
+from algorithms.Esfandiari_algorithm import Esfandiari
+from algorithms.Makarychev_algorithm import Makarychev
+from solver_interface import FlatTree
+from split_search_test import random_instances
+
+SOLVERS = [imm.IMM(split_search) for split_search in ("bruteforce", "sweep", "presorted", "streaming")] + \
+          [Makarychev(seed=0), Esfandiari(seed=0)]
+
+
+def test_predict_matches_the_leaf_partition():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "tree.npz")
+        for instance, pre_clusters in random_instances(4):
+            for solver in SOLVERS:
+                output = solver(instance, pre_clusters)
+                labels = output.leaf_labels()
+                assert np.all(labels >= 0)  # the leaves partition the points
+                assert np.array_equal(output.predict(instance.as_array()), labels), solver
+                output.flat_tree().save(path)
+                assert np.array_equal(FlatTree.load(path).predict(instance.as_array()), labels), solver
+
+
+if __name__ == "__main__":
+    test_predict_matches_the_leaf_partition()
+    print("the flat trees route every point to its leaf")
@@ -0,0 +1,45 @@
+"""
+behaviour checks of the headless core: the solver modules import and solve without matplotlib, and without
+scikit-learn unless its adapter is used. Run with python headless_test.py (or pytest)
+"""
+import json
+import subprocess
+import sys
+
+from benchmark.startup import CORE_MODULES, OPTIONAL_DEPENDENCIES, REPOSITORY, measure_startup
+
+# solves with KMedPlusPlus, IMM and the scikit-learn adapter in a fresh interpreter, then lists the optional modules
+SOLVE = """
+import json, sys
+import numpy as np
+from algorithms.iterative_mistake_minimization import IMM
+from algorithms.kmedplusplus import KMedPlusPlus
+from solver_interface import ArrayInstance
+instance = ArrayInstance(np.random.default_rng(0).normal(size=(200, 2)), 3)
+pre_clusters = KMedPlusPlus(numiter=2)(instance)
+IMM()(instance, pre_clusters).cost()
+loaded = [sorted(name for name in {optional!r} if name in sys.modules)]
+from algorithms.sklearn_builtins import SKLearn
+SKLearn()(instance, pre_clusters).cost()
+loaded.append(sorted(name for name in {optional!r} if name in sys.modules))
+print(json.dumps(loaded))
+"""
+
+
+def test_core_modules_import_without_the_optional_dependencies():
+    records = measure_startup(CORE_MODULES, repeat=1)
+    assert [record["module"] for record in records if record["optional"]] == []
+    assert all(record["median"] > 0 for record in records)
+
+
+def test_solving_loads_scikit_learn_only_for_its_adapter_and_never_matplotlib():
+    completed = subprocess.run([sys.executable, "-c", SOLVE.format(optional=OPTIONAL_DEPENDENCIES)], cwd=REPOSITORY,
+                               capture_output=True, text=True, check=True)
+    core, adapter = json.loads(completed.stdout.strip().splitlines()[-1])
+    assert core == [] and adapter == ["sklearn"]
+
+
+if __name__ == "__main__":
+    test_core_modules_import_without_the_optional_dependencies()
+    test_solving_loads_scikit_learn_only_for_its_adapter_and_never_matplotlib()
+    print("the headless core behaves as expected")
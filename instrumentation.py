@@ -0,0 +1,162 @@
+"""
+opt-in tracing of the solvers: phase and per-node timings, counters of the hot kernels, exported as JSON lines or as a
+Chrome trace (chrome://tracing, Perfetto). Without an active tracer every hook returns at once
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+_tracer: Optional[Tracer] = None  # the active tracer, None disables all hooks
+
+
+class Span:
+    """a timed region of an active tracer, recorded as one event when it ends. Its fields are given when it starts or
+    set while it runs, and it also records by how much each counter grew meanwhile"""
+
+    def __init__(self, tracer: Tracer, name: str, category: str, fields: dict):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.fields = fields
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self) -> Span:
+        self.counters = dict(self.tracer.counters)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        end = time.perf_counter()
+        counters = {name: value - self.counters.get(name, 0) for name, value in self.tracer.counters.items()
+                    if value != self.counters.get(name, 0)}
+        self.tracer.record(self.name, self.category, self.start, end, {**self.fields, **counters})
+        return False
+
+
+class _NoSpan:
+    """stands in for a Span while tracing is disabled"""
+
+    def set(self, **fields):
+        pass
+
+    def __enter__(self) -> _NoSpan:
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    """Collects the spans and counters of the solvers while it is active, see tracing. Times are in seconds since
+    the tracer was created. The counters are global, so the counter deltas of spans that run at the same time in
+    different threads (IMM with several workers) include each other's work."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events: list[dict] = []
+        self.counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def span(self, name: str, category: str, fields: dict) -> Span:
+        return Span(self, name, category, fields)
+
+    def count(self, name: str, n: int):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def record(self, name: str, category: str, start: float, end: float, fields: dict):
+        event = {"name": name, "category": category, "start": start - self.origin, "duration": end - start,
+                 "thread": threading.get_ident(), **{key: to_json(value) for key, value in fields.items()}}
+        with self._lock:
+            self.events.append(event)
+
+    def summary(self) -> dict[str, dict]:
+        """
+        @return: for each span name, the number of spans, their total and their maximal duration, and the counters
+        """
+        totals = {}
+        for event in self.events:
+            total = totals.setdefault(event["name"], {"calls": 0, "seconds": 0.0, "max_seconds": 0.0})
+            total["calls"] += 1
+            total["seconds"] += event["duration"]
+            total["max_seconds"] = max(total["max_seconds"], event["duration"])
+        return {"spans": totals, "counters": dict(self.counters)}
+
+    def write_jsonl(self, path: str):
+        """writes one JSON object per span, in the order the spans ended, followed by the final counters"""
+        with open(path, "w") as file:
+            for event in self.events:
+                file.write(json.dumps(event) + "\n")
+            file.write(json.dumps({"name": "counters", "category": "counters", **self.counters}) + "\n")
+
+    def write_chrome_trace(self, path: str):
+        """writes the spans as complete events of the Chrome trace event format, with times in microseconds"""
+        reserved = ("name", "category", "start", "duration", "thread")
+        events = [{"name": event["name"], "cat": event["category"], "ph": "X", "ts": event["start"] * 1e6,
+                   "dur": event["duration"] * 1e6, "pid": os.getpid(), "tid": event["thread"],
+                   "args": {key: value for key, value in event.items() if key not in reserved}}
+                  for event in self.events]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"counters": self.counters}},
+                      file)
+
+
+def to_json(value):
+    """converts numpy scalars (and anything else JSON does not know) for the export"""
+    if isinstance(value, (bool, int, float, str)) or value is None:
+        return value
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+@contextmanager
+def tracing(tracer: Optional[Tracer] = None) -> Iterator[Tracer]:
+    """
+    Activates a tracer for the solvers run inside the with block, e.g.
+
+        with instrumentation.tracing() as tracer:
+            output = IMM()(instance, pre_clusters)
+        tracer.write_chrome_trace("imm.trace.json")
+
+    @param tracer: (optional) tracer to continue, default a new one
+    @return: the active tracer
+    """
+    global _tracer
+    previous, _tracer = _tracer, Tracer() if tracer is None else tracer
+    try:
+        yield _tracer
+    finally:
+        _tracer = previous
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def span(name: str, category: str = "phase", **fields):
+    """
+    Hook for a timed region: with span("lloyd", iterations=5) as region: ...; region.set(cost=...)
+    @return: a Span of the active tracer, or a shared no-op stand-in if tracing is disabled
+    """
+    tracer = _tracer
+    if tracer is None:
+        return NO_SPAN
+    return tracer.span(name, category, fields)
+
+
+def count(name: str, n: int = 1):
+    """Hook for a counter, e.g. count("distances", len(X)), does nothing if tracing is disabled"""
+    tracer = _tracer
+    if tracer is not None:
+        tracer.count(name, n)
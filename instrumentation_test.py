@@ -0,0 +1,72 @@
+"""
+behaviour checks of the opt-in tracing of the solvers. Run with python instrumentation_test.py (or pytest)
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+
+import instrumentation
+from algorithms.iterative_mistake_minimization import IMM
+from algorithms.kmedplusplus import KMedPlusPlus
+from solver_interface import ArrayInstance
+
+
+def solve():
+    instance = ArrayInstance(np.random.default_rng(0).normal(size=(500, 2)), 4)
+    output = IMM()(instance, KMedPlusPlus(numiter=2)(instance))
+    return output.cost()
+
+
+def test_hooks_do_nothing_while_disabled():
+    assert not instrumentation.enabled()
+    assert instrumentation.span("lloyd", iterations=3) is instrumentation.NO_SPAN
+    with instrumentation.span("lloyd") as region:
+        region.set(cost=1.0)
+    instrumentation.count("distances", 10)
+    with instrumentation.tracing() as tracer:
+        assert instrumentation.enabled()
+    assert not instrumentation.enabled() and tracer.events == [] and tracer.counters == {}
+
+
+def test_phases_nodes_and_counters_are_recorded():
+    with instrumentation.tracing() as tracer:
+        cost = solve()
+    assert np.isclose(cost, solve())  # tracing does not change the result
+    names = {event["name"] for event in tracer.events}
+    assert {"seeding", "lloyd", "build_tree", "node", "leaf_medians", "cost"} <= names
+    nodes = [event for event in tracer.events if event["name"] == "node"]
+    assert len(nodes) == 3 and all(event["category"] == "node" for event in nodes)  # one per split of 4 leaves
+    assert max(event["points"] for event in nodes) == 500 and all(event["centers"] >= 2 for event in nodes)
+    assert tracer.counters["distances"] > 0 and tracer.counters["thresholds"] > 0
+    build = next(event for event in tracer.events if event["name"] == "build_tree")
+    assert build["thresholds"] == tracer.counters["thresholds"]  # the build evaluated every threshold
+    assert all(event["duration"] >= 0 and event["start"] >= 0 for event in tracer.events)
+    summary = tracer.summary()
+    assert summary["spans"]["node"]["calls"] == 3 and summary["counters"] == tracer.counters
+
+
+def test_exported_traces_are_valid_json():
+    with instrumentation.tracing() as tracer:
+        solve()
+    with tempfile.TemporaryDirectory() as directory:
+        lines_path, chrome_path = os.path.join(directory, "trace.jsonl"), os.path.join(directory, "trace.json")
+        tracer.write_jsonl(lines_path)
+        tracer.write_chrome_trace(chrome_path)
+        with open(lines_path) as file:
+            lines = [json.loads(line) for line in file]
+        with open(chrome_path) as file:
+            chrome = json.load(file)
+    assert [line["name"] for line in lines[:-1]] == [event["name"] for event in tracer.events]
+    assert lines[-1]["name"] == "counters" and lines[-1]["distances"] == tracer.counters["distances"]
+    events = chrome["traceEvents"]
+    assert len(events) == len(tracer.events) and all(event["ph"] == "X" for event in events)
+    assert np.isclose(events[0]["dur"], tracer.events[0]["duration"] * 1e6)
+
+
+if __name__ == "__main__":
+    test_hooks_do_nothing_while_disabled()
+    test_phases_nodes_and_counters_are_recorded()
+    test_exported_traces_are_valid_json()
+    print("the instrumentation behaves as expected")
@@ -0,0 +1,52 @@
+"""
+behaviour checks of the k-median++ seeding and the Lloyd iterations. Run with python kmedplusplus_test.py (or pytest)
+"""
+import numpy as np
+
+from algorithms.kmedplusplus import lloyd, prob_seed
+from solver_interface import ArrayInstance, CenterOutput
+from util import closest_centers, stack_coordinates
+
+
+def random_instance(seed: int = 0, n: int = 200, k: int = 5, weights: bool = False) -> ArrayInstance:
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(n, 3)) + rng.integers(0, 4, (n, 1)) * 5
+    return ArrayInstance(data, k, weights=rng.integers(0, 3, n).astype(np.float64) if weights else None)
+
+
+def test_seeding_tracks_the_closest_centers():
+    for seed in range(5):
+        instance = random_instance(seed, weights=seed % 2 == 1)
+        solution = prob_seed(instance, seed)
+        assert len(solution.centers) == instance.k
+        labels, distances = closest_centers(instance.as_array(), stack_coordinates(solution.centers))
+        assert np.array_equal(solution.labels, labels) and np.allclose(solution.distances, distances)
+        if instance.weights is not None:  # points of weight 0 are never drawn
+            assert all(instance.weights[center.index] > 0 for center in solution.centers)
+
+
+def test_seeding_identical_points():
+    instance = ArrayInstance(np.ones((10, 2)), 3)
+    solution = prob_seed(instance, 0)
+    assert len(solution.centers) == 3 and solution.cost == 0
+
+
+def test_lloyd_keeps_the_assignment_of_its_last_iteration():
+    for update in ("medoid", "median"):
+        for weights in (False, True):
+            instance = random_instance(1, weights=weights)
+            costs = []
+            solution = lloyd(prob_seed(instance, 1), 20, update=update, tol=0.0,
+                             callback=lambda centers: costs.append(CenterOutput(instance, centers).cost))
+            assert len(costs) < 20  # converged before numiter
+            assert all(later <= earlier + 1e-9 for earlier, later in zip(costs, costs[1:]))
+            expected = CenterOutput(instance, solution.centers)
+            assert np.array_equal(solution.labels, expected.labels) and np.allclose(solution.cost, expected.cost)
+            assert np.isclose(solution.cost, costs[-1])
+
+
+if __name__ == "__main__":
+    test_seeding_tracks_the_closest_centers()
+    test_seeding_identical_points()
+    test_lloyd_keeps_the_assignment_of_its_last_iteration()
+    print("k-median++ behaves as expected")
@@ -0,0 +1,54 @@
+"""
+regression checks of the medoid modes against medoid_bruteforce, on random inputs with ties and duplicate points.
+Run with python medoid_test.py (or pytest)
+"""
+import numpy as np
+
+from algorithms.kmedplusplus import KMedPlusPlus
+from solver_interface import ArrayInstance
+from split_search_test import NUM_INSTANCES, random_data
+from util import Point, l1_costs, medoid_bruteforce, medoid_exact, medoid_pruned, medoid_sampled
+
+
+def test_medoids_match_bruteforce():
+    rng = np.random.default_rng(1)
+    for t in range(3 * NUM_INSTANCES):
+        coords = random_data(rng, int(rng.integers(1, 80)), int(rng.integers(1, 4)), t % 3)
+        weights = rng.integers(1, 4, len(coords)).astype(np.float64) if t % 2 else None
+        points = [Point(row, index) for index, row in enumerate(coords)]
+        expected = medoid_bruteforce(points, weights).index
+        costs = l1_costs(coords, np.arange(len(coords)), weights=weights)
+        # the medoid is the lowest row of minimal cost; the float sums of the modes may round ties differently
+        tolerance = 1e-9 * (1 + costs.max())
+        for medoid in (medoid_exact(coords, weights=weights), medoid_pruned(coords, weights=weights),
+                       medoid_exact(coords, max_block_bytes=1, weights=weights),
+                       medoid_pruned(coords, max_block_bytes=1, weights=weights),
+                       medoid_sampled(coords, rng, sample_size=len(coords), weights=weights)):
+            assert medoid == expected if t % 3 == 0 else abs(costs[medoid] - costs[expected]) <= tolerance
+
+
+def test_blocked_costs_match_unblocked():
+    rng = np.random.default_rng(2)
+    coords = random_data(rng, 200, 3, 0)
+    weights = rng.random(len(coords))
+    candidates = rng.choice(len(coords), size=20, replace=False)
+    for point_weights in (None, weights):
+        expected = l1_costs(coords, candidates, weights=point_weights)
+        for max_block_bytes in (1, 100, 10_000):
+            assert np.allclose(l1_costs(coords, candidates, max_block_bytes, point_weights), expected)
+
+
+def test_medoid_modes_give_the_same_pre_clustering():
+    data = random_data(np.random.default_rng(3), 300, 2, 1)
+    instance = ArrayInstance(data, 4)
+    expected = KMedPlusPlus(numiter=4, medoid="bruteforce")(instance)
+    for medoid in ("exact", "pruned"):
+        solution = KMedPlusPlus(numiter=4, medoid=medoid)(instance)
+        assert [center.index for center in solution.centers] == [center.index for center in expected.centers]
+
+
+if __name__ == "__main__":
+    test_medoids_match_bruteforce()
+    test_blocked_costs_match_unblocked()
+    test_medoid_modes_give_the_same_pre_clustering()
+    print("all medoid modes agree with the brute-force version")
@@ -0,0 +1,62 @@
+"""
+behaviour checks of the memory-mapped instances: the chunked passes must give the results of the in-memory instance,
+and the clusters larger than a chunk get an approximate medoid. Run with python memmap_test.py (or pytest)
+"""
+import os
+import tempfile
+
+import numpy as np
+
+import cost_engine
+from algorithms.kmedplusplus import chunked_medoid, lloyd, prob_seed
+from solver_interface import ArrayInstance, MemmapInstance
+from util import l1_costs, medoid_exact
+
+
+def mapped_pair(directory: str, seed: int = 0, n: int = 400, d: int = 3, weights: bool = False):
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(n, d)) + rng.integers(0, 3, (n, 1)) * 4
+    point_weights = rng.integers(1, 4, n).astype(np.float64) if weights else None
+    path = os.path.join(directory, f"data{seed}.npy")
+    np.save(path, data)
+    # 2 KiB hold 10 rows of 3 floats per chunk
+    return ArrayInstance(data, 4, weights=point_weights), MemmapInstance(path, 4, 2 ** 11, point_weights)
+
+
+def test_chunked_passes_match_the_instance_in_memory():
+    with tempfile.TemporaryDirectory() as directory:
+        for seed, weights in ((0, False), (1, True)):
+            instance, mapped = mapped_pair(directory, seed, weights=weights)
+            assert mapped.chunk_rows() < instance.size()
+            labels = prob_seed(instance, seed).labels
+            for objective in ("l1", "l2"):
+                expected = cost_engine.evaluate(instance.as_array(), labels, 4, objective, None, instance.weights)
+                report = cost_engine.evaluate(mapped.as_array(), labels, 4, objective, mapped.chunk_rows(),
+                                              mapped.weights)
+                assert np.allclose(report.centers, expected.centers) and np.isclose(report.total, expected.total)
+            expected = lloyd(prob_seed(instance, seed), 3, update="median")
+            solution = lloyd(prob_seed(mapped, seed), 3, update="median")
+            assert np.allclose([center.coordinates for center in solution.centers],
+                               [center.coordinates for center in expected.centers])
+            # the clusters exceed a chunk, so their medoids are sampled, but they still improve on the seeding
+            seeded = prob_seed(mapped, seed)
+            solution = lloyd(seeded, 3, rng=np.random.default_rng(seed))
+            assert solution.cost <= seeded.cost
+            assert all(center is mapped.point(center.index) for center in solution.centers)
+
+
+def test_chunked_medoid_is_close_to_the_exact_medoid():
+    rng = np.random.default_rng(2)
+    data = rng.normal(size=(3000, 2))
+    members = np.arange(0, 3000, 2)
+    costs = l1_costs(data[members], np.arange(len(members)))
+    exact = costs[medoid_exact(data[members])]
+    row = chunked_medoid(data, members, medoid_exact, rng, chunk_rows=100)
+    assert row in members
+    assert costs[np.searchsorted(members, row)] <= 1.01 * exact
+
+
+if __name__ == "__main__":
+    test_chunked_passes_match_the_instance_in_memory()
+    test_chunked_medoid_is_close_to_the_exact_medoid()
+    print("the memory-mapped instances behave as expected")
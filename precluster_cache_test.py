@@ -0,0 +1,67 @@
+"""
+behaviour checks of the on-disk pre-clustering cache. Run with python precluster_cache_test.py (or pytest)
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from algorithms.kmedplusplus import KMedPlusPlus
+from algorithms.precluster_cache import CachedSolver, evict
+from solver_interface import ArrayInstance
+from util import TEMPORARY_PREFIX
+
+
+class CountingSolver(KMedPlusPlus):
+    """KMedPlusPlus that counts how often it actually runs"""
+    runs = 0
+
+    def __call__(self, instance):
+        CountingSolver.runs += 1
+        return super().__call__(instance)
+
+
+def random_instance(seed: int) -> ArrayInstance:
+    return ArrayInstance(np.random.default_rng(seed).normal(size=(100, 2)), 3)
+
+
+def test_hits_return_the_stored_solution():
+    CountingSolver.runs = 0
+    with tempfile.TemporaryDirectory() as directory:
+        for update in ("medoid", "median"):  # medians are no data points and are stored with their coordinates
+            solver = CachedSolver(CountingSolver(numiter=2, update=update), directory)
+            instance = random_instance(0)
+            first, second = solver(instance), solver(random_instance(0))
+            assert np.array_equal(first.labels, second.labels) and first.cost == second.cost
+            assert [center.index for center in first.centers] == [center.index for center in second.centers]
+            assert np.allclose([center.coordinates for center in first.centers],
+                               [center.coordinates for center in second.centers])
+        assert CountingSolver.runs == 2
+        CachedSolver(CountingSolver(numiter=2, seed=1), directory)(random_instance(0))  # other parameters miss
+        CachedSolver(CountingSolver(numiter=2), directory)(random_instance(1))  # other data misses
+        CachedSolver(CountingSolver(numiter=2, seed=None), directory)(random_instance(0))  # unseeded never caches
+        CachedSolver(CountingSolver(numiter=2, seed=None), directory)(random_instance(0))
+        assert CountingSolver.runs == 6 and len(os.listdir(directory)) == 4
+        assert not [name for name in os.listdir(directory) if name.startswith(TEMPORARY_PREFIX)]
+
+
+def test_eviction_removes_the_least_recently_used_entries():
+    with tempfile.TemporaryDirectory() as directory:
+        solver = CachedSolver(KMedPlusPlus(), directory)
+        paths = []
+        for seed in range(3):
+            solver(random_instance(seed))
+            paths.append(os.path.join(directory, solver.key(random_instance(seed)) + ".npz"))
+            os.utime(paths[-1], (seed, seed))
+        os.utime(paths[0])  # the first entry is used again
+        leftover = os.path.join(directory, TEMPORARY_PREFIX + "crashed.npz")
+        with open(leftover, "wb") as file:
+            file.write(b"\0" * 10_000)
+        evict(directory, sum(os.path.getsize(path) for path in paths[1:]))
+        assert [os.path.exists(path) for path in paths] == [True, False, True] and os.path.exists(leftover)
+
+
+if __name__ == "__main__":
+    test_hits_return_the_stored_solution()
+    test_eviction_removes_the_least_recently_used_entries()
+    print("the pre-clustering cache behaves as expected")
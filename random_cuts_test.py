@@ -0,0 +1,53 @@
+"""
+behaviour checks of the randomized explainable solvers (Makarychev, Esfandiari) and the best-of-N runner.
+Run with python random_cuts_test.py (or pytest)
+"""
+import numpy as np
+
+from algorithms.Esfandiari_algorithm import Esfandiari
+from algorithms.Makarychev_algorithm import Makarychev, sample_cut
+from algorithms.multi_trial import BestOfN
+from solver_interface import ArrayInstance, CenterOutput
+
+
+def random_pre_clustering(seed: int, d: int, k: int = 6):
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(150, d))
+    instance = ArrayInstance(data, k)
+    return instance, CenterOutput(instance, [instance.point(row) for row in range(k)])
+
+
+def test_cuts_separate_the_centers_in_any_dimension():
+    for d in (1, 2, 3, 5):
+        instance, pre_clusters = random_pre_clustering(d, d)
+        centers = instance.as_array()[:instance.k]
+        rng = np.random.default_rng(d)
+        for _ in range(50):  # a cut lies within the bounding box of the centers, so it separates two of them
+            i, theta = sample_cut(centers, instance.k, rng)
+            assert centers[:, i].min() <= theta <= centers[:, i].max()
+        output = Makarychev(seed=d)(instance, pre_clusters)
+        assert len(output.leaves) == instance.k and all(leaf.is_homogeneous() for leaf in output.leaves)
+
+
+def test_seeded_solvers_are_reproducible():
+    instance, pre_clusters = random_pre_clustering(0, 3)
+    for solver in (Makarychev(seed=7), Esfandiari(seed=7)):
+        first, second = solver(instance, pre_clusters), solver(instance, pre_clusters)
+        assert [node.split for node in first.split_nodes] == [node.split for node in second.split_nodes]
+
+
+def test_best_of_n_keeps_the_cheapest_trial():
+    instance, pre_clusters = random_pre_clustering(1, 2)
+    for solver in (Makarychev(), Esfandiari()):
+        serial = BestOfN(solver, trials=4, seed=3, processes=1).run(instance, pre_clusters)
+        parallel = BestOfN(solver, trials=4, seed=3, processes=2).run(instance, pre_clusters)
+        assert np.array_equal(serial.costs, parallel.costs)
+        assert serial.best_trial == int(np.argmin(serial.costs))
+        assert np.isclose(serial.best.cost(), serial.costs.min())
+
+
+if __name__ == "__main__":
+    test_cuts_separate_the_centers_in_any_dimension()
+    test_seeded_solvers_are_reproducible()
+    test_best_of_n_keeps_the_cheapest_trial()
+    print("the randomized solvers behave as expected")
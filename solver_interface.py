@@ -1,13 +1,18 @@
 from __future__ import \
     annotations  # from algorithms.iterative_mistake_minimization import ClusterNode
 
+import hashlib
+import os
 from dataclasses import dataclass, field
-from functools import reduce
+from functools import cached_property
 from math import inf
 import numpy as np
 from numpy import ndarray
-from typing import Optional, Tuple
-from util import Point, median_coordinatewise, dist
+from typing import Optional, Tuple, Union
+import cost_engine
+import instrumentation
+from cost_engine import CostReport
+from util import Point, stack_coordinates, closest_centers, assigned_distances, row_chunks, weighted_median
 
 
 @dataclass
@@ -16,134 +21,601 @@ class Instance:
     assume all instances are valid d-dimensional euclidean instances"""
     points: list[Point]  # each point is np.array
     k: int  # number of centers to be opened
+    weights: Optional[ndarray] = field(default=None, compare=False)  # weight of each point, None means all 1
+
+    def __post_init__(self):
+        self.weights = check_weights(self.weights, len(self.points))
+        # the instance works on its own point views that know their row, the given points stay unchanged
+        self._given_rows = {id(point): index for index, point in enumerate(self.points)}
+        self._given_points = self.points  # keeps the ids in _given_rows valid
+        self.points = [Point(point.coordinates, index) for index, point in enumerate(self.points)]
+        self._data = None
+        self._sorted_order = None
+        self._fingerprint = None
 
     def dimension(self):
         return len(self.points[0].coordinates)
 
+    def size(self) -> int:
+        return len(self.points)
+
+    def point(self, index: int) -> Point:
+        return self.points[index]
+
+    def row(self, point: Point) -> int:
+        """
+        @param point: a point of the instance, or one of the points the instance was created from
+        @return: the row of the point in the data matrix
+        """
+        return self._given_rows.get(id(point), point.index)
+
+    def as_array(self) -> ndarray:
+        """
+        Returns the coordinates of all points as an (n, d) matrix, row i belongs to points[i].
+        The matrix is computed once and cached.
+        """
+        if self._data is None:
+            self._data = stack_coordinates(self.points)
+        return self._data
+
+    def sorted_order(self) -> ndarray:
+        """
+        Returns for each dimension the rows sorted by their coordinate in that dimension, ties in the order of the
+        rows. The (d, n) index matrix is computed once and cached, callers must not modify it.
+        """
+        if self._sorted_order is None:
+            self._sorted_order = np.argsort(self.as_array(), axis=0, kind="stable").T.copy()
+        return self._sorted_order
+
+    def fingerprint(self) -> str:
+        """
+        Returns the SHA-256 hex digest of the shape and the coordinates of the points (not of k), which identifies
+        the data of the instance, e.g. in cache keys. It is computed once, reading the data in chunks.
+        """
+        if self._fingerprint is None:
+            data = self.as_array()
+            digest = hashlib.sha256(f"{data.shape}".encode())
+            for rows in row_chunks(len(data), self.chunk_rows()):
+                digest.update(np.ascontiguousarray(data[rows], dtype=np.float64).tobytes())
+            if self.weights is not None:
+                digest.update(self.weights.tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def chunk_rows(self) -> Optional[int]:
+        """
+        @return: number of rows the passes over all points read at once, None if the whole matrix is in memory
+        """
+        return None
+
+
+def check_weights(weights: Optional[ndarray], n: int) -> Optional[ndarray]:
+    """
+    @return: the weights as float array, None stays None (all weights 1)
+    """
+    if weights is None:
+        return None
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.shape != (n,):
+        raise ValueError(f"expected one weight per point ({n}), got an array of shape {weights.shape}")
+    if np.any(weights < 0):
+        raise ValueError("weights must not be negative")
+    return weights
+
+
+def weighted_sum(values: ndarray, weights: Optional[ndarray]) -> np.float64:
+    """@return: the sum of the values, each multiplied by its weight unless weights is None"""
+    return np.float64(values.sum() if weights is None else np.dot(values, weights))
+
+
+class ArrayInstance(Instance):
+    """represents an instance of the k-median problem stored column-wise as a contiguous (n, d) float matrix,
+    points and centers are referred to by their row index. Point objects are only created on demand, as thin
+    views on the rows of the matrix, so that all solvers working on Instance.points still accept it."""
+
+    def __init__(self, data: ndarray, k: int, sorted_order: Optional[ndarray] = None,
+                 weights: Optional[ndarray] = None):
+        """
+        @param data: (n, d) matrix of the points, not copied if it already is a contiguous float matrix
+        @param k: number of centers to be opened
+        @param sorted_order: (optional) precomputed result of sorted_order(), e.g. sliced from a data.dataset.Dataset
+        @param weights: (optional) weight of each point, None means all weights 1
+        """
+        self.data = np.ascontiguousarray(data, dtype=np.float64)
+        self.k = k
+        self.weights = check_weights(weights, len(self.data))
+        self._views: dict[int, Point] = {}
+        self._points: Optional[list[Point]] = None
+        self._sorted_order = sorted_order
+        self._fingerprint = None
+
+    def __repr__(self):
+        return f"ArrayInstance(n={self.size()}, d={self.dimension()}, k={self.k})"
+
+    @classmethod
+    def from_instance(cls, instance: Instance) -> ArrayInstance:
+        return cls(instance.as_array(), instance.k, weights=instance.weights)
+
+    @property
+    def points(self) -> list[Point]:
+        if self._points is None:
+            self._points = [self.point(index) for index in range(self.size())]
+        return self._points
+
+    def point(self, index: int) -> Point:
+        """
+        Returns the point view on row index, the same object is returned on every call
+        @param index: row of the point
+        @return: Point whose coordinates are a view on the row
+        """
+        index = int(index)
+        if index not in self._views:
+            self._views[index] = Point(self.data[index], index)
+        return self._views[index]
+
+    def row(self, point: Point) -> int:
+        return point.index
+
+    def dimension(self):
+        return self.data.shape[1]
+
+    def size(self) -> int:
+        return self.data.shape[0]
+
+    def as_array(self) -> ndarray:
+        return self.data
+
+
+class MemmapInstance(ArrayInstance):
+    """represents an instance of the k-median problem whose (n, d) matrix stays in a memory-mapped file, for data sets
+    larger than the RAM. The passes over all points (seeding, assignment, cost evaluation, the streaming IMM split
+    search) read the matrix in chunks of chunk_rows() rows, so that their temporaries stay within memory_budget bytes,
+    and the statistics of the streaming IMM split search share another memory_budget bytes. What they keep per point
+    (labels, distances, index arrays) is O(n) in memory, but never O(n * d)."""
+    CHUNK_COPIES = 4  # temporaries of a chunk pass: the chunk itself, differences, absolute values and a mask
+
+    def __init__(self, data: Union[str, ndarray], k: int, memory_budget: int = 2 ** 28,
+                 weights: Optional[ndarray] = None):
+        """
+        @param data: path of a .npy file, which is memory-mapped read-only, or an (n, d) (memory-mapped) array
+        @param k: number of centers to be opened
+        @param memory_budget: bytes available for the temporaries of one chunk, and for the statistics of one tree level
+        of the streaming IMM split search
+        @param weights: (optional) weight of each point, None means all weights 1
+        """
+        if isinstance(data, (str, os.PathLike)):
+            data = np.load(data, mmap_mode="r")
+        if data.ndim != 2:
+            raise ValueError(f"expected an (n, d) matrix, got an array of shape {data.shape}")
+        self.data = data  # not converted, a dtype conversion would load the whole file
+        self.k = k
+        self.weights = check_weights(weights, len(self.data))
+        self.memory_budget = memory_budget
+        self._views: dict[int, Point] = {}
+        self._points: Optional[list[Point]] = None
+        self._sorted_order = None
+        self._fingerprint = None
+
+    def __repr__(self):
+        return f"MemmapInstance(n={self.size()}, d={self.dimension()}, k={self.k}, " \
+               f"chunk_rows={self.chunk_rows()})"
+
+    def chunk_rows(self) -> int:
+        row_bytes = self.dimension() * np.dtype(np.float64).itemsize * self.CHUNK_COPIES
+        return max(1, self.memory_budget // row_bytes)
+
 
 @dataclass
 class CenterOutput:
     """represents a solution to the k-median problem"""
     instance: Instance
     centers: list[Point]
-    assignment: dict[Point, tuple[Point, np.float64]] = field(init=False)
+    labels: ndarray = field(init=False)  # for each point, the index in centers of its closest center
+    distances: ndarray = field(init=False)  # for each point, the distance to its closest center
     cost: np.float64 = field(init=False)
 
     def __post_init__(self):
-        self.assignment = {point: point.closest_center(self.centers) for point in self.instance.points}
-        self.cost = sum([self.assignment[point][1] for point in self.instance.points])
+        self.labels, self.distances = closest_centers(self.instance.as_array(), stack_coordinates(self.centers),
+                                                      self.instance.chunk_rows())
+        self.cost = weighted_sum(self.distances, self.instance.weights)
+
+    @classmethod
+    def from_labels(cls, instance: Instance, centers: list[Point], labels: ndarray,
+                    distances: Optional[ndarray] = None) -> CenterOutput:
+        """
+        Creates the output for a known assignment of the points to their closest centers, e.g. one loaded from a
+        cache, without searching the closest centers again.
+        @param instance: instance of the k-median problem
+        @param centers: the centers
+        @param labels: for each point, the index in centers of its closest center
+        @param distances: (optional) for each point, the distance to its center, computed in one pass if None
+        @return: the solution
+        """
+        output = cls.__new__(cls)  # skips __post_init__
+        output.instance = instance
+        output.centers = centers
+        output.labels = np.asarray(labels, dtype=np.intp)
+        if distances is None:
+            distances = assigned_distances(instance.as_array(), stack_coordinates(centers), output.labels,
+                                           instance.chunk_rows())
+        output.distances = distances
+        output.cost = weighted_sum(output.distances, instance.weights)
+        return output
+
+    @property
+    def assignment(self) -> dict[Point, tuple[Point, np.float64]]:
+        """maps each point to its closest center and the distance to it, built on demand from the label array"""
+        return {point: (self.centers[label], distance) for point, label, distance in
+                zip(self.instance.points, self.labels, self.distances)}
+
+    def cluster_indices(self) -> list[ndarray]:
+        """
+        Groups the points by their center with a single argsort of the label array.
+        @return: for each center, the rows of the points of its cluster in increasing order
+        """
+        order = np.argsort(self.labels, kind="stable")
+        cluster_bounds = np.cumsum(np.bincount(self.labels, minlength=len(self.centers)))
+        return np.split(order, cluster_bounds[:-1])
+
+    def cluster_costs(self) -> ndarray:
+        """
+        @return: for each center, the sum of the (weighted) distances of the points of its cluster to it
+        """
+        distances = self.distances if self.instance.weights is None else self.distances * self.instance.weights
+        return np.bincount(self.labels, weights=distances, minlength=len(self.centers))
 
     def clusters(self) -> dict[Point, list[Point]]:
-        return {center: [point for point in self.instance.points if self.assignment[point][0] == center] for center in
-                self.centers}
+        return {center: [self.instance.point(index) for index in indices] for center, indices in
+                zip(self.centers, self.cluster_indices())}
 
-    # def cost(self) -> float:
-    #     clusters = self.clusters()
-    #     cost = sum([sum([dist(center, point) for point in clusters[center]]) for center in list(clusters.keys())])
-    #     return cost
 
+def pre_cluster_labels(instance: Instance, pre_clusters) -> tuple[list[Point], ndarray]:
+    """
+    Converts a pre-clustering into a list of centers and an integer label array, as used by the explainable solvers.
+    A CenterOutput hands over its label array directly, a dict is converted through the rows of its points.
+    @param instance: instance the pre-clustering belongs to
+    @param pre_clusters: a CenterOutput, or a dict mapping each center to the points of its cluster
+    @return: tuple containing the centers and, for each point, the index of its center (-1 for unclustered points)
+    """
+    if isinstance(pre_clusters, CenterOutput):
+        return pre_clusters.centers, pre_clusters.labels
+    centers = list(pre_clusters.keys())
+    labels = np.full(instance.size(), -1, dtype=np.intp)
+    for c, center in enumerate(centers):
+        labels[[instance.row(point) for point in pre_clusters[center]]] = c
+    return centers, labels
 
-@dataclass
+
+def pre_cluster_dict(pre_clusters) -> dict[Point, list[Point]]:
+    """
+    @param pre_clusters: a CenterOutput, or a dict mapping each center to the points of its cluster
+    @return: the pre-clustering as a dict mapping each center to the points of its cluster
+    """
+    if isinstance(pre_clusters, CenterOutput):
+        return pre_clusters.clusters()
+    return pre_clusters
+
+
+@dataclass(eq=False)
+class TreeData:
+    """holds the arrays shared by all nodes of one explainable tree. Every node owns the slice [start, stop) of each
+    row of order, so that the nodes of one tree level together hold O(n) indices, independent of the depth"""
+    instance: Instance
+    centers: list[Point]  # centers of the pre-clustering
+    center_coords: ndarray  # (k, d) coordinates of the centers
+    order: ndarray  # (r, n) index arrays, a node's slice of each row contains the same points (in r orders)
+    labels: ndarray  # for each point, the index of the center of its cluster, -1 if it is in no cluster (anymore)
+    set_mode: str = "points"  # what node.set contains: "points", "centers" or "points+centers" of the node
+
+    @classmethod
+    def from_pre_clusters(cls, instance: Instance, pre_clusters, set_mode: str = "points", presort: bool = False,
+                          reassign: bool = False) -> TreeData:
+        """
+        @param instance: instance of the k-median problem
+        @param pre_clusters: a CenterOutput, or a dict mapping each center to the points of its cluster
+        @param set_mode: what node.set contains: "points", "centers" or "points+centers" of the node
+        @param presort: if True, order has one row per dimension, sorted by that coordinate, otherwise a single row
+        @param reassign: if True, assign the clustered points to their closest center first. A CenterOutput already is
+        such an assignment
+        @return: the shared tree data
+        """
+        centers, labels = pre_cluster_labels(instance, pre_clusters)
+        center_coords = stack_coordinates(centers)
+        data = instance.as_array()
+        labels = labels.copy()  # the labels change while the tree is built
+        if reassign and not isinstance(pre_clusters, CenterOutput):
+            clustered = np.flatnonzero(labels >= 0)
+            labels[clustered] = closest_centers(data, center_coords, instance.chunk_rows())[0][clustered]
+        if presort:
+            order = instance.sorted_order().copy()  # the tree partitions its index arrays in place
+        else:
+            order = np.arange(len(data))[np.newaxis, :]
+        return cls(instance, centers, center_coords, order, labels, set_mode)
+
+
+@dataclass(eq=False)
 class ClusterNode:
-    """represents a node in an explainable tree solution to the k-median problem"""
-    clusters: dict[Point, list[Point]]
+    """represents a node in an explainable tree solution to the k-median problem. A node holds a slice of the index
+    arrays of its tree instead of lists of points. Its points and clusters are materialized as lists on demand; as the
+    labels are shared by the whole tree, the clusters of a split node reflect the assignment at the end of the build"""
+    tree: TreeData = field(repr=False)
     bounds: ndarray  # array of arrays (lower_bound, upper_bound) for each dimension
-    set: list[Point] = field(default_factory=list) #list of centers belonging to node, default value []
+    start: int  # the points of the node are tree.order[:, start:stop]
+    stop: int
+    center_ids: ndarray  # indices into tree.centers of the centers belonging to the node
     split: Optional[Tuple[int, float]] = None
     children: list[ClusterNode] = field(default_factory=list)  # default value []
 
-    def centers(self):
-        return self.clusters.keys()
+    @classmethod
+    def root(cls, instance: Instance, pre_clusters, set_mode: str = "points", presort: bool = False,
+             reassign: bool = False) -> ClusterNode:
+        """
+        Creates the root of a new tree, see TreeData.from_pre_clusters for the parameters
+        """
+        tree = TreeData.from_pre_clusters(instance, pre_clusters, set_mode, presort, reassign)
+        return cls(tree, np.array([[-inf, inf]] * instance.dimension()), 0, tree.order.shape[1],
+                   np.arange(len(tree.centers)))  # initial bounds are -inf, inf
+
+    def indices(self, row: int = 0) -> ndarray:
+        """@return: the rows of the points of the node, in the order of the given row of the index arrays"""
+        return self.tree.order[row, self.start:self.stop]
+
+    def members(self, row: int = 0) -> ndarray:
+        """@return: the rows of the points of the node that are in the cluster of one of its centers"""
+        indices = self.indices(row)
+        return indices[self.tree.labels[indices] >= 0]
+
+    def centers(self) -> list[Point]:
+        return [self.tree.centers[c] for c in self.center_ids]
+
+    @property
+    def clusters(self) -> dict[Point, list[Point]]:
+        indices = self.members()
+        labels = self.tree.labels[indices]
+        return {self.tree.centers[c]: [self.tree.instance.point(j) for j in indices[labels == c]]
+                for c in self.center_ids}
+
+    @property
+    def set(self) -> list[Point]:
+        """the points (Makarychev: points and centers, Esfandiari: centers) belonging to the node"""
+        points = [] if self.tree.set_mode == "centers" else [self.tree.instance.point(j) for j in self.indices()]
+        return points + (self.centers() if self.tree.set_mode != "points" else [])
+
+    def set_median(self) -> Point:
+        """
+        Computes the coordinate-wise median of node.set one dimension at a time, without creating Point objects.
+        Points count with their weight, centers once.
+        @return: the median as a new point
+        """
+        data = self.tree.instance.as_array()
+        indices = self.indices() if self.tree.set_mode != "centers" else np.arange(0)
+        center_coords = self.tree.center_coords[self.center_ids] if self.tree.set_mode != "points" \
+            else np.empty((0, self.dimension()))
+        weights = self.tree.instance.weights
+        if weights is not None:
+            weights = np.concatenate((weights[indices], np.ones(len(center_coords))))
+        return Point(np.array([weighted_median(np.concatenate((data[indices, i], center_coords[:, i])), weights)
+                               for i in range(self.dimension())]))
 
     def dimension(self):
         return len(self.bounds)
 
     def is_homogeneous(self):
-        return len(self.clusters.keys()) == 1
-
-
-def make_kids_IMM(node: ClusterNode, i: int, theta: float, useEsfandiari = False):
-    # update clusters and bounds for children nodes
-    node_L_centers = [center for center in node.centers() if center.coordinates[i] <= theta]
-    node_L_clusters = {center: [point for point in node.clusters[center] if point.coordinates[i] <= theta] for
-                       center in node_L_centers}
-    if useEsfandiari:
-        node_L_X = node_L_centers
-    else:
-        node_L_X = [point for point in node.set if point.coordinates[i] <= theta]
+        return len(self.center_ids) == 1
+
+
+def partition(node: ClusterNode, i: int, theta: float) -> int:
+    """
+    Stably partitions every row of the slice of node, such that the points with coordinate i at most theta come first.
+    @return: the number of points at or below theta
+    """
+    data = node.tree.instance.as_array()
+    num_left = 0
+    with instrumentation.span("partition", rows=node.tree.order.shape[0], points=node.stop - node.start):
+        for row in range(node.tree.order.shape[0]):
+            indices = node.indices(row)
+            goes_left = data[indices, i] <= theta
+            num_left = int(np.count_nonzero(goes_left))
+            node.tree.order[row, node.start:node.stop] = np.concatenate((indices[goes_left], indices[~goes_left]))
+    return num_left
+
+
+def split_node(node: ClusterNode, i: int, theta: float, num_left: int) -> Tuple[ClusterNode, ClusterNode]:
+    """
+    Creates the children of node for the split (i, theta), after its slice was partitioned.
+    """
+    center_left = node.tree.center_coords[node.center_ids, i] <= theta
     node_L_bounds = node.bounds.copy()
     node_L_bounds[i][1] = theta  # change upper bound to theta
-    node_L = ClusterNode(node_L_clusters, node_L_bounds, node_L_X)
-
-    node_R_centers = [center for center in node.centers() if center.coordinates[i] > theta]
-    node_R_clusters = {center: [point for point in node.clusters[center] if point.coordinates[i] > theta] for
-                       center in node_R_centers}
-    if useEsfandiari:
-        node_R_X = node_R_centers
-    else:
-        node_R_X = [point for point in node.set if point.coordinates[i] > theta]
+    node_L = ClusterNode(node.tree, node_L_bounds, node.start, node.start + num_left, node.center_ids[center_left])
     node_R_bounds = node.bounds.copy()
     node_R_bounds[i][0] = theta  # change lower bound to theta
-    node_R = ClusterNode(node_R_clusters, node_R_bounds, node_R_X)
+    node_R = ClusterNode(node.tree, node_R_bounds, node.start + num_left, node.stop, node.center_ids[~center_left])
+    node.split = i, theta
+    node.children = [node_L, node_R]
     return node_L, node_R
 
 
+def make_kids_IMM(node: ClusterNode, i: int, theta: float):
+    # update clusters and bounds for children nodes, points separated from their center leave its cluster
+    num_left = partition(node, i, theta)
+    data = node.tree.instance.as_array()
+    members = node.members()
+    labels = node.tree.labels[members]
+    mistakes = (data[members, i] <= theta) != (node.tree.center_coords[labels, i] <= theta)
+    node.tree.labels[members[mistakes]] = -1
+    return split_node(node, i, theta, num_left)
 
-def make_kids(node: ClusterNode, i: int, theta: float, useEsfandiari = False):
-    # update clusters and bounds for children nodes
-    node_L_centers = [center for center in node.centers() if center.coordinates[i] <= theta]
-    # node_L_clusters = {center: [point for point in node.clusters[center] if point.coordinates[i] <= theta] for
-    #                    center in node_L_centers}
-    # for point in list(node.clusters.values()):
-    #     print(point)
-    node_L_clusters = {center: [point for point in reduce(list.__add__, node.clusters.values())
-                                if (point.coordinates[i] <= theta and point.closest_center(node_L_centers)[0] == center)] for
-                       center in node_L_centers}
-    if useEsfandiari:
-        node_L_X = node_L_centers
-    else:
-        node_L_X = [point for point in node.set if point.coordinates[i] <= theta]
-    node_L_bounds = node.bounds.copy()
-    node_L_bounds[i][1] = theta  # change upper bound to theta
-    node_L = ClusterNode(node_L_clusters, node_L_bounds, node_L_X)
-
-    node_R_centers = [center for center in node.centers() if center.coordinates[i] > theta]
-    # node_R_clusters = {center: [point for point in node.clusters[center] if point.coordinates[i] > theta] for
-    #                    center in node_R_centers}
-    node_R_clusters = {center: [point for point in reduce(list.__add__, node.clusters.values())
-                                if (point.coordinates[i] > theta and point.closest_center(node_R_centers)[0] == center)]
-                       for center in node_R_centers}
-    if useEsfandiari:
-        node_R_X = node_R_centers
-    else:
-        node_R_X = [point for point in node.set if point.coordinates[i] > theta]
-    node_R_bounds = node.bounds.copy()
-    node_R_bounds[i][0] = theta  # change lower bound to theta
-    node_R = ClusterNode(node_R_clusters, node_R_bounds, node_R_X)
+
+def make_kids(node: ClusterNode, i: int, theta: float):
+    # update clusters and bounds for children nodes, points separated from their center join the closest center on
+    # their side. The other points keep their center, which is still the closest one among the remaining centers
+    num_left = partition(node, i, theta)
+    node_L, node_R = split_node(node, i, theta, num_left)
+    data = node.tree.instance.as_array()
+    for child in (node_L, node_R):
+        members = child.members()
+        lost = members[~np.isin(node.tree.labels[members], child.center_ids)]
+        if len(child.center_ids) == 0:  # no center on this side (possible for splits not chosen between centers)
+            node.tree.labels[lost] = -1
+        elif len(lost) > 0:
+            labels = closest_centers(data[lost], node.tree.center_coords[child.center_ids])[0]
+            node.tree.labels[lost] = child.center_ids[labels]
     return node_L, node_R
 
+
+def clustering_cost(clusters: dict[Point, list[Point]]) -> float:
+    """
+    Computes the cost of a clustering when every cluster is served by its coordinate-wise median
+    @param clusters: dict mapping each center to the points of its cluster
+    @return: the sum over all clusters of the 1-norm distances of its points to their coordinate-wise median
+    """
+    points = [point for cluster in clusters.values() for point in cluster]
+    if not points:
+        return 0.0
+    labels = np.repeat(np.arange(len(clusters)), [len(cluster) for cluster in clusters.values()])
+    return cost_engine.evaluate(stack_coordinates(points), labels, len(clusters)).total
+
+
+@dataclass(eq=False)
+class FlatTree:
+    """compact array representation of an explainable tree, node 0 is the root. A point x goes from split node j to
+    left[j] if x[feature[j]] <= threshold[j] and to right[j] otherwise"""
+    feature: ndarray  # split dimension of each node, -1 for leaves
+    threshold: ndarray  # split threshold of each node, nan for leaves
+    left: ndarray  # left child of each node, -1 for leaves
+    right: ndarray  # right child of each node, -1 for leaves
+    leaf_label: ndarray  # index of each leaf in the list of leaves of the tree, -1 for split nodes
+
+    @classmethod
+    def from_nodes(cls, root: ClusterNode, leaves: list[ClusterNode]) -> FlatTree:
+        """
+        Flattens the linked tree below root in preorder.
+        @param root: root of the tree, every split node needs its split and children set
+        @param leaves: leaves of the tree, their position in this list is their label
+        @return: the flat tree
+        """
+        leaf_labels = {id(leaf): label for label, leaf in enumerate(leaves)}
+        nodes = []
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(reversed(node.children))
+        position = {id(node): j for j, node in enumerate(nodes)}
+        feature = np.array([node.split[0] if node.children else -1 for node in nodes], dtype=np.intp)
+        threshold = np.array([node.split[1] if node.children else np.nan for node in nodes], dtype=np.float64)
+        left = np.array([position[id(node.children[0])] if node.children else -1 for node in nodes], dtype=np.intp)
+        right = np.array([position[id(node.children[1])] if node.children else -1 for node in nodes], dtype=np.intp)
+        leaf_label = np.array([-1 if node.children else leaf_labels[id(node)] for node in nodes], dtype=np.intp)
+        return cls(feature, threshold, left, right, leaf_label)
+
+    @classmethod
+    def load(cls, path) -> FlatTree:
+        with np.load(path) as arrays:
+            return cls(arrays["feature"], arrays["threshold"], arrays["left"], arrays["right"], arrays["leaf_label"])
+
+    def save(self, path):
+        np.savez(path, feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+                 leaf_label=self.leaf_label)
+
+    def predict(self, X: ndarray) -> ndarray:
+        """
+        Routes a batch of points through the tree, all points of one level at a time.
+        @param X: (n, d) matrix of points
+        @return: for each point, the label of the leaf it ends up in
+        """
+        X = np.asarray(X)
+        node = np.zeros(len(X), dtype=np.intp)
+        active = np.arange(len(X)) if self.feature[0] >= 0 else np.arange(0)
+        while len(active) > 0:
+            current = node[active]
+            goes_left = X[active, self.feature[current]] <= self.threshold[current]
+            node[active] = np.where(goes_left, self.left[current], self.right[current])
+            active = active[self.feature[node[active]] >= 0]
+        return self.leaf_label[node]
+
+
 @dataclass
 class ExplainableOutput:
     """represents an explainable solution to the k-median problem"""
     instance: Instance
     leaves: list[ClusterNode]
     split_nodes: list[ClusterNode]
-    pre_clusters: dict[Point, list[Point]]
+    pre_clusters: Union[CenterOutput, dict[Point, list[Point]]]  # the clustering the tree explains
     medians: Optional[list[Point]] = None
 
     def __post_init__(self):
-        self.clusters = self.clusters()
-
-    def clusters(self) -> dict[int, list[Point]]:
-        self.medians = [median_coordinatewise(node.set) for node in
-                        self.leaves]  # for each leaf node, get list of points in (only) cluster
-        assignment = {point: point.closest_center(self.medians) for point in self.instance.points}
-        return {center: [point for point in self.instance.points if assignment[point][0] == center] for center in
-                self.medians}
-
-    def cost(self) -> float:
-        print("inside wrong cost function")
-        cost = sum([sum([dist(center, point) for point in self.clusters[center]]) for center in list(self.clusters.keys())])
-        return cost
-        # mediandict = {center: median_coordinatewise(self.clusters[center]) for center in self.clusters.keys()}
-        # return sum(sum(dist(mediandict[center], point) for point in self.clusters[center]) for center in self.clusters.keys())
\ No newline at end of file
+        # every point is assigned to its closest leaf median, the clusters are only materialized when accessed
+        with instrumentation.span("leaf_medians", leaves=len(self.leaves)):
+            self.medians = [node.set_median() for node in self.leaves]
+        with instrumentation.span("assignment", n=self.instance.size(), centers=len(self.medians)):
+            self.labels = closest_centers(self.instance.as_array(), stack_coordinates(self.medians),
+                                          self.instance.chunk_rows())[0]
+        self._flat_tree = None
+
+    def root(self) -> ClusterNode:
+        # all builders record the split nodes in preorder, so the root comes first
+        return self.split_nodes[0] if self.split_nodes else self.leaves[0]
+
+    def flat_tree(self) -> FlatTree:
+        """@return: the tree as flat arrays, computed once and cached"""
+        if self._flat_tree is None:
+            self._flat_tree = FlatTree.from_nodes(self.root(), self.leaves)
+        return self._flat_tree
+
+    def predict(self, X: ndarray) -> ndarray:
+        """
+        Assigns new points to the leaves of the tree without rebuilding it.
+        @param X: (n, d) matrix of points
+        @return: for each point, the index in leaves (and medians) of its leaf
+        """
+        return self.flat_tree().predict(X)
+
+    @cached_property
+    def clusters(self) -> dict[Point, list[Point]]:
+        """maps each leaf median to the points closest to it"""
+        order = np.argsort(self.labels, kind="stable")
+        cluster_bounds = np.cumsum(np.bincount(self.labels, minlength=len(self.medians)))
+        return {median: [self.instance.point(index) for index in indices] for median, indices in
+                zip(self.medians, np.split(order, cluster_bounds[:-1]))}
+
+    def leaf_labels(self) -> ndarray:
+        """
+        @return: for each point, the index in leaves of the leaf of the tree it belongs to
+        """
+        if self.leaves[0].tree.instance is not self.instance:  # the tree was built on a sample of the instance
+            data = self.instance.as_array()
+            labels = np.empty(self.instance.size(), dtype=np.intp)
+            for rows in row_chunks(len(data), self.instance.chunk_rows()):
+                labels[rows] = self.predict(data[rows])
+            return labels
+        labels = np.full(self.instance.size(), -1, dtype=np.intp)
+        for j, leaf in enumerate(self.leaves):
+            labels[leaf.indices()] = j
+        return labels
+
+    def cost_report(self, mode: str = "nearest", objective: str = "l1") -> CostReport:
+        """
+        Evaluates the cost of the tree with the cost engine, every group of points is served by its own median
+        (objective "l1") or mean (objective "l2").
+        @param mode: "leaf" groups the points by the leaf of the tree they belong to, "nearest" by their closest leaf
+        median, like the clusters of the output
+        @param objective: "l1" (1-norm distances, k-median) or "l2" (squared euclidean distances, k-means)
+        @return: the total cost and the cost of each group, i.e. of each leaf
+        """
+        if mode == "leaf":
+            labels = self.leaf_labels()
+        elif mode == "nearest":
+            labels = self.labels
+        else:
+            raise ValueError(f"unknown cost mode {mode!r}, expected 'leaf' or 'nearest'")
+        with instrumentation.span("cost", mode=mode, objective=objective, n=self.instance.size()):
+            return cost_engine.evaluate(self.instance.as_array(), labels, len(self.leaves), objective,
+                                        self.instance.chunk_rows(), self.instance.weights)
+
+    def cost(self, mode: str = "nearest", objective: str = "l1") -> float:
+        """
+        @return: the total cost of the tree, see cost_report. The default equals clustering_cost(self.clusters)
+        """
+        return self.cost_report(mode, objective).total
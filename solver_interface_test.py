@@ -0,0 +1,98 @@
+"""
+behaviour checks of the instances and outputs in solver_interface. Run with python solver_interface_test.py (or pytest)
+"""
+import numpy as np
+
+from solver_interface import ArrayInstance, CenterOutput, ClusterNode, Instance, make_kids, make_kids_IMM, \
+    pre_cluster_labels
+from util import Point, closest_centers
+
+
+def random_points(seed: int = 0, n: int = 30, d: int = 2) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 6, (n, d)).astype(np.float64)
+
+
+def test_instance_keeps_the_given_points():
+    data = random_points()
+    given = [Point(row) for row in data]
+    instance = Instance(given, 3)
+    assert all(point.index is None for point in given)
+    assert [instance.row(point) for point in given] == list(range(len(data)))
+    assert [instance.row(point) for point in instance.points] == list(range(len(data)))
+    assert np.array_equal(instance.as_array(), data)
+    # a pre-clustering given as a dict of the caller's points is converted through their rows
+    centers = [given[0], given[1]]
+    clusters = {centers[0]: given[:15], centers[1]: given[15:]}
+    labels = pre_cluster_labels(instance, clusters)[1]
+    assert np.array_equal(labels, np.repeat([0, 1], 15))
+
+
+def test_array_instance_points_are_row_views():
+    data = random_points()
+    instance = ArrayInstance(data, 3)
+    assert instance.as_array() is instance.data
+    point = instance.point(4)
+    assert point is instance.point(4) and point.index == 4
+    assert np.shares_memory(point.coordinates, instance.data)
+    assert np.array_equal(ArrayInstance.from_instance(Instance([Point(row) for row in data], 3)).data, data)
+
+
+def test_closest_centers_break_ties_like_points():
+    data = random_points(1)
+    instance = ArrayInstance(data, 4)
+    centers = [instance.point(row) for row in (0, 1, 2, 3)]
+    labels, distances = closest_centers(data, data[:4], chunk_rows=7)
+    for point, label, distance in zip(instance.points, labels, distances):
+        center, expected = point.closest_center(centers)
+        assert centers[label] is center and distance == expected
+    output = CenterOutput(instance, centers)
+    assert np.array_equal(output.labels, labels) and output.cost == distances.sum()
+
+
+def test_center_output_groups_the_clusters_by_label():
+    data = random_points(2)
+    weights = np.random.default_rng(2).random(len(data))
+    instance = ArrayInstance(data, 3, weights=weights)
+    output = CenterOutput(instance, [instance.point(row) for row in (0, 5, 9)])
+    for c, indices in enumerate(output.cluster_indices()):
+        assert np.array_equal(indices, np.flatnonzero(output.labels == c))
+        assert np.isclose(output.cluster_costs()[c], np.dot(output.distances[indices], weights[indices]))
+    clusters = output.clusters()
+    assert [sorted(point.index for point in clusters[center]) for center in output.centers] == \
+           [indices.tolist() for indices in output.cluster_indices()]
+    assert np.isclose(output.cluster_costs().sum(), output.cost)
+    reloaded = CenterOutput.from_labels(instance, output.centers, output.labels)
+    assert np.array_equal(reloaded.distances, output.distances) and reloaded.cost == output.cost
+
+
+def test_make_kids_partitions_every_index_row():
+    data = random_points(3, 60, 3)
+    instance = ArrayInstance(data, 4)
+    pre_clusters = CenterOutput(instance, [instance.point(row) for row in (0, 1, 2, 3)])
+    for make in (make_kids, make_kids_IMM):
+        root = ClusterNode.root(instance, pre_clusters, presort=True)
+        i, theta = 1, 2.5
+        node_L, node_R = make(root, i, theta)
+        for child, goes_left in ((node_L, True), (node_R, False)):
+            rows = [child.indices(row) for row in range(root.tree.order.shape[0])]
+            assert all(np.array_equal(np.sort(indices), np.sort(rows[0])) for indices in rows)
+            assert np.all((data[rows[0], i] <= theta) == goes_left)
+            for row, indices in enumerate(rows):  # row r stays sorted by dimension r
+                assert np.all(np.diff(data[indices, row]) >= 0)
+            members = child.members()
+            if make is make_kids:  # separated points join the closest center on their side
+                center_coords = root.tree.center_coords[child.center_ids]
+                expected = child.center_ids[closest_centers(data[members], center_coords)[0]]
+                assert np.array_equal(root.tree.labels[members], expected)
+            else:  # separated points leave their cluster
+                assert np.all(np.isin(root.tree.labels[members], child.center_ids))
+                assert np.all(pre_clusters.labels[members] == root.tree.labels[members])
+
+
+if __name__ == "__main__":
+    test_instance_keeps_the_given_points()
+    test_array_instance_points_are_row_views()
+    test_closest_centers_break_ties_like_points()
+    test_center_output_groups_the_clusters_by_label()
+    test_make_kids_partitions_every_index_row()
+    print("instances and outputs behave as expected")
@@ -0,0 +1,92 @@
+"""
+regression checks of the fast IMM split searches against the brute-force search: the sweep, presorted and streaming
+searches (also on a memory-mapped instance with a tiny memory budget) must build the tree of the brute-force search,
+on random inputs with ties and duplicate points. Run with python split_search_test.py (or pytest)
+"""
+import os
+import tempfile
+
+import numpy as np
+
+import algorithms.iterative_mistake_minimization as imm
+from solver_interface import ArrayInstance, CenterOutput, MemmapInstance
+
+NUM_INSTANCES = 40
+
+
+def random_data(rng: np.random.Generator, n: int, d: int, kind: int) -> np.ndarray:
+    """integer grid (many ties), gaussian, or gaussian with every row duplicated a random number of times"""
+    if kind == 0:
+        return rng.integers(0, 5, (n, d)).astype(np.float64)
+    if kind == 1:
+        return rng.normal(size=(n, d))
+    rows = rng.normal(size=(max(1, n // 3), d))
+    return np.repeat(rows, rng.integers(1, 5, len(rows)), axis=0)[:n]
+
+
+def random_instances(seed: int = 0):
+    """
+    @return: iterator over instances with weights (sometimes) and a pre-clustering with k distinct centers
+    """
+    rng = np.random.default_rng(seed)
+    for t in range(NUM_INSTANCES):
+        n, d, k = int(rng.integers(10, 120)), int(rng.integers(1, 4)), int(rng.integers(2, 7))
+        data = random_data(rng, n, d, t % 3)
+        weights = rng.integers(1, 4, len(data)).astype(np.float64) if t % 4 == 3 else None
+        rows = rng.choice(len(data), size=min(k, len(data)), replace=False)
+        if len(np.unique(data[rows], axis=0)) < len(rows):  # IMM needs distinct centers
+            continue
+        instance = ArrayInstance(data, len(rows), weights=weights)
+        yield instance, CenterOutput(instance, [instance.point(row) for row in rows])
+
+
+def tree_signature(output) -> tuple:
+    return [node.split for node in output.split_nodes], [sorted(leaf.indices().tolist()) for leaf in output.leaves]
+
+
+def test_split_searches_build_the_bruteforce_tree():
+    with tempfile.TemporaryDirectory() as directory:
+        for instance, pre_clusters in random_instances():
+            expected = tree_signature(imm.IMM("bruteforce")(instance, pre_clusters))
+            for split_search in ("sweep", "presorted", "streaming"):
+                assert tree_signature(imm.IMM(split_search)(instance, pre_clusters)) == expected, split_search
+            path = os.path.join(directory, "data.npy")
+            np.save(path, instance.as_array())
+            # 64 bytes leave room for a single distinct coordinate, so the streaming search goes through histograms
+            mapped = MemmapInstance(path, instance.k, memory_budget=64, weights=instance.weights)
+            mapped_pre_clusters = CenterOutput(mapped, [mapped.point(center.index) for center in pre_clusters.centers])
+            assert tree_signature(imm.IMM()(mapped, mapped_pre_clusters)) == expected, "memory-mapped"
+
+
+def test_dimensions_without_a_center_split_are_skipped():
+    # all centers share the coordinate of dimension 0, so only dimension 1 separates them
+    data = np.array([[0.0, 0.0], [0.0, 1.0], [1.0, 0.0], [1.0, 5.0], [0.0, 5.0], [2.0, 6.0]])
+    instance = ArrayInstance(data, 2)
+    pre_clusters = CenterOutput(instance, [instance.point(0), instance.point(4)])
+    for split_search in ("bruteforce", "sweep", "presorted", "streaming"):
+        output = imm.IMM(split_search)(instance, pre_clusters)
+        assert [node.split[0] for node in output.split_nodes] == [1], split_search
+
+
+def test_presorted_search_keeps_the_sorted_order_of_the_instance():
+    for instance, pre_clusters in random_instances(3):
+        sorted_order = instance.sorted_order()
+        expected = np.argsort(instance.as_array(), axis=0, kind="stable").T
+        imm.IMM("presorted")(instance, pre_clusters)
+        assert instance.sorted_order() is sorted_order and np.array_equal(sorted_order, expected)
+
+
+def test_parallel_builds_grow_the_same_tree():
+    for instance, pre_clusters in random_instances(5):
+        for split_search in ("sweep", "presorted"):
+            expected = tree_signature(imm.IMM(split_search)(instance, pre_clusters))
+            output = imm.IMM(split_search, workers=4, parallel_min_size=8)(instance, pre_clusters)
+            assert tree_signature(output) == expected, split_search
+
+
+if __name__ == "__main__":
+    test_split_searches_build_the_bruteforce_tree()
+    test_dimensions_without_a_center_split_are_skipped()
+    test_presorted_search_keeps_the_sorted_order_of_the_instance()
+    test_parallel_builds_grow_the_same_tree()
+    print("all split searches agree with the brute-force search")
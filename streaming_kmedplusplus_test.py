@@ -0,0 +1,51 @@
+"""
+behaviour checks of the streaming k-median++ pre-clusterer. Run with python streaming_kmedplusplus_test.py (or pytest)
+"""
+import numpy as np
+
+from algorithms.kmedplusplus import KMedPlusPlus
+from algorithms.streaming_kmedplusplus import StreamingKMedPlusPlus
+from solver_interface import ArrayInstance
+
+
+def blobs(seed: int = 0, n: int = 5000, k: int = 5) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(n, 2)) + rng.integers(0, k, (n, 1)) * np.array([8.0, -5.0])
+
+
+def test_summary_stays_bounded_and_keeps_the_weight():
+    data = blobs()
+    weights = np.random.default_rng(1).integers(1, 3, len(data)).astype(np.float64)
+    solver = StreamingKMedPlusPlus(summary_size=200)
+    for start in range(0, len(data), 250):
+        solver.partial_fit(data[start:start + 250], weights[start:start + 250])
+        summary, summary_weights = solver.summary()
+        assert len(summary) <= 2 * solver.summary_size
+        assert np.isclose(summary_weights.sum(), weights[:start + 250].sum())
+    assert np.isclose(solver.total_weight, weights.sum())
+
+
+def test_streamed_solution_is_close_to_kmedplusplus():
+    instance = ArrayInstance(blobs(2), 5)
+    streamed = StreamingKMedPlusPlus(summary_size=300, chunk_rows=500)(instance)
+    assert len(streamed.centers) == 5 and all(center.index is None for center in streamed.centers)
+    assert streamed.cost <= 1.2 * KMedPlusPlus(numiter=5)(instance).cost
+    again = StreamingKMedPlusPlus(summary_size=300, chunk_rows=500)(instance)  # the seed makes it reproducible
+    assert np.array_equal(again.labels, streamed.labels)
+
+
+def test_finalize_needs_points_and_assign_needs_centers():
+    solver = StreamingKMedPlusPlus()
+    for call in (lambda: solver.finalize(3), lambda: solver.assign(ArrayInstance(blobs(), 3))):
+        try:
+            call()
+        except ValueError:
+            continue
+        assert False, "must raise before partial_fit and finalize"
+
+
+if __name__ == "__main__":
+    test_summary_stays_bounded_and_keeps_the_weight()
+    test_streamed_solution_is_close_to_kmedplusplus()
+    test_finalize_needs_points_and_assign_needs_centers()
+    print("the streaming k-median++ behaves as expected")
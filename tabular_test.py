@@ -0,0 +1,75 @@
+"""
+behaviour checks of the csv loader and its cache in data.tabular. Run with python tabular_test.py (or pytest)
+"""
+import os
+import tempfile
+
+import numpy as np
+
+from data import tabular
+from util import TEMPORARY_PREFIX
+
+CSV = 'id,"x",y,label\n1,1.5,2,a\n2,,3,b\n3,"4",-1e3,c\n4,7,,d\n'
+
+
+def write_csv(directory: str, content: str = CSV) -> str:
+    path = os.path.join(directory, "data.csv")
+    with open(path, "w") as file:
+        file.write(content)
+    return path
+
+
+def test_parse_columns_reads_floats_and_empty_cells():
+    with tempfile.TemporaryDirectory() as directory:
+        data = tabular.parse_columns(write_csv(directory), ["y", "x"])
+        expected = np.array([[2, 1.5], [3, np.nan], [-1e3, 4], [np.nan, 7]])
+        assert data.dtype == np.float64 and np.array_equal(data, expected, equal_nan=True)
+        try:
+            tabular.parse_columns(write_csv(directory), ["x", "z"])
+        except ValueError as error:
+            assert "z" in str(error)
+        else:
+            assert False, "an unknown column must raise"
+
+
+def test_missing_value_policies():
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_csv(directory)
+        assert np.array_equal(tabular.load_columns(path, ["x", "y"], cache_dir=directory), [[1.5, 2], [4, -1e3]])
+        assert np.array_equal(tabular.load_columns(path, ["x", "y"], missing=0.0, cache_dir=directory),
+                              [[1.5, 2], [0, 3], [4, -1e3], [7, 0]])
+        assert np.array_equal(tabular.load_columns(path, ["x"], num_rows=1, missing="raise", cache_dir=directory),
+                              [[1.5]])
+        try:
+            tabular.load_columns(path, ["x", "y"], missing="raise", cache_dir=directory)
+        except ValueError as error:
+            assert "column x of data row 1" in str(error)
+        else:
+            assert False, "an empty cell must raise"
+        chunks = list(tabular.load_chunks(path, ["x", "y"], 2, missing=0.0, cache_dir=directory))
+        assert np.array_equal(np.concatenate(chunks), tabular.load_columns(path, ["x", "y"], missing=0.0,
+                                                                           cache_dir=directory))
+
+
+def test_cache_is_reused_until_the_file_changes():
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_csv(directory)
+        cache_dir = os.path.join(directory, "cache")
+        first = tabular.cache_path(path, ["x", "y"], cache_dir)
+        tabular.load_columns(path, ["x", "y"], cache_dir=cache_dir)
+        assert os.path.exists(first) and tabular.cache_path(path, ["x", "y"], cache_dir) == first
+        assert tabular.cache_path(path, ["y", "x"], cache_dir) != first
+        os.utime(path, ns=(0, 0))  # a new modification time alone rehashes the file, but keeps its cache
+        assert tabular.cache_path(path, ["x", "y"], cache_dir) == first
+        write_csv(directory, CSV.replace("1.5", "2.5"))
+        os.utime(path, ns=(1, 1))
+        assert tabular.cache_path(path, ["x", "y"], cache_dir) != first
+        assert tabular.load_columns(path, ["x", "y"], cache_dir=cache_dir)[0, 0] == 2.5
+        assert not [name for name in os.listdir(cache_dir) if name.startswith(TEMPORARY_PREFIX)]
+
+
+if __name__ == "__main__":
+    test_parse_columns_reads_floats_and_empty_cells()
+    test_missing_value_policies()
+    test_cache_is_reused_until_the_file_changes()
+    print("the csv loader behaves as expected")
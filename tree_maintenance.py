@@ -0,0 +1,214 @@
+"""
+keeps an explainable tree up to date while new points arrive: the points are routed down the existing tree, and the
+leaf medians and costs are maintained from mergeable quantile sketches instead of rebuilding the output
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from numpy import ndarray
+
+import cost_engine
+from solver_interface import ExplainableOutput, check_weights
+from util import Point, weighted_median
+
+
+class QuantileSketch:
+    """Mergeable summary of the values of a set of d-dimensional points, one weighted sample per dimension. Column i
+    of values holds the sorted entries of dimension i and the same column of weights their weights. Up to capacity
+    entries the sketch is exact. Beyond, it is compacted to capacity // 2 entries by merging runs of consecutive
+    entries into their weighted mean with the summed weight, so that a quantile is off by at most the weight of one
+    run. By the triangle inequality, a merged run underestimates the cost to any center by at most the weighted
+    distances of its entries to their mean; slack sums these amounts over all compactions, so that the exact cost lies
+    between cost(center) and cost(center) + slack."""
+
+    def __init__(self, values: ndarray, weights: Optional[ndarray] = None, capacity: int = 4096):
+        """
+        @param values: (m, d) matrix of points
+        @param weights: (optional) weight of each point, default 1
+        @param capacity: maximal number of entries per dimension
+        """
+        values = np.asarray(values, dtype=np.float64)
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64)
+        order = np.argsort(values, axis=0, kind="stable")
+        self.values = np.take_along_axis(values, order, axis=0)
+        self.weights = weights[order]
+        self.capacity = capacity
+        self.compacted = False  # True once the sketch is no longer exact
+        self.slack = 0.0  # bound on the cost lost by the compactions, see cost
+        self._compact()
+
+    def __len__(self):
+        return len(self.values)
+
+    def total_weight(self) -> float:
+        return float(self.weights[:, 0].sum())
+
+    def merge(self, other: QuantileSketch):
+        """adds the entries of another sketch of the same dimension"""
+        values = np.concatenate((self.values, other.values))
+        weights = np.concatenate((self.weights, other.weights))
+        order = np.argsort(values, axis=0, kind="stable")
+        self.values = np.take_along_axis(values, order, axis=0)
+        self.weights = np.take_along_axis(weights, order, axis=0)
+        self.compacted |= other.compacted
+        self.slack += other.slack
+        self._compact()
+
+    def add(self, values: ndarray, weights: Optional[ndarray] = None):
+        """adds a batch of (m, d) points with their weights (default 1)"""
+        self.merge(QuantileSketch(values, weights, self.capacity))
+
+    def _compact(self):
+        if len(self.values) <= self.capacity:
+            return
+        run = -(-len(self.values) // (self.capacity // 2))  # entries per run, rounded up
+        starts = np.arange(0, len(self.values), run)
+        sums = np.add.reduceat(self.weights, starts, axis=0)
+        weighted = np.add.reduceat(self.values * self.weights, starts, axis=0)
+        plain = np.add.reduceat(self.values, starts, axis=0) / np.diff(np.append(starts, len(self.values)))[:, None]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(sums > 0, weighted / sums, plain)  # runs without weight keep their plain mean
+        sizes = np.diff(np.append(starts, len(self.values)))
+        self.slack += float((np.abs(self.values - np.repeat(means, sizes, axis=0)) * self.weights).sum())
+        self.values = means
+        self.weights = sums
+        self.compacted = True
+
+    def median(self, extra: Optional[ndarray] = None) -> ndarray:
+        """
+        @param extra: (optional) (c, d) matrix of further values that count once each, e.g. the centers of a leaf
+        @return: the weighted coordinate-wise median, see util.weighted_median, exact if the sketch is not compacted
+        """
+        extra = np.empty((0, self.values.shape[1])) if extra is None else extra
+        return np.array([weighted_median(np.concatenate((self.values[:, i], extra[:, i])),
+                                         np.concatenate((self.weights[:, i], np.ones(len(extra)))))
+                         for i in range(self.values.shape[1])])
+
+    def cost(self, center: ndarray) -> float:
+        """
+        @return: the weighted sum of the 1-norm distances of the points to center, which adds up over the dimensions,
+        exact if the sketch is not compacted and otherwise at most slack below the exact cost
+        """
+        return float((np.abs(self.values - center) * self.weights).sum())
+
+
+@dataclass
+class UpdateReport:
+    """represents the effect of one batch of new points on a maintained tree"""
+    leaves: ndarray  # leaf of each new point
+    touched: ndarray  # leaves that received points
+    cost: float  # total cost after the update, exact up to cost_error
+    cost_error: float  # the exact cost lies between cost and cost + cost_error, see QuantileSketch.slack
+    cost_ratio: float  # average cost per unit of weight now, relative to the one of the tree when it was built
+    drift: bool  # True if cost_ratio exceeds the threshold, i.e. the tree no longer fits the data and should be rebuilt
+
+
+class TreeMaintainer:
+    """Appends new points to an explainable tree without rebuilding it. A batch is routed down the flat tree, and only
+    the leaves that receive points update their sketch, median and cost, in time linear in the batch and independent
+    of the points seen before. Every leaf keeps the median of its node set like ExplainableOutput (points, centers or
+    both, depending on the builder), while the leaf cost serves the points of a leaf by the median of its points, like
+    ExplainableOutput.cost_report(mode="leaf"). The tree itself, its splits and its pre-clustering stay fixed, so the
+    cost per unit of weight is compared to the one at build time: when it grows by more than drift_threshold, the
+    update reports drift and a rebuild is warranted. The build time cost is computed exactly from the points of the
+    tree; the sketches of leaves with more than capacity points are compacted, so their costs and medians after an
+    update are approximate, the costs underestimated by at most cost_error (see QuantileSketch). A larger capacity
+    trades memory and update time for a smaller error."""
+
+    def __init__(self, output: ExplainableOutput, drift_threshold: float = 1.2, capacity: int = 4096,
+                 keep_points: bool = False):
+        """
+        @param output: the explainable solution to maintain
+        @param drift_threshold: factor by which the average cost may grow before the updates report drift
+        @param capacity: maximal number of entries per dimension of the sketch of every leaf, see QuantileSketch
+        @param keep_points: if True, the new points are kept with their leaves, see leaf_points. Off by default, since
+        the kept batches grow without bound
+        """
+        self.output = output
+        self.flat_tree = output.flat_tree()
+        self.drift_threshold = drift_threshold
+        self.keep_points = keep_points
+        tree = output.leaves[0].tree  # the sketches summarize the points the tree was built on, with their weights
+        data, weights = tree.instance.as_array(), tree.instance.weights
+        self.set_mode = tree.set_mode
+        self.leaf_centers = [tree.center_coords[leaf.center_ids] for leaf in output.leaves]
+        self.sketches = [QuantileSketch(data[leaf.indices()], None if weights is None else weights[leaf.indices()],
+                                        capacity) for leaf in output.leaves]
+        self.medians = [median.coordinates.copy() for median in output.medians]
+        labels = np.full(len(data), -1, dtype=np.intp)
+        for j, leaf in enumerate(output.leaves):
+            labels[leaf.indices()] = j
+        # exact, unlike the costs of the sketches that are compacted already
+        self.costs = cost_engine.evaluate(data, labels, len(output.leaves), "l1", tree.instance.chunk_rows(),
+                                          weights).group_costs.copy()
+        self.weights = np.array([sketch.total_weight() for sketch in self.sketches])
+        self.base_cost, self.base_weight = float(self.costs.sum()), float(self.weights.sum())
+        self.batches: list[tuple[ndarray, ndarray]] = []  # new points and their leaves, if kept
+        self.num_updates = 0
+
+    def _leaf_cost(self, j: int) -> float:
+        sketch = self.sketches[j]
+        return sketch.cost(sketch.median()) if len(sketch) else 0.0
+
+    def _leaf_median(self, j: int) -> ndarray:
+        sketch = self.sketches[j]
+        if self.set_mode == "centers" or len(sketch) == 0:
+            return self.medians[j]  # the median of the centers of the leaf does not depend on the points
+        return sketch.median(self.leaf_centers[j] if self.set_mode == "points+centers" else None)
+
+    def update(self, X: ndarray, weights: Optional[ndarray] = None) -> UpdateReport:
+        """
+        Adds a batch of new points to the tree.
+        @param X: (m, d) matrix of the new points
+        @param weights: (optional) weight of each new point, default 1
+        @return: the leaves of the new points, the cost after the update and the drift signal
+        """
+        X = np.asarray(X, dtype=np.float64)
+        weights = check_weights(weights, len(X))
+        leaves = self.flat_tree.predict(X)
+        order = np.argsort(leaves, kind="stable")
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(leaves, minlength=len(self.sketches)))))
+        touched = np.flatnonzero(np.diff(bounds))
+        for j in touched:
+            rows = order[bounds[j]:bounds[j + 1]]
+            self.sketches[j].add(X[rows], None if weights is None else weights[rows])
+            self.medians[j] = self._leaf_median(j)
+            self.costs[j] = self._leaf_cost(j)
+            self.weights[j] = self.sketches[j].total_weight()
+        if self.keep_points:
+            self.batches.append((X, leaves))
+        self.num_updates += 1
+        ratio = self.cost_ratio()
+        return UpdateReport(leaves, touched, self.cost(), self.cost_error(), ratio, ratio > self.drift_threshold)
+
+    def cost(self) -> float:
+        """@return: the total cost of all points seen, every leaf served by the median of its points"""
+        return float(self.costs.sum())
+
+    def cost_error(self) -> float:
+        """@return: bound on how far cost lies below the exact cost, the slack of the sketches updated so far"""
+        return float(sum(sketch.slack for sketch in self.sketches))
+
+    def cost_ratio(self) -> float:
+        """@return: the cost per unit of weight, relative to the one of the tree when it was built"""
+        if self.base_cost == 0:
+            return 1.0 if self.cost() == 0 else np.inf
+        return (self.cost() / self.weights.sum()) / (self.base_cost / self.base_weight)
+
+    def leaf_medians(self) -> list[Point]:
+        """@return: the current median of every leaf, in the order of output.leaves"""
+        return [Point(median) for median in self.medians]
+
+    def leaf_points(self, j: int) -> ndarray:
+        """
+        @param j: index of a leaf in output.leaves
+        @return: (m, d) matrix of the points of the leaf, those the tree was built on followed by the new ones
+        """
+        if self.num_updates and not self.keep_points:
+            raise ValueError("the new points were not kept, construct the TreeMaintainer with keep_points=True")
+        leaf = self.output.leaves[j]
+        parts = [leaf.tree.instance.as_array()[leaf.indices()]] + [X[leaves == j] for X, leaves in self.batches]
+        return np.concatenate(parts)
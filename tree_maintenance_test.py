@@ -0,0 +1,82 @@
+"""
+behaviour checks of the incremental tree maintenance. Run with python tree_maintenance_test.py (or pytest)
+"""
+import numpy as np
+
+from algorithms.iterative_mistake_minimization import IMM
+from solver_interface import ArrayInstance, CenterOutput
+from tree_maintenance import QuantileSketch, TreeMaintainer
+from util import weighted_median
+
+
+def blobs(rng: np.random.Generator, n: int, shift: float = 0.0) -> np.ndarray:
+    return rng.normal(size=(n, 2)) + rng.integers(0, 3, (n, 1)) * 6 + shift
+
+
+def explained(seed: int = 0, n: int = 2000):
+    rng = np.random.default_rng(seed)
+    instance = ArrayInstance(blobs(rng, n), 3)
+    centers = [instance.point(int(np.argmin(np.abs(instance.as_array()[:, 0] - 6 * c)))) for c in range(3)]
+    return rng, IMM()(instance, CenterOutput(instance, centers))
+
+
+def exact_cost(points: np.ndarray) -> float:
+    return float(np.abs(points - np.median(points, axis=0)).sum())
+
+
+def test_sketch_cost_is_bounded_by_its_slack():
+    values = np.random.default_rng(0).exponential(size=(5000, 3))
+    sketch = QuantileSketch(values[:3000], capacity=256)
+    sketch.add(values[3000:])
+    assert sketch.compacted and len(sketch) <= 256 and np.isclose(sketch.total_weight(), len(values))
+    for center in (np.median(values, axis=0), np.zeros(3), np.full(3, 2.0)):
+        exact = float(np.abs(values - center).sum())
+        assert sketch.cost(center) <= exact + 1e-6 <= sketch.cost(center) + sketch.slack + 1e-6
+    exact_sketch = QuantileSketch(values[:100])
+    assert exact_sketch.slack == 0 and np.allclose(exact_sketch.median(),
+                                                   [weighted_median(values[:100, i], np.ones(100)) for i in range(3)])
+
+
+def test_updates_track_the_leaf_costs_and_medians():
+    rng, output = explained()
+    maintainer = TreeMaintainer(output, keep_points=True)
+    assert np.isclose(maintainer.base_cost, output.cost("leaf"))
+    for _ in range(3):
+        report = maintainer.update(blobs(rng, 500))
+        assert not report.drift and report.cost_error == 0 and np.isclose(report.cost_ratio, 1.0, atol=0.15)
+    points = [maintainer.leaf_points(j) for j in range(len(output.leaves))]
+    assert sum(len(leaf) for leaf in points) == 2000 + 3 * 500
+    assert np.isclose(maintainer.cost(), sum(exact_cost(leaf) for leaf in points))
+    for median, leaf in zip(maintainer.leaf_medians(), points):  # a median of the leaf, up to ties
+        assert np.isclose(np.abs(leaf - median.coordinates).sum(), exact_cost(leaf))
+
+
+def test_compacted_leaves_keep_an_exact_base_and_a_bounded_cost():
+    rng, output = explained(1)
+    maintainer = TreeMaintainer(output, capacity=128, keep_points=True)
+    assert np.isclose(maintainer.base_cost, output.cost("leaf"))  # not the cost of the compacted sketches
+    report = maintainer.update(blobs(rng, 1000))
+    exact = sum(exact_cost(maintainer.leaf_points(j)) for j in range(len(output.leaves)))
+    assert report.cost_error > 0 and report.cost <= exact + 1e-6 <= report.cost + report.cost_error + 1e-6
+
+
+def test_shifted_points_report_drift():
+    rng, output = explained(2)
+    maintainer = TreeMaintainer(output)
+    assert not maintainer.update(blobs(rng, 200)).drift
+    report = maintainer.update(blobs(rng, 2000, shift=4.0))
+    assert report.drift and report.cost_ratio > maintainer.drift_threshold
+    try:
+        maintainer.leaf_points(0)
+    except ValueError:
+        pass
+    else:
+        assert False, "the new points are not kept by default"
+
+
+if __name__ == "__main__":
+    test_sketch_cost_is_bounded_by_its_slack()
+    test_updates_track_the_leaf_costs_and_medians()
+    test_compacted_leaves_keep_an_exact_base_and_a_bounded_cost()
+    test_shifted_points_report_drift()
+    print("the tree maintenance behaves as expected")
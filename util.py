@@ -1,14 +1,24 @@
 from __future__ import \
     annotations  # allows us to use Point in type hints of Point methods. this will be default in Python 3.10
 
+import os
+import tempfile
+from typing import Callable, Iterator, Optional
+
 import numpy as np
+from numpy import ndarray
+
+import instrumentation
+
+TEMPORARY_PREFIX = ".tmp-"  # prefix of the files write_atomically has not renamed yet
 
 
 class Point:
     """represents a datapoint in a k-median problem instance"""
 
-    def __init__(self, coordinates):
+    def __init__(self, coordinates, index: Optional[int] = None):
         self.coordinates = coordinates
+        self.index = index  # row of the point in the data matrix of its instance, if known
 
     def closest_center(self, centers: list[Point]) -> tuple[Point, np.float64]:
         """
@@ -16,8 +26,9 @@ class Point:
         @param centers: list of centers to check
         @return: tuple containing the center and distance
         """
-        dists = [dist(self, center) for center in centers]
-        return centers[np.argmin(dists)], min(dists)
+        dists = l1_distances(stack_coordinates(centers), self.coordinates)
+        closest = int(np.argmin(dists))
+        return centers[closest], dists[closest]
 
 
 def dist(p: Point, q: Point) -> np.float64:
@@ -25,9 +36,86 @@ def dist(p: Point, q: Point) -> np.float64:
     @param p, q: points to calculate Euclidean distance between
     @return: Euclidean distance between point p and point q
     """
+    instrumentation.count("distances")
     return np.float64(np.linalg.norm(p.coordinates - q.coordinates, ord=1))
 
 
+def stack_coordinates(points: list[Point]) -> ndarray:
+    """
+    Stacks the coordinates of the given points into a matrix.
+    @param points: list of points
+    @return: (len(points), d) float matrix, row i holds the coordinates of points[i]
+    """
+    return np.array([point.coordinates for point in points], dtype=np.float64)
+
+
+def row_chunks(n: int, chunk_rows: Optional[int] = None) -> Iterator[slice]:
+    """
+    Splits the rows 0, ..., n-1 into consecutive chunks.
+    @param n: number of rows
+    @param chunk_rows: maximal number of rows per chunk, None for a single chunk
+    @return: iterator over the slices of the chunks
+    """
+    step = max(1, n if chunk_rows is None else int(chunk_rows))
+    for start in range(0, n, step):
+        yield slice(start, min(start + step, n))
+
+
+def l1_distances(X: ndarray, q: ndarray, chunk_rows: Optional[int] = None) -> ndarray:
+    """
+    Calculates the 1-norm distance of every row of X to q in one vectorized pass
+    @param X: (n, d) matrix of coordinates
+    @param q: coordinates of a single point
+    @param chunk_rows: (optional) read X in chunks of this many rows, to bound the temporaries of a memory-mapped X
+    @return: array of n distances
+    """
+    instrumentation.count("distances", len(X))
+    if chunk_rows is None or chunk_rows >= len(X):
+        return np.abs(X - q).sum(axis=1)
+    distances = np.empty(len(X))
+    for rows in row_chunks(len(X), chunk_rows):
+        distances[rows] = np.abs(np.asarray(X[rows]) - q).sum(axis=1)
+    return distances
+
+
+def closest_centers(X: ndarray, C: ndarray, chunk_rows: Optional[int] = None) -> tuple[ndarray, ndarray]:
+    """
+    Computes for every row of X the closest row of C (w.r.t. the 1-norm) and the distance to it.
+    Ties are broken towards the center with the lowest index, like Point.closest_center.
+    @param X: (n, d) matrix of points
+    @param C: (k, d) matrix of centers
+    @param chunk_rows: (optional) read X in chunks of this many rows, to bound the temporaries of a memory-mapped X
+    @return: tuple containing the array of center indices and the array of distances
+    """
+    labels = np.zeros(len(X), dtype=np.intp)
+    best = np.full(len(X), np.inf)
+    for rows in row_chunks(len(X), chunk_rows):
+        chunk = np.asarray(X[rows])  # a single read of the chunk serves all centers
+        chunk_labels, chunk_best = labels[rows], best[rows]
+        for j, center in enumerate(C):  # one pass per center keeps the memory at O(n) instead of O(n * k)
+            dists = l1_distances(chunk, center)
+            closer = dists < chunk_best
+            chunk_labels[closer] = j
+            chunk_best[closer] = dists[closer]
+    return labels, best
+
+
+def assigned_distances(X: ndarray, C: ndarray, labels: ndarray, chunk_rows: Optional[int] = None) -> ndarray:
+    """
+    Computes for every row of X the 1-norm distance to the row of C it is assigned to.
+    @param X: (n, d) matrix of points
+    @param C: (k, d) matrix of centers
+    @param labels: for each row of X, the index of its row in C
+    @param chunk_rows: (optional) read X in chunks of this many rows, to bound the temporaries of a memory-mapped X
+    @return: array of n distances
+    """
+    instrumentation.count("distances", len(X))
+    distances = np.empty(len(X))
+    for rows in row_chunks(len(X), chunk_rows):
+        distances[rows] = np.abs(np.asarray(X[rows]) - C[labels[rows]]).sum(axis=1)
+    return distances
+
+
 def closest_to_centroid(clusterpoints: list[Point]) -> Point:
     """
     Given a cluster, this function computes the centroid of that cluster
@@ -35,25 +123,141 @@ def closest_to_centroid(clusterpoints: list[Point]) -> Point:
     @param clusterpoints: all points of cluster in question
     @return: the datapoint closest to the centroid of the cluster in question
     """
-    cluster_points_x = [point.coordinates[0] for point in clusterpoints]
-    cluster_points_y = [point.coordinates[1] for point in clusterpoints]
-    centroid = Point((np.average(cluster_points_x), np.average(cluster_points_y)))
-    dists = [dist(point, centroid) for point in clusterpoints]
-    new_center = clusterpoints[np.argmin(dists)]
+    coords = stack_coordinates(clusterpoints)
+    centroid = np.average(coords, axis=0)
+    new_center = clusterpoints[int(np.argmin(l1_distances(coords, centroid)))]
     return new_center
 
 
-def medoid_bruteforce(clusterpoints: list[Point]) -> Point:
+def medoid_bruteforce(clusterpoints: list[Point], weights: Optional[ndarray] = None) -> Point:
     """
     Given a cluster, this function computes the medoid of that cluster
     and returns it. This function calculates the medoid with the brute force method.
     @param clusterpoints: points of cluster in question
+    @param weights: (optional) weight of each point, a point of weight w counts w times
     @return: medoid of the cluster in question
     """
-    cost = [sum([dist(point1, point2) for point2 in clusterpoints]) for point1 in clusterpoints]
+    if weights is None:
+        weights = np.ones(len(clusterpoints))
+    cost = [sum([weight * dist(point1, point2) for point2, weight in zip(clusterpoints, weights)])
+            for point1 in clusterpoints]
     return clusterpoints[np.argmin(cost)]
 
 
+def medoid_exact(coords: ndarray, max_block_bytes: int = 2 ** 26, weights: Optional[ndarray] = None) -> int:
+    """
+    Computes the medoid of a cluster exactly, evaluating the pairwise 1-norm distances vectorized in blocks of rows
+    such that no temporary array exceeds max_block_bytes.
+    @param coords: (m, d) coordinates of the points of the cluster
+    @param max_block_bytes: memory ceiling for the temporary distance block
+    @param weights: (optional) weight of each point, a point of weight w counts w times
+    @return: row of the medoid in coords
+    """
+    costs = l1_costs(coords, np.arange(len(coords)), max_block_bytes, weights)
+    return int(np.argmin(costs))
+
+
+def medoid_sampled(coords: ndarray, rng: np.random.Generator, num_samples: int = 5, sample_size: int = 100,
+                   max_block_bytes: int = 2 ** 26, weights: Optional[ndarray] = None) -> int:
+    """
+    Computes an approximate medoid of a cluster in the style of CLARA: the exact medoid of each of num_samples random
+    samples is a candidate, and the candidate with the lowest cost on the whole cluster is returned.
+    @param coords: (m, d) coordinates of the points of the cluster
+    @param rng: random generator to draw the samples from
+    @param num_samples: number of samples drawn
+    @param sample_size: number of points per sample
+    @param max_block_bytes: memory ceiling for the temporary distance block
+    @param weights: (optional) weight of each point, heavier points are more likely to be sampled
+    @return: row of the approximate medoid in coords
+    """
+    if len(coords) <= sample_size:
+        return medoid_exact(coords, max_block_bytes, weights)
+    probabilities = None if weights is None else weights / weights.sum()
+    samples = (rng.choice(len(coords), size=sample_size, replace=False, p=probabilities) for _ in range(num_samples))
+    candidates = np.unique([sample[medoid_exact(coords[sample], max_block_bytes,
+                                                None if weights is None else weights[sample])] for sample in samples])
+    costs = l1_costs(coords, candidates, max_block_bytes, weights)
+    return int(candidates[np.argmin(costs)])
+
+
+def medoid_pruned(coords: ndarray, max_block_bytes: int = 2 ** 26, weights: Optional[ndarray] = None) -> int:
+    """
+    Computes the medoid of a cluster exactly, evaluating the pairwise distances only for the candidates that can still
+    be the medoid. The 1-norm cost separates over the dimensions: in every dimension it is piecewise linear with its
+    minimum at the coordinate-wise median, and its value at all points follows from prefix sums over the sorted
+    coordinates. This bounds the cost of every point in O(d m log m); as the prefix sums are subject to rounding, the
+    candidates within a small tolerance of the minimum are evaluated again with the exact blocked pairwise distances.
+    @param coords: (m, d) coordinates of the points of the cluster
+    @param max_block_bytes: memory ceiling for the temporary distance block
+    @param weights: (optional) weight of each point, a point of weight w counts w times
+    @return: row of the medoid in coords
+    """
+    m = len(coords)
+    costs = np.zeros(m)
+    for column in coords.T:
+        order = np.argsort(column, kind="stable")
+        values = column[order]
+        sorted_weights = np.ones(m) if weights is None else weights[order]
+        below = np.concatenate(([0.0], np.cumsum(sorted_weights)))  # weight of the points sorted before each point
+        prefix = np.concatenate(([0.0], np.cumsum(values * sorted_weights)))
+        costs[order] += values * below[:-1] - prefix[:-1] + (prefix[-1] - prefix[1:]) - values * (below[-1] - below[1:])
+    total_weight = m if weights is None else weights.sum()
+    tolerance = 1e-9 * (costs.min() + total_weight * coords.shape[1] * np.abs(coords).max())
+    candidates = np.flatnonzero(costs <= costs.min() + tolerance)
+    exact_costs = l1_costs(coords, candidates, max_block_bytes, weights)
+    return int(candidates[np.argmin(exact_costs)])  # candidates are increasing, so ties go to the lowest row
+
+
+def l1_costs(coords: ndarray, candidates: ndarray, max_block_bytes: int = 2 ** 26,
+             weights: Optional[ndarray] = None) -> ndarray:
+    """
+    Computes for each candidate the sum of the 1-norm distances to all points, in blocks of candidates and, if a
+    single candidate against all points is already too large, in blocks of points, such that the temporary
+    (candidates, points, d) array never exceeds max_block_bytes.
+    @param coords: (m, d) coordinates of the points
+    @param candidates: rows of coords to compute the cost of
+    @param max_block_bytes: memory ceiling for the temporary distance block
+    @param weights: (optional) weight of each point, the distance to a point of weight w counts w times
+    @return: array containing the cost of each candidate
+    """
+    instrumentation.count("distances", len(coords) * len(candidates))
+    row_bytes = max(1, coords.shape[1] * coords.itemsize)  # one candidate against one point
+    block_size = max(1, max_block_bytes // max(1, len(coords) * row_bytes))
+    point_rows = max(1, max_block_bytes // (block_size * row_bytes))
+    costs = np.zeros(len(candidates))
+    for start in range(0, len(candidates), block_size):
+        block = coords[candidates[start:start + block_size]]
+        for rows in row_chunks(len(coords), point_rows):
+            differences = block[:, np.newaxis, :] - coords[np.newaxis, rows, :]
+            np.abs(differences, out=differences)
+            if weights is None:
+                costs[start:start + block_size] += differences.sum(axis=(1, 2))
+            else:
+                costs[start:start + block_size] += differences.sum(axis=2) @ weights[rows]
+    return costs
+
+
+def weighted_median(values: ndarray, weights: Optional[ndarray] = None) -> float:
+    """
+    Computes the median of values where each value counts as often as its weight. For integer weights this is the
+    median of the expanded multiset, i.e. the same as np.median(np.repeat(values, weights)); for other weights it is
+    the midpoint of the lower and the upper weighted median.
+    @param values: 1-dimensional array of values
+    @param weights: (optional) non-negative weight of each value, None computes np.median
+    @return: the median, nan for no values or no weight
+    """
+    if weights is None:
+        return np.median(values) if len(values) else np.nan
+    order = np.argsort(values, kind="stable")
+    cumulative = np.cumsum(weights[order])
+    if len(values) == 0 or cumulative[-1] <= 0:
+        return np.nan
+    half = cumulative[-1] / 2
+    lower = values[order[np.searchsorted(cumulative, half, side="left")]]
+    upper = values[order[min(np.searchsorted(cumulative, half, side="right"), len(values) - 1)]]
+    return (lower + upper) / 2
+
+
 def median_coordinatewise(clusterpoints: list[Point]) -> Point:
     """
     Given a cluster, this function computes the coordinate-wise median of that cluster
@@ -61,8 +265,24 @@ def median_coordinatewise(clusterpoints: list[Point]) -> Point:
     @param clusterpoints: points of cluster in question
     @return: coordinate-wise median of the cluster in question
     """
-    x_list = [point.coordinates[0] for point in clusterpoints]
-    y_list = [point.coordinates[1] for point in clusterpoints]
-    #cost_x = [sum([np.abs(point1-point2) for point2 in x_list]) for point1 in x_list]
-    #cost_y = [sum([np.abs(point1-point2) for point2 in y_list]) for point1 in y_list]
-    return Point(np.array([np.median(x_list), np.median(y_list)]))
\ No newline at end of file
+    return Point(np.median(stack_coordinates(clusterpoints), axis=0))
+
+
+def write_atomically(path: str, write: Callable):
+    """
+    Writes a file under a unique temporary name in its directory and renames it to path when it is complete, so that
+    readers (and concurrent writers of the same file) never see a partially written file.
+    @param path: path of the file, its directory is created if needed
+    @param write: function writing the content to the binary file object it is given
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix=TEMPORARY_PREFIX, suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            write(file)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
@@ -1,7 +1,7 @@
 import matplotlib.cm as cm
 import matplotlib.pyplot as plt
 import numpy as np
-from solver_interface import CenterOutput, ExplainableOutput
+from solver_interface import CenterOutput, ExplainableOutput, pre_cluster_dict
 from matplotlib.collections import PatchCollection
 from matplotlib.patches import Rectangle
 
@@ -11,6 +11,7 @@ def show_explainable_clusters(output: ExplainableOutput):
     @param output: an explainable solution to the k-median problem
     """
     k = len(output.medians)
+    pre_clusters = pre_cluster_dict(output.pre_clusters)
 
     colors = cm.rainbow(np.linspace(0, 1, k))  # get a selection of evenly distributed colors
 
@@ -33,10 +34,10 @@ def show_explainable_clusters(output: ExplainableOutput):
         # plt.vlines(xminc, yminc, ymaxc, color='black')
         # plt.vlines(xmaxc, yminc, ymaxc, color='black')
         for j in range(k):
-            current_center = list(output.pre_clusters.keys())[j]
+            current_center = list(pre_clusters.keys())[j]
             if xminc < current_center.coordinates[0]<xmaxc and yminc < current_center.coordinates[1] < ymaxc:
-                x=[point.coordinates[0] for point in output.pre_clusters[current_center]]
-                y=[point.coordinates[1] for point in output.pre_clusters[current_center]]
+                x=[point.coordinates[0] for point in pre_clusters[current_center]]
+                y=[point.coordinates[1] for point in pre_clusters[current_center]]
 
         #x = [point.coordinates[0] for point in list(output.pre_clusters.values())[i]]
         #y = [point.coordinates[1] for point in list(output.pre_clusters.values())[i]]#clusterpoints[output.medoids[i]]]
@@ -0,0 +1,62 @@
+"""
+behaviour checks of the per-point weights: a collapsed instance, whose distinct rows are weighted by their number of
+copies, must cost what the expanded instance costs. Run with python weights_test.py (or pytest)
+"""
+import numpy as np
+
+import cost_engine
+from algorithms.iterative_mistake_minimization import IMM
+from data.tabular import collapse_duplicates, make_instance
+from solver_interface import ArrayInstance, CenterOutput, check_weights
+
+
+def duplicated_data(seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, 8, (60, 2)).astype(np.float64)
+    return rows[rng.integers(0, len(rows), 400)]
+
+
+def test_collapse_duplicates_counts_the_copies():
+    data = duplicated_data()
+    distinct, weights, inverse = collapse_duplicates(data)
+    assert np.array_equal(distinct[inverse], data) and weights.sum() == len(data)
+    assert np.array_equal(weights, np.bincount(inverse))
+    _, first = np.unique(data, axis=0, return_index=True)
+    assert np.array_equal(distinct, data[np.sort(first)])  # in the order of the first occurrence
+    point_weights = np.arange(len(data), dtype=np.float64)
+    assert np.allclose(collapse_duplicates(data, point_weights)[1], np.bincount(inverse, weights=point_weights))
+
+
+def test_collapsed_weighted_costs_equal_the_expanded_costs():
+    data = duplicated_data(1)
+    expanded = ArrayInstance(data, 4)
+    collapsed = make_instance(data, 4, collapse=True)
+    distinct, _, inverse = collapse_duplicates(data)
+    center_rows = [int(np.flatnonzero(inverse == j)[0]) for j in range(4)]
+    expanded_output = CenterOutput(expanded, [expanded.point(row) for row in center_rows])
+    collapsed_output = CenterOutput(collapsed, [collapsed.point(j) for j in range(4)])
+    assert np.isclose(collapsed_output.cost, expanded_output.cost)
+    for objective in ("l1", "l2"):
+        labels = collapsed_output.labels
+        report = cost_engine.evaluate(distinct, labels, 4, objective, weights=collapsed.weights)
+        expected = cost_engine.evaluate(data, labels[inverse], 4, objective)
+        assert np.isclose(report.total, expected.total) and np.allclose(report.group_sizes, expected.group_sizes)
+    expanded_tree, collapsed_tree = IMM()(expanded, expanded_output), IMM()(collapsed, collapsed_output)
+    assert [node.split for node in expanded_tree.split_nodes] == [node.split for node in collapsed_tree.split_nodes]
+    assert np.isclose(collapsed_tree.cost(), expanded_tree.cost())
+
+
+def test_invalid_weights_are_rejected():
+    for weights in (np.ones(3), -np.ones(4)):
+        try:
+            check_weights(weights, 4)
+        except ValueError:
+            continue
+        assert False, f"{weights} must be rejected"
+
+
+if __name__ == "__main__":
+    test_collapse_duplicates_counts_the_copies()
+    test_collapsed_weighted_costs_equal_the_expanded_costs()
+    test_invalid_weights_are_rejected()
+    print("the weighted instances behave as expected")